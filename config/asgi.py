@@ -13,17 +13,29 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
 
+django_asgi_app = get_asgi_application()
+
 from channels.auth import AuthMiddlewareStack
 from channels.routing import ProtocolTypeRouter, URLRouter
+from channels.security.websocket import AllowedHostsOriginValidator
+from django.urls import re_path
+
+from config.middleware import JWTQueryStringAuthMiddleware
+from monitor import routing
 
 application = ProtocolTypeRouter(
     {
-        "http": get_asgi_application(),
-        # for websocket 
-        # "websocket": AuthMiddlewareStack(
-        #     URLRouter(
-        #         routing.websocket_urlpatterns,
-        #     ),
-        # ),
+        "http": URLRouter(
+            routing.http_urlpatterns + [re_path(r"", django_asgi_app)],
+        ),
+        "websocket": AllowedHostsOriginValidator(
+            AuthMiddlewareStack(
+                JWTQueryStringAuthMiddleware(
+                    URLRouter(
+                        routing.websocket_urlpatterns,
+                    ),
+                ),
+            ),
+        ),
     }
 )
@@ -0,0 +1,30 @@
+"""
+PostgreSQL backend that takes connections from a per-process pool (pool.py).
+
+    DATABASES["default"]["ENGINE"] = "config.db_backends.pooled_postgresql"
+    DATABASES["default"]["POOL"] = {"max_size": 10, "timeout": 10, ...}
+
+Use it with CONN_MAX_AGE = 0, so Django hands the connection back to the pool
+at the end of every request, task or consumer message.
+"""
+from django.db.backends.postgresql import base
+from django.db.backends.postgresql.base import IsolationLevel
+
+from .pool import get_pool
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def _pool(self):
+        return get_pool(self.alias, **self.settings_dict.get("POOL", {}))
+
+    def get_new_connection(self, conn_params):
+        connection = self._pool().getconn(lambda: super(DatabaseWrapper, self).get_new_connection(conn_params))
+        # The base class sets this when it opens a connection; a reused one needs it too.
+        isolation_level = self.settings_dict["OPTIONS"].get("isolation_level")
+        self.isolation_level = IsolationLevel.READ_COMMITTED if isolation_level is None else IsolationLevel(isolation_level)
+        return connection
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                self._pool().putconn(self.connection)
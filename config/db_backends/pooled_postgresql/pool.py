@@ -0,0 +1,203 @@
+"""
+A per-process pool of psycopg2 connections shared by every thread.
+
+Django opens one connection per thread and closes it at the end of a request
+(or on close_old_connections() with CONN_MAX_AGE = 0). With this pool, "open"
+checks out an idle physical connection and "close" returns it, so bursts on
+the consumer, Celery workers and ASGI threads reuse warm connections instead
+of paying the TCP/TLS/auth handshake each time, and a process never holds
+more than `max_size` connections.
+
+Pools are keyed by alias and process id: a forked worker (Celery prefork,
+gunicorn) never reuses its parent's sockets.
+"""
+import os
+import threading
+import time
+from collections import deque
+
+import psycopg2
+from psycopg2 import extensions
+
+from monitor.metrics import DB_POOL_CONNECTIONS, DB_POOL_TIMEOUTS, DB_POOL_WAIT
+
+
+class _Slot:
+    __slots__ = ("connection", "created_at", "returned_at")
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.created_at = time.monotonic()
+        self.returned_at = self.created_at
+
+
+class ConnectionPool:
+    def __init__(
+        self,
+        alias: str,
+        max_size: int = 10,
+        timeout: float = 10.0,
+        max_lifetime: float = 1800.0,
+        max_idle: float = 300.0,
+        check_after: float = 30.0,
+    ):
+        """
+        Idle connections are checked with a `SELECT 1` before reuse once they
+        have been idle `check_after` seconds, and replaced after `max_lifetime`
+        seconds or `max_idle` idle.
+        """
+        self.alias = alias
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.max_idle = max_idle
+        self.check_after = check_after
+        self._idle = deque()
+        self._in_use = {}
+        self._opening = 0
+        self._lock = threading.Condition()
+
+    @property
+    def size(self) -> int:
+        return len(self._idle) + len(self._in_use) + self._opening
+
+    def _report(self):
+        DB_POOL_CONNECTIONS.labels(self.alias, "idle").set(len(self._idle))
+        DB_POOL_CONNECTIONS.labels(self.alias, "in_use").set(len(self._in_use))
+
+    def _expired(self, slot: _Slot, now: float) -> bool:
+        return now - slot.created_at > self.max_lifetime or now - slot.returned_at > self.max_idle
+
+    def _healthy(self, slot: _Slot, now: float) -> bool:
+        connection = slot.connection
+        if connection.closed:
+            return False
+        if now - slot.returned_at < self.check_after:
+            return True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            if connection.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+                connection.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _reserve(self, started: float, deadline: float) -> _Slot | None:
+        """
+        Takes the most recently returned idle slot, counted as in use from here on,
+        or returns None after reserving room to open a new connection.
+        """
+        stale = []
+        try:
+            with self._lock:
+                while True:
+                    now = time.monotonic()
+                    while self._idle:
+                        # Most recently returned first: it is the least likely to have gone stale.
+                        slot = self._idle.pop()
+                        if self._expired(slot, now):
+                            stale.append(slot)
+                            continue
+                        self._in_use[id(slot.connection)] = slot
+                        self._report()
+                        return slot
+
+                    if self.size < self.max_size:
+                        self._opening += 1
+                        return None
+
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        DB_POOL_TIMEOUTS.labels(self.alias).inc()
+                        raise psycopg2.OperationalError(
+                            f"No connection available in the '{self.alias}' pool "
+                            f"({self.max_size} in use) after {self.timeout}s"
+                        )
+                    self._lock.wait(remaining)
+        finally:
+            for slot in stale:
+                _discard(slot.connection)
+
+    def getconn(self, connect):
+        """Checks out an idle connection, or opens one with `connect()` while below max_size."""
+        started = time.monotonic()
+        deadline = started + self.timeout
+        while (slot := self._reserve(started, deadline)) is not None:
+            # Checked outside the lock: a half-open socket can block the SELECT 1
+            # until TCP gives up, and must not stall other threads meanwhile.
+            if self._healthy(slot, time.monotonic()):
+                DB_POOL_WAIT.labels(self.alias).observe(time.monotonic() - started)
+                return slot.connection
+            with self._lock:
+                self._in_use.pop(id(slot.connection), None)
+                self._report()
+                self._lock.notify()
+            _discard(slot.connection)
+
+        # Connect outside the lock so one slow handshake does not stall other threads.
+        try:
+            connection = connect()
+        except BaseException:
+            with self._lock:
+                self._opening -= 1
+                self._lock.notify()
+            raise
+        with self._lock:
+            self._opening -= 1
+            self._in_use[id(connection)] = _Slot(connection)
+            self._report()
+        DB_POOL_WAIT.labels(self.alias).observe(time.monotonic() - started)
+        return connection
+
+    def putconn(self, connection):
+        with self._lock:
+            slot = self._in_use.pop(id(connection), None)
+        if slot is None:
+            _discard(connection)
+            return
+
+        reusable = not connection.closed
+        if reusable and connection.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+            try:
+                connection.rollback()
+            except psycopg2.Error:
+                reusable = False
+
+        with self._lock:
+            now = time.monotonic()
+            if reusable and now - slot.created_at <= self.max_lifetime:
+                slot.returned_at = now
+                self._idle.append(slot)
+            else:
+                _discard(connection)
+            self._report()
+            self._lock.notify()
+
+    def closeall(self):
+        with self._lock:
+            while self._idle:
+                _discard(self._idle.pop().connection)
+            self._report()
+
+
+def _discard(connection):
+    try:
+        connection.close()
+    except psycopg2.Error:
+        pass
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias: str, **options) -> ConnectionPool:
+    key = (alias, os.getpid())
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = _pools[key] = ConnectionPool(alias, **options)
+    return pool
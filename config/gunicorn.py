@@ -0,0 +1,7 @@
+# Gunicorn settings, loaded with `gunicorn -c config/gunicorn.py`.
+from prometheus_client import multiprocess
+
+
+def child_exit(server, worker):
+    # Drop the exited worker's live gauges from the shared metrics directory.
+    multiprocess.mark_process_dead(worker.pid)
@@ -54,3 +54,51 @@ class DisableAllowHeaderMiddleware(MiddlewareMixin):
         if "Allow" in response:
             del response["Allow"]
         return response
+
+
+class ReadYourWritesMiddleware(MiddlewareMixin):
+    """
+    After a successful write, pins the user's reads to the primary for
+    REPLICA_STICKY_SECONDS (monitor/replicas.py). request.user is read after
+    the view, so users authenticated by DRF (JWT) are seen too.
+    """
+
+    def process_response(self, request, response):
+        if request.method not in ("GET", "HEAD", "OPTIONS") and response.status_code < 400:
+            from monitor.replicas import pin_to_primary
+
+            pin_to_primary(getattr(request, "user", None))
+        return response
+
+
+class JWTQueryStringAuthMiddleware:
+    """
+    Websocket auth: browsers cannot set an Authorization header on a websocket,
+    so the dashboard passes its access token as `?token=<jwt>`. Falls back to
+    the user already in scope (session auth) when no token is given.
+    """
+
+    def __init__(self, inner):
+        self.inner = inner
+
+    async def __call__(self, scope, receive, send):
+        from urllib.parse import parse_qs
+
+        token = parse_qs(scope.get("query_string", b"").decode()).get("token", [None])[0]
+        if token:
+            scope = dict(scope, user=await self._user_for_token(token))
+        return await self.inner(scope, receive, send)
+
+    @staticmethod
+    async def _user_for_token(token):
+        from channels.db import database_sync_to_async
+        from django.contrib.auth.models import AnonymousUser
+        from rest_framework_simplejwt.authentication import JWTAuthentication
+        from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+
+        authentication = JWTAuthentication()
+        try:
+            validated = authentication.get_validated_token(token)
+            return await database_sync_to_async(authentication.get_user)(validated)
+        except (InvalidToken, TokenError):
+            return AnonymousUser()
@@ -21,6 +21,10 @@ REDIS_LINK = env("REDIS_LINK")
 RABBIT_URI = env("RABBIT_URI")
 PROXY = env("PROXY")
 
+# Bot API endpoints; overridden to point at local stubs when benchmarking.
+TELEGRAM_API_BASE = env("TELEGRAM_API_BASE", "https://api.telegram.org")
+BALE_API_BASE = env("BALE_API_BASE", "https://tapi.bale.ai")
+
 MQTT_BROKER_HOST = env("MQTT_BROKER_HOST")
 
 
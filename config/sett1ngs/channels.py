@@ -12,3 +12,10 @@ CHANNEL_LAYERS = {
         },
     }
 }
+
+# Live dashboard feed (monitor/consumers.py).
+LIVE_FEED_ENABLED = env("LIVE_FEED_ENABLED", "True") == "True"
+# Seconds a websocket connection buffers events before sending them as one batch.
+LIVE_FEED_FLUSH_INTERVAL = float(env("LIVE_FEED_FLUSH_INTERVAL", "0.25"))
+# A batch is sent immediately once it holds this many distinct rows.
+LIVE_FEED_MAX_BATCH = int(env("LIVE_FEED_MAX_BATCH", "200"))
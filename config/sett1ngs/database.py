@@ -1,14 +1,40 @@
 import dj_database_url
 from .base import *
 
+# Connection pooling (config/db_backends/pooled_postgresql): every process keeps up
+# to DB_POOL["max_size"] connections, and Django hands them back to the pool instead
+# of closing them, so CONN_MAX_AGE drops to 0.
+DB_POOL_ENABLED = env("DB_POOL_ENABLED", "False") == "True"
+DB_POOL = {
+    "max_size": int(env("DB_POOL_MAX_SIZE", "20")),
+    # Seconds to wait for a free connection before failing.
+    "timeout": float(env("DB_POOL_TIMEOUT", "10")),
+    "max_lifetime": float(env("DB_POOL_MAX_LIFETIME", "1800")),
+    "max_idle": float(env("DB_POOL_MAX_IDLE", "300")),
+    # Idle connections older than this are checked with SELECT 1 before reuse.
+    "check_after": float(env("DB_POOL_CHECK_AFTER", "30")),
+}
+
 if deploy == "True":
     DATABASES = {
         "default": dj_database_url.config(
             default=env("DATABASE_URL"),
-            conn_max_age=600,
+            conn_max_age=0 if DB_POOL_ENABLED else 600,
             conn_health_checks=True,
         )
     }
+    # Read replicas (monitor/replicas.py), comma separated; they become "replica_0", "replica_1", ...
+    for index, url in enumerate(filter(None, env("DATABASE_REPLICA_URLS", "").split(","))):
+        DATABASES[f"replica_{index}"] = dj_database_url.parse(
+            url.strip(),
+            conn_max_age=0 if DB_POOL_ENABLED else 600,
+            conn_health_checks=True,
+        )
+        DATABASES[f"replica_{index}"]["TEST"] = {"MIRROR": "default"}
+    if DB_POOL_ENABLED:
+        for database in DATABASES.values():
+            if database["ENGINE"] == "django.db.backends.postgresql":
+                database.update(ENGINE="config.db_backends.pooled_postgresql", POOL=DB_POOL)
 else:
     DATABASES = {
         "default": {
@@ -16,3 +42,11 @@ else:
             "NAME": BASE_DIR / "db.sqlite3",
         }
     }
+
+DATABASE_ROUTERS = ["monitor.replicas.ReplicaRouter"]
+# Replicas further behind than this many seconds are skipped (reads go to the primary).
+REPLICA_MAX_LAG = float(env("REPLICA_MAX_LAG", "5"))
+# How often each process re-measures a replica's lag.
+REPLICA_LAG_CHECK_INTERVAL = float(env("REPLICA_LAG_CHECK_INTERVAL", "5"))
+# After a successful write, the user reads from the primary for this many seconds (0 disables).
+REPLICA_STICKY_SECONDS = int(env("REPLICA_STICKY_SECONDS", "10"))
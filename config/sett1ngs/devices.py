@@ -0,0 +1,11 @@
+from .base import *
+
+# SMS gateways publish received SMS on device/<device_id>/sms_rx and take
+# commands on device/<device_id>/commands.
+MQTT_SMS_RX_TOPIC = env("MQTT_SMS_RX_TOPIC", "device/+/sms_rx")
+MQTT_COMMAND_TOPIC = env("MQTT_COMMAND_TOPIC", "device/{device_id}/commands")
+
+# Create a Device row the first time an unknown device publishes.
+DEVICE_AUTO_REGISTER = env("DEVICE_AUTO_REGISTER", "True") == "True"
+# Used for outbound SMS while no enabled device is registered.
+DEFAULT_DEVICE_ID = env("DEFAULT_DEVICE_ID", "MC60")
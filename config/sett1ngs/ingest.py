@@ -0,0 +1,22 @@
+from .base import *
+
+# HTTP ingest for ESP32/SIM800 devices (monitor/ingest.py, POST ingest/sms/).
+# Payloads accepted in one request.
+INGEST_MAX_BATCH = int(env("INGEST_MAX_BATCH", "500"))
+# Rows per INSERT when concurrent requests share one.
+INGEST_INSERT_BATCH = int(env("INGEST_INSERT_BATCH", "2000"))
+# Device tokens: seconds in the shared cache, in each process, and for unknown tokens.
+INGEST_TOKEN_CACHE_TTL = int(env("INGEST_TOKEN_CACHE_TTL", "300"))
+INGEST_TOKEN_LOCAL_TTL = float(env("INGEST_TOKEN_LOCAL_TTL", "30"))
+INGEST_TOKEN_NEGATIVE_TTL = int(env("INGEST_TOKEN_NEGATIVE_TTL", "10"))
+INGEST_TOKEN_LOCAL_MAX = int(env("INGEST_TOKEN_LOCAL_MAX", "10000"))
+# Messages routed per transaction by the background router, its wait after a database error,
+# and how often a batch is retried before its messages are routed one by one.
+INGEST_ROUTE_BATCH = int(env("INGEST_ROUTE_BATCH", "200"))
+INGEST_ROUTE_RETRY_INTERVAL = float(env("INGEST_ROUTE_RETRY_INTERVAL", "2"))
+INGEST_ROUTE_RETRIES = int(env("INGEST_ROUTE_RETRIES", "3"))
+# Sweep for messages still unprocessed INGEST_SWEEP_AGE seconds after they were received, run by the
+# MQTT consumer and the ingest router every INGEST_SWEEP_INTERVAL seconds over the last INGEST_SWEEP_WINDOW seconds.
+INGEST_SWEEP_INTERVAL = float(env("INGEST_SWEEP_INTERVAL", "60"))
+INGEST_SWEEP_AGE = float(env("INGEST_SWEEP_AGE", "300"))
+INGEST_SWEEP_WINDOW = float(env("INGEST_SWEEP_WINDOW", "86400"))
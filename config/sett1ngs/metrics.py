@@ -0,0 +1,7 @@
+from .base import *
+
+# Optional bearer token required by GET /metrics.
+METRICS_TOKEN = env("METRICS_TOKEN")
+
+# Port of the /metrics server started by long-running commands (0 disables it).
+CONSUMER_METRICS_PORT = int(env("CONSUMER_METRICS_PORT", "9100"))
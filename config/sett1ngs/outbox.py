@@ -0,0 +1,31 @@
+from .base import *
+
+# Delivery outbox relay (manage.py relay_outbox, monitor/outbox.py).
+# Outbox rows claimed per round trip.
+OUTBOX_BATCH_SIZE = int(env("OUTBOX_BATCH_SIZE", "100"))
+# Threads making provider calls for a claimed batch.
+OUTBOX_WORKERS = int(env("OUTBOX_WORKERS", "8"))
+# Seconds a claimed row stays locked; rows of a relay that died are picked up again after this.
+OUTBOX_LEASE = float(env("OUTBOX_LEASE", "300"))
+# Seconds to wait before polling again when the outbox is empty.
+OUTBOX_POLL_INTERVAL = float(env("OUTBOX_POLL_INTERVAL", "0.5"))
+
+# "threads" sends each claimed batch from OUTBOX_WORKERS threads; "async" keeps up to
+# DELIVERY_MAX_IN_FLIGHT sends in flight on one event loop (monitor/async_delivery.py).
+OUTBOX_ENGINE = env("OUTBOX_ENGINE", "threads")
+DELIVERY_MAX_IN_FLIGHT = int(env("DELIVERY_MAX_IN_FLIGHT", "2000"))
+# Concurrent requests (and connections) per destination host.
+DELIVERY_PER_HOST_LIMIT = int(env("DELIVERY_PER_HOST_LIMIT", "100"))
+DELIVERY_HTTP2 = env("DELIVERY_HTTP2", "True") == "True"
+
+# Delivery outcomes are written in batches (monitor/status_writer.py): after this
+# many seconds or this many attempts, whichever comes first.
+STATUS_WRITER_FLUSH_INTERVAL = float(env("STATUS_WRITER_FLUSH_INTERVAL", "0.01"))
+STATUS_WRITER_MAX_BATCH = int(env("STATUS_WRITER_MAX_BATCH", "500"))
+
+# Capacity only high-priority (ForwardRule.Priority.HIGH) deliveries may use, so bulk
+# traffic cannot delay them: extra relay threads (threads engine), in-flight slots and
+# per-host slots (async engine).
+OUTBOX_RESERVED_WORKERS = int(env("OUTBOX_RESERVED_WORKERS", "2"))
+DELIVERY_RESERVED_IN_FLIGHT = int(env("DELIVERY_RESERVED_IN_FLIGHT", "200"))
+DELIVERY_RESERVED_PER_HOST = int(env("DELIVERY_RESERVED_PER_HOST", "10"))
@@ -0,0 +1,11 @@
+from .base import *
+
+# Multipart SMS reassembly (monitor/reassembly.py): "redis" shares buffered parts
+# between consumer replicas, "local" keeps them in process memory.
+REASSEMBLY_BACKEND = env("REASSEMBLY_BACKEND", "redis" if REDIS_LINK else "local")
+# Seconds to wait for the missing parts before storing what arrived.
+REASSEMBLY_TTL = float(env("REASSEMBLY_TTL", "120"))
+# Upper bound on buffered messages; beyond it the oldest are flushed early.
+REASSEMBLY_MAX_GROUPS = int(env("REASSEMBLY_MAX_GROUPS", "10000"))
+# How often the consumer flushes expired groups.
+REASSEMBLY_FLUSH_INTERVAL = float(env("REASSEMBLY_FLUSH_INTERVAL", "5"))
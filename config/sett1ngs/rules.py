@@ -0,0 +1,15 @@
+from .base import *
+
+# Rule simulation over message history (monitor/simulation.py, manage.py simulate_rules).
+# Rows read and evaluated per chunk.
+RULE_SIMULATION_CHUNK_SIZE = int(env("RULE_SIMULATION_CHUNK_SIZE", "20000"))
+# Processes evaluating chunks in manage.py simulate_rules; 0 or 1 evaluates in the
+# calling process. The API always evaluates inline, so requests cannot fork pools.
+RULE_SIMULATION_WORKERS = int(env("RULE_SIMULATION_WORKERS", str(os.cpu_count() or 1)))
+# Matching messages returned per candidate.
+RULE_SIMULATION_SAMPLES = int(env("RULE_SIMULATION_SAMPLES", "20"))
+RULE_SIMULATION_MAX_CANDIDATES = int(env("RULE_SIMULATION_MAX_CANDIDATES", "20"))
+
+# Per-rule evaluation/match counters (monitor/rulestats.py), added to Redis at most this often per process.
+RULE_STATS_ENABLED = env("RULE_STATS_ENABLED", "True") == "True"
+RULE_STATS_FLUSH_INTERVAL = float(env("RULE_STATS_FLUSH_INTERVAL", "10"))
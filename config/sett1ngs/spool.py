@@ -0,0 +1,18 @@
+from .base import *
+
+# Local write-ahead spool of the MQTT consumer (monitor/spool.py): messages that
+# cannot be stored while the database is down are kept here and replayed later.
+SPOOL_ENABLED = env("SPOOL_ENABLED", "True") == "True"
+# One directory per consumer process; mount it on a persistent volume.
+SPOOL_DIR = env("SPOOL_DIR", os.path.join(BASE_DIR, "spool"))
+# Segment files are sealed at this size and deleted once drained.
+SPOOL_SEGMENT_BYTES = int(env("SPOOL_SEGMENT_BYTES", str(16 * 1024 * 1024)))
+# Longest time an appended message may sit in the page cache before fsync.
+SPOOL_FSYNC_INTERVAL = float(env("SPOOL_FSYNC_INTERVAL", "0.05"))
+# Messages stored per bulk insert when draining.
+SPOOL_DRAIN_BATCH = int(env("SPOOL_DRAIN_BATCH", "500"))
+# Wait after a failed drain before trying the database again.
+SPOOL_RETRY_INTERVAL = float(env("SPOOL_RETRY_INTERVAL", "2"))
+# Failed drains of a batch, other than the database being unreachable, before its records
+# are stored one by one and those that still fail are moved to FailedLog.
+SPOOL_MAX_ATTEMPTS = int(env("SPOOL_MAX_ATTEMPTS", "5"))
@@ -0,0 +1,11 @@
+from .base import *
+
+# Monthly partitions of IncomingMessage/DeliveryAttempt (PostgreSQL only).
+PARTITION_MONTHS_AHEAD = int(env("PARTITION_MONTHS_AHEAD", "3"))
+RETENTION_KEEP_MONTHS = int(env("RETENTION_KEEP_MONTHS", "12"))
+
+ARCHIVE_ROOT = env("ARCHIVE_ROOT", os.path.join(BASE_DIR, "archive"))
+
+# Cold archive tier (monitor/archive.py): rows older than this move to files.
+COLD_ARCHIVE_ROOT = env("COLD_ARCHIVE_ROOT", os.path.join(ARCHIVE_ROOT, "cold"))
+COLD_ARCHIVE_AFTER_DAYS = int(env("COLD_ARCHIVE_AFTER_DAYS", "90"))
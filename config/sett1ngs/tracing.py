@@ -0,0 +1,11 @@
+from .base import *
+
+# Per-message pipeline spans, written as OTLP/JSON lines (monitor/tracing.py).
+# Off unless asked for: every message writes several spans.
+TRACING_ENABLED = env("TRACING_ENABLED", "False") == "True"
+TRACE_EXPORT_PATH = env("TRACE_EXPORT_PATH", os.path.join(BASE_DIR, "traces", "spans.jsonl"))
+# The export file is rotated to TRACE_EXPORT_PATH.1, .2, ... at this size; the oldest beyond
+# TRACE_BACKUP_COUNT is deleted.
+TRACE_MAX_BYTES = int(env("TRACE_MAX_BYTES", str(64 * 1024 * 1024)))
+TRACE_BACKUP_COUNT = int(env("TRACE_BACKUP_COUNT", "3"))
+TRACE_SERVICE_NAME = env("TRACE_SERVICE_NAME", "esp-server")
@@ -8,4 +8,13 @@ from config.sett1ngs.channels import *
 from config.sett1ngs.internationalization import *
 from config.sett1ngs.rest_framework import *
 from config.sett1ngs.celery import *
-from config.sett1ngs.rabbit import *
\ No newline at end of file
+from config.sett1ngs.rabbit import *
+from config.sett1ngs.storage import *
+from config.sett1ngs.metrics import *
+from config.sett1ngs.tracing import *
+from config.sett1ngs.reassembly import *
+from config.sett1ngs.devices import *
+from config.sett1ngs.outbox import *
+from config.sett1ngs.rules import *
+from config.sett1ngs.spool import *
+from config.sett1ngs.ingest import *
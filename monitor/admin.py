@@ -1,4 +1,10 @@
-from django.contrib import admin
+from collections import Counter
+
+from django.contrib import admin, messages
+from django.contrib.admin.views.main import ChangeList
+from django.db.models import Q
+from django.db.models.signals import post_save
+from django.utils import timezone
 
 from .models import (
     IncomingMessage,
@@ -7,7 +13,13 @@ from .models import (
     RuleDestination,
     DeliveryAttempt,
     FailedLog,
+    Device,
 )
+from .search import message_search_q, search_messages
+from .devices import current_load
+from .ingest import issue_ingest_token
+from .rulestats import reset_rule_stats, rule_stats
+from .services import replay_failed_log
 
 
 class TimeStampedReadonlyMixin:
@@ -15,6 +27,28 @@ class TimeStampedReadonlyMixin:
     readonly_fields = ("created_at", "updated_at")
 
 
+class PartitionedSaveMixin:
+    """
+    Saves edits with the partition key (as loaded) in the WHERE clause, so on
+    PostgreSQL only the row's own partition is searched (see partitions.py).
+    """
+    partition_key = None
+
+    def save_model(self, request, obj, form, change):
+        if not change:
+            return super().save_model(request, obj, form, change)
+        key = form.initial.get(self.partition_key, getattr(obj, self.partition_key))
+        obj.updated_at = timezone.now()
+        values = {
+            field.attname: getattr(obj, field.attname)
+            for field in obj._meta.concrete_fields
+            if not field.primary_key
+        }
+        type(obj).objects.filter(pk=obj.pk, **{self.partition_key: key}).update(**values)
+        # As save() would, so the live feed sees the edit.
+        post_save.send(sender=type(obj), instance=obj, created=False, update_fields=None, raw=False, using=obj._state.db)
+
+
 # ======================
 # RuleDestination inline (actions of a rule)
 # ======================
@@ -64,25 +98,43 @@ class DestinationChannelAdmin(TimeStampedReadonlyMixin, admin.ModelAdmin):
 # ======================
 # ForwardRule admin
 # ======================
+class ForwardRuleChangeList(ChangeList):
+    """Reads the rule stats of the whole page in one Redis round trip."""
+
+    def get_results(self, request):
+        super().get_results(request)
+        stats = rule_stats(rule.pk for rule in self.result_list)
+        for rule in self.result_list:
+            rule.stats = stats.get(rule.pk)
+
+
 @admin.register(ForwardRule)
 class ForwardRuleAdmin(TimeStampedReadonlyMixin, admin.ModelAdmin):
     list_display = (
         "id",
         "name",
         "is_enabled",
+        "priority",
         "stop_processing",
+        "evaluations",
+        "matches",
+        "avg_eval_us",
+        "last_matched_at",
         "created_at",
     )
-    list_filter = ( "is_enabled", "stop_processing")
+    list_filter = ( "is_enabled", "priority", "stop_processing")
     search_fields = ("name", "filters")
     ordering = ("name",)
     inlines = (RuleDestinationInline,)
+    readonly_fields = TimeStampedReadonlyMixin.readonly_fields + ("evaluation_stats",)
+    actions = ("reset_stats",)
 
     fieldsets = (
         ("Basic info", {
             "fields": (
                 "name",
                 "is_enabled",
+                "priority",
                 "stop_processing",
             ),
         }),
@@ -90,17 +142,64 @@ class ForwardRuleAdmin(TimeStampedReadonlyMixin, admin.ModelAdmin):
             "fields": ("filters",),
             "description": "JSON filters to match incoming messages. Empty means match-all.",
         }),
+        ("Statistics", {
+            "fields": ("evaluation_stats",),
+            "description": "Counted by the matcher in every process; flushed every few seconds.",
+        }),
         ("Timestamps", {
             "fields": ("created_at", "updated_at"),
         }),
     )
 
+    def get_changelist(self, request, **kwargs):
+        return ForwardRuleChangeList
+
+    def _stat(self, obj, name):
+        stats = getattr(obj, "stats", None)
+        return stats[name] if stats else None
+
+    def evaluations(self, obj):
+        return self._stat(obj, "evaluations")
+    evaluations.short_description = "Evaluations"
+
+    def matches(self, obj):
+        return self._stat(obj, "matches")
+    matches.short_description = "Matches"
+
+    def avg_eval_us(self, obj):
+        return self._stat(obj, "avg_eval_us")
+    avg_eval_us.short_description = "Avg eval (µs)"
+
+    def last_matched_at(self, obj):
+        return self._stat(obj, "last_matched_at")
+    last_matched_at.short_description = "Last matched"
+
+    def evaluation_stats(self, obj):
+        if obj.pk is None:
+            return "-"
+        stats = rule_stats([obj.pk]).get(obj.pk)
+        if stats is None:
+            return "Unavailable"
+        return (
+            f"{stats['evaluations']} evaluations, {stats['matches']} matches "
+            f"(rate {stats['match_rate']}), {stats['total_eval_ms']} ms in total, "
+            f"{stats['avg_eval_us']} µs on average, last matched {stats['last_matched_at'] or 'never'}"
+        )
+    evaluation_stats.short_description = "Evaluation stats"
+
+    @admin.action(description="Reset evaluation statistics")
+    def reset_stats(self, request, queryset):
+        rule_ids = list(queryset.values_list("pk", flat=True))
+        reset_rule_stats(rule_ids)
+        self.message_user(request, f"Statistics reset for {len(rule_ids)} rule(s).", messages.SUCCESS)
+
 
 # ======================
 # IncomingMessage admin
 # ======================
 @admin.register(IncomingMessage)
-class IncomingMessageAdmin(TimeStampedReadonlyMixin, admin.ModelAdmin):
+class IncomingMessageAdmin(PartitionedSaveMixin, TimeStampedReadonlyMixin, admin.ModelAdmin):
+    partition_key = "received_at"
     list_display = (
         "from_number",
         "to_number",
@@ -112,6 +211,8 @@ class IncomingMessageAdmin(TimeStampedReadonlyMixin, admin.ModelAdmin):
     search_fields = ("from_number", "to_number", "body")
     date_hierarchy = "received_at"
     ordering = ("-received_at",)
+    # Counting tens of millions of rows on every changelist load is slower than the search itself.
+    show_full_result_count = False
 
     readonly_fields = TimeStampedReadonlyMixin.readonly_fields + ("raw_payload",)
 
@@ -133,12 +234,16 @@ class IncomingMessageAdmin(TimeStampedReadonlyMixin, admin.ModelAdmin):
         }),
     )
 
+    def get_search_results(self, request, queryset, search_term):
+        return search_messages(queryset, search_term), False
+
 
 # ======================
 # DeliveryAttempt admin
 # ======================
 @admin.register(DeliveryAttempt)
-class DeliveryAttemptAdmin(TimeStampedReadonlyMixin, admin.ModelAdmin):
+class DeliveryAttemptAdmin(PartitionedSaveMixin, TimeStampedReadonlyMixin, admin.ModelAdmin):
+    partition_key = "created_at"
     list_display = (
         "message",
         "channel",
@@ -149,9 +254,10 @@ class DeliveryAttemptAdmin(TimeStampedReadonlyMixin, admin.ModelAdmin):
         "created_at",
     )
     list_filter = ("status", "channel__type",)
-    search_fields = ("message__body", "error", "provider_message_id")
+    search_fields = ("message__body", "message__from_number", "error", "provider_message_id")
     list_select_related = ("message", "channel", "rule")
     ordering = ("-created_at",)
+    show_full_result_count = False
 
     fieldsets = (
         ("Delivery info", {
@@ -171,6 +277,17 @@ class DeliveryAttemptAdmin(TimeStampedReadonlyMixin, admin.ModelAdmin):
         }),
     )
 
+    def get_search_results(self, request, queryset, search_term):
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        matching = IncomingMessage.objects.filter(message_search_q(search_term)).values("id")
+        return queryset.filter(
+            Q(message__in=matching)
+            | Q(error__icontains=search_term)
+            | Q(provider_message_id=search_term)
+        ), False
+
 
 # ======================
 # RuleDestination admin (optional, if you want to see it separately)
@@ -208,15 +325,67 @@ class RuleDestinationAdmin(TimeStampedReadonlyMixin, admin.ModelAdmin):
 
 @admin.register(FailedLog)
 class FailedLogAdmin(admin.ModelAdmin):
-    list_display = ('id', 'short_error', 'source_tag', 'created_at')
+    list_display = ('id', 'short_error', 'source_tag', 'created_at', 'replayed_at')
     
-    list_filter = ('source_tag', 'created_at')
+    list_filter = ('source_tag', 'created_at', ('replayed_at', admin.EmptyFieldListFilter))
     search_fields = ('error_message', 'raw_data')
     ordering = ('-created_at',)
-    readonly_fields = ('id', 'raw_data', 'error_message', 'source_tag', 'created_at', 'updated_at')
+    readonly_fields = (
+        'id', 'raw_data', 'error_message', 'source_tag', 'created_at', 'updated_at',
+        'replayed_at', 'replayed_message', 'replay_error',
+    )
+    actions = ('replay_selected',)
+
+    @admin.action(description="Replay selected failed logs")
+    def replay_selected(self, request, queryset):
+        # Large backlogs are better served by `manage.py replay_failed`, which runs in parallel.
+        outcomes = Counter(
+            replay_failed_log(log_id)
+            for log_id in queryset.filter(replayed_at__isnull=True).values_list('id', flat=True)
+        )
+        self.message_user(
+            request,
+            f"Replayed {outcomes['replayed']}, still failing {outcomes['failed']}, skipped {outcomes['skipped']}.",
+            messages.WARNING if outcomes['failed'] else messages.SUCCESS,
+        )
 
     def short_error(self, obj):
         if obj.error_message:
             return obj.error_message[:50] + "..." if len(obj.error_message) > 50 else obj.error_message
         return "No error message"
-    short_error.short_description = 'Error Summary'
\ No newline at end of file
+    short_error.short_description = 'Error Summary'
+
+
+# ======================
+# Device admin
+# ======================
+@admin.register(Device)
+class DeviceAdmin(TimeStampedReadonlyMixin, admin.ModelAdmin):
+    list_display = (
+        "device_id",
+        "name",
+        "phone_number",
+        "is_enabled",
+        "send_rate_per_minute",
+        "sent_this_minute",
+        "has_ingest_token",
+        "last_seen_at",
+    )
+    list_filter = ("is_enabled",)
+    search_fields = ("device_id", "name", "phone_number")
+    readonly_fields = TimeStampedReadonlyMixin.readonly_fields + ("last_seen_at",)
+    actions = ("issue_tokens",)
+
+    def sent_this_minute(self, obj):
+        return current_load([obj.device_id])[obj.device_id]
+    sent_this_minute.short_description = "Sent this minute"
+
+    @admin.display(boolean=True, description="HTTP ingest token")
+    def has_ingest_token(self, obj):
+        return bool(obj.ingest_token_hash)
+
+    @admin.action(description="Issue new HTTP ingest tokens (revokes the current ones)")
+    def issue_tokens(self, request, queryset):
+        # Only a hash is stored, so this message is the only place the tokens appear.
+        for device in queryset:
+            self.message_user(request, f"{device.device_id}: {issue_ingest_token(device)}", messages.WARNING)
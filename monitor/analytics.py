@@ -0,0 +1,100 @@
+# monitor/analytics.py
+from django.db import connection
+from django.db.models import Aggregate, Count, F, FloatField, Func
+
+from .models import DeliveryAttempt
+
+PERCENTILES = (("p50", 0.5), ("p95", 0.95), ("p99", 0.99))
+
+GROUPINGS = {
+    "channel": ("channel_id", "channel__name", "channel__type"),
+    "rule": ("rule_id", "rule__name"),
+}
+
+
+class PercentileCont(Aggregate):
+    """PostgreSQL `percentile_cont(fraction) WITHIN GROUP (ORDER BY expression)`."""
+    function = "percentile_cont"
+    template = "%(function)s(%(fraction)s) WITHIN GROUP (ORDER BY %(expressions)s)"
+    output_field = FloatField()
+
+    def __init__(self, expression, fraction, **extra):
+        super().__init__(expression, fraction=float(fraction), **extra)
+
+
+class EpochMilliseconds(Func):
+    """Milliseconds in a PostgreSQL interval."""
+    template = "(EXTRACT(EPOCH FROM %(expressions)s) * 1000)"
+    output_field = FloatField()
+
+
+def _metric_expression(metric: str):
+    if metric == "queue":
+        return EpochMilliseconds(F("dispatch_started_at") - F("enqueued_at"))
+    return F(f"{metric}_latency_ms" if metric == "total" else f"{metric}_duration_ms")
+
+
+def _metric_filter(metric: str) -> dict:
+    if metric == "queue":
+        return {"dispatch_started_at__isnull": False, "enqueued_at__isnull": False}
+    return {f"{metric}_latency_ms__isnull" if metric == "total" else f"{metric}_duration_ms__isnull": False}
+
+
+def _percentile_cont(sorted_values: list[float], fraction: float) -> float:
+    """Same interpolation as PostgreSQL's percentile_cont."""
+    position = fraction * (len(sorted_values) - 1)
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def latency_percentiles(start, end, metric: str, group_by: str) -> list[dict]:
+    """
+    p50/p95/p99 of a delivery latency metric per channel or per rule.
+
+    metric: "total" (since the message was received), "provider" (round trip)
+    or "queue" (enqueue to dispatch start). On PostgreSQL the percentiles are
+    computed by the database; other backends fall back to sorting in Python.
+    """
+    keys = GROUPINGS[group_by]
+    queryset = DeliveryAttempt.objects.filter(
+        created_at__gte=start, created_at__lt=end, **_metric_filter(metric)
+    )
+
+    if connection.vendor == "postgresql":
+        value = _metric_expression(metric)
+        rows = (
+            queryset.values(*keys)
+            .annotate(
+                count=Count("id"),
+                **{name: PercentileCont(value, fraction) for name, fraction in PERCENTILES},
+            )
+            .order_by(*keys)
+        )
+        return [_row(row, keys) for row in rows]
+
+    groups = {}
+    if metric == "queue":
+        values = queryset.values_list(*keys, "enqueued_at", "dispatch_started_at").iterator()
+        samples = ((row[:-2], (row[-1] - row[-2]).total_seconds() * 1000) for row in values)
+    else:
+        field = "total_latency_ms" if metric == "total" else f"{metric}_duration_ms"
+        samples = ((row[:-1], row[-1]) for row in queryset.values_list(*keys, field).iterator())
+    for group, sample in samples:
+        groups.setdefault(group, []).append(sample)
+
+    result = []
+    for group, samples in sorted(groups.items(), key=lambda item: [str(v) for v in item[0]]):
+        samples.sort()
+        row = dict(zip(keys, group), count=len(samples))
+        row.update({name: _percentile_cont(samples, fraction) for name, fraction in PERCENTILES})
+        result.append(_row(row, keys))
+    return result
+
+
+def _row(row: dict, keys) -> dict:
+    data = {key.replace("__", "_"): row[key] for key in keys}
+    data["count"] = row["count"]
+    for name, _ in PERCENTILES:
+        data[name] = round(row[name], 3) if row[name] is not None else None
+    return data
@@ -0,0 +1,244 @@
+# monitor/archive.py
+"""
+Cold archive tier for old IncomingMessage / DeliveryAttempt rows.
+
+Rows are moved out of the database into append-only files, one pair per UTC day:
+
+    <COLD_ARCHIVE_ROOT>/<dataset>/<YYYY-MM>/<YYYY-MM-DD>.seg   compressed blocks
+    <COLD_ARCHIVE_ROOT>/<dataset>/<YYYY-MM>/<YYYY-MM-DD>.idx   one JSON line per block
+
+Each block stores up to BLOCK_ROWS rows column by column (one JSON array per
+column) and is zlib-compressed. A block is appended and fsynced before its
+index line is written, so a crash can only leave an unindexed tail that
+readers never see. Readers mmap the segment and only decompress the blocks
+whose time range overlaps the query.
+"""
+import fcntl
+import json
+import mmap
+import os
+import uuid
+import zlib
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta, timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from .models import DeliveryAttempt, DeliveryOutbox, FailedLog, IncomingMessage
+
+BLOCK_ROWS = 1000
+
+DATASETS = {
+    "messages": {
+        "model": IncomingMessage,
+        "time_field": "received_at",
+        "columns": (
+            "id",
+            "from_number",
+            "to_number",
+            "body",
+            "received_at",
+            "created_at",
+            "processed",
+            "raw_payload",
+        ),
+    },
+    "deliveries": {
+        "model": DeliveryAttempt,
+        "time_field": "created_at",
+        "columns": (
+            "id",
+            "message_id",
+            "rule_id",
+            "channel_id",
+            "channel__type",
+            "status",
+            "provider_message_id",
+            "error",
+            "retry_count",
+            "created_at",
+            "last_attempt_at",
+        ),
+    },
+}
+
+
+def _encode(value):
+    if isinstance(value, datetime):
+        return value.astimezone(timezone.utc).isoformat()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    return value
+
+
+def _day_paths(dataset: str, day: date) -> tuple[str, str]:
+    directory = os.path.join(settings.COLD_ARCHIVE_ROOT, dataset, f"{day:%Y-%m}")
+    base = os.path.join(directory, f"{day:%Y-%m-%d}")
+    return f"{base}.seg", f"{base}.idx"
+
+
+@contextmanager
+def archive_lock():
+    """Only one archiver may append at a time."""
+    os.makedirs(settings.COLD_ARCHIVE_ROOT, exist_ok=True)
+    with open(os.path.join(settings.COLD_ARCHIVE_ROOT, ".lock"), "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def append_block(dataset: str, day: date, columns, rows) -> dict:
+    """Appends one columnar block for `day` and records it in the day index."""
+    segment_path, index_path = _day_paths(dataset, day)
+    os.makedirs(os.path.dirname(segment_path), exist_ok=True)
+
+    time_column = columns.index(DATASETS[dataset]["time_field"])
+    data = {name: [row[i] for row in rows] for i, name in enumerate(columns)}
+    block = zlib.compress(json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+
+    with open(segment_path, "ab") as segment:
+        offset = segment.tell()
+        segment.write(block)
+        segment.flush()
+        os.fsync(segment.fileno())
+
+    entry = {
+        "offset": offset,
+        "length": len(block),
+        "rows": len(rows),
+        "min_ts": min(row[time_column] for row in rows),
+        "max_ts": max(row[time_column] for row in rows),
+        "crc32": zlib.crc32(block),
+    }
+    with open(index_path, "a", encoding="utf-8") as index:
+        index.write(json.dumps(entry) + "\n")
+        index.flush()
+        os.fsync(index.fileno())
+    return entry
+
+
+def _delete_archived(dataset: str, ids) -> None:
+    """
+    Deletes archived rows. _raw_delete skips the cascade collector, so what the
+    ORM cascade would do to the rows pointing at them is done here: outbox rows
+    of archived deliveries are deleted, FailedLogs replayed into archived
+    messages are unlinked. Deliveries of archived messages are archived with
+    them (see _flush).
+    """
+    model = DATASETS[dataset]["model"]
+    with transaction.atomic():
+        if dataset == "deliveries":
+            DeliveryOutbox.objects.filter(attempt_id__in=ids).delete()
+        else:
+            FailedLog.objects.filter(replayed_message_id__in=ids).update(replayed_message=None)
+        model.objects.filter(id__in=ids)._raw_delete(model.objects.db)
+
+
+def _flush(dataset: str, day: date, columns, rows) -> int:
+    ids = [row[0] for row in rows]
+    if dataset == "messages":
+        # A message is never archived without its deliveries, whichever dataset runs first.
+        _archive_rows("deliveries", DeliveryAttempt.objects.filter(message_id__in=ids))
+    append_block(dataset, day, columns, rows)
+    # Rows are removed only after their block is durable; a crash in between
+    # leaves duplicates in the archive, which readers drop by id.
+    _delete_archived(dataset, ids)
+    return len(rows)
+
+
+def _archive_rows(dataset: str, queryset, chunk_size: int = 5000) -> int:
+    """Moves the rows of `queryset` into the cold archive, one block per day and BLOCK_ROWS rows."""
+    columns = DATASETS[dataset]["columns"]
+    time_field = DATASETS[dataset]["time_field"]
+    rows_iter = queryset.order_by(time_field, "id").values_list(*columns).iterator(chunk_size=chunk_size)
+    moved = 0
+    current_day = None
+    pending = []
+    for row in rows_iter:
+        row = [_encode(value) for value in row]
+        day = datetime.fromisoformat(row[columns.index(time_field)]).date()
+        if pending and (day != current_day or len(pending) >= BLOCK_ROWS):
+            moved += _flush(dataset, current_day, columns, pending)
+            pending = []
+        current_day = day
+        pending.append(row)
+    if pending:
+        moved += _flush(dataset, current_day, columns, pending)
+    return moved
+
+
+def archive_older_than(dataset: str, cutoff: datetime, chunk_size: int = 5000) -> int:
+    """
+    Moves every row of `dataset` older than `cutoff` into the cold archive.
+    Archiving messages also archives their deliveries, which are not counted.
+    """
+    config = DATASETS[dataset]
+    model = config["model"]
+
+    queryset = model.objects.filter(**{f"{config['time_field']}__lt": cutoff})
+    if dataset == "deliveries":
+        # Attempts of archived messages go too, even if they were created after the cutoff.
+        queryset = model.objects.filter(Q(created_at__lt=cutoff) | Q(message__received_at__lt=cutoff))
+
+    with archive_lock():
+        return _archive_rows(dataset, queryset, chunk_size)
+
+
+def _read_index(index_path: str) -> list[dict]:
+    entries = []
+    with open(index_path, encoding="utf-8") as index:
+        for line in index:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                # Torn last line from an interrupted append.
+                continue
+    return entries
+
+
+def iter_archived(dataset: str, start: datetime, end: datetime, predicate=None):
+    """
+    Yields archived rows (as dicts) with start <= time < end, oldest day first.
+    `predicate` is an optional callable applied to each row dict.
+    """
+    time_field = DATASETS[dataset]["time_field"]
+    start_key = start.astimezone(timezone.utc).isoformat()
+    end_key = end.astimezone(timezone.utc).isoformat()
+
+    day = start.astimezone(timezone.utc).date()
+    last_day = end.astimezone(timezone.utc).date()
+    while day <= last_day:
+        segment_path, index_path = _day_paths(dataset, day)
+        day += timedelta(days=1)
+        if not os.path.exists(index_path):
+            continue
+
+        seen = set()
+        with open(segment_path, "rb") as segment, mmap.mmap(segment.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            view = memoryview(mapped)
+            try:
+                for entry in _read_index(index_path):
+                    if entry["max_ts"] < start_key or entry["min_ts"] >= end_key:
+                        continue
+                    block = view[entry["offset"]:entry["offset"] + entry["length"]]
+                    intact = zlib.crc32(block) == entry["crc32"]
+                    payload = zlib.decompress(block) if intact else None
+                    # Release before yielding so the mmap can be closed if the caller stops early.
+                    block.release()
+                    if payload is None:
+                        continue
+                    data = json.loads(payload)
+                    names = list(data)
+                    for values in zip(*data.values()):
+                        row = dict(zip(names, values))
+                        if not (start_key <= row[time_field] < end_key) or row["id"] in seen:
+                            continue
+                        seen.add(row["id"])
+                        if predicate is None or predicate(row):
+                            yield row
+            finally:
+                view.release()
@@ -0,0 +1,180 @@
+# monitor/async_delivery.py
+"""
+asyncio delivery engine for the outbox relay (`relay_outbox --engine async`).
+
+Telegram, Bale and webhook sends share a set of `httpx.AsyncClient`s per
+provider, so thousands of requests can be in flight from a single thread: HTTP/2
+multiplexes them over a few connections where the server supports it, and
+keep-alive connections are reused otherwise. Concurrency is bounded globally
+(`max_in_flight`) and per destination host (`per_host`), of which
+`reserved_per_host` slots are kept for high-priority sends so a burst of bulk
+traffic to one host cannot queue them. SMS commands still go through the
+blocking MQTT client and run on a small thread pool.
+
+Each provider's connections are spread over several small clients: httpcore's
+pool does work proportional to waiting requests times open connections on
+every request, so one client with hundreds of connections spends its time in
+pool bookkeeping (1000 requests over 100 connections: ~25s with one client,
+~3s with ten).
+
+The engine only sets each attempt's outcome; saving is left to the caller,
+so results can be written back in bulk.
+"""
+import asyncio
+import contextlib
+import importlib.util
+import itertools
+import logging
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import httpx
+from django.conf import settings
+from django.utils import timezone
+
+from .models import DeliveryAttempt, DestinationChannel, IncomingMessage
+from .services import chat_credentials, delivery_text, finish_attempt, send_sms_command, webhook_request
+from .tracing import set_span_attributes, span
+
+logger = logging.getLogger(__name__)
+
+TELEGRAM_TIMEOUT = 10
+BALE_TIMEOUT = 8
+WEBHOOK_TIMEOUT = 8
+CONNECTIONS_PER_CLIENT = 10
+
+
+def http2_available() -> bool:
+    """HTTP/2 in httpx needs the optional `h2` package."""
+    return importlib.util.find_spec("h2") is not None
+
+
+class ClientShards:
+    """Round-robins requests over `ceil(connections / CONNECTIONS_PER_CLIENT)` clients."""
+
+    def __init__(self, connections: int, **client_options):
+        size = min(connections, CONNECTIONS_PER_CLIENT)
+        limits = httpx.Limits(max_connections=size, max_keepalive_connections=size)
+        self.clients = [
+            httpx.AsyncClient(limits=limits, **client_options)
+            for _ in range(math.ceil(connections / size))
+        ]
+        self._next = itertools.cycle(self.clients)
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        return await next(self._next).post(url, **kwargs)
+
+    async def aclose(self):
+        await asyncio.gather(*(client.aclose() for client in self.clients))
+
+
+class AsyncDeliveryEngine:
+    def __init__(
+        self,
+        max_in_flight: int,
+        per_host: int,
+        http2: bool = True,
+        sms_workers: int = 4,
+        reserved_per_host: int = 0,
+    ):
+        if http2 and not http2_available():
+            logger.warning("h2 is not installed; delivering over HTTP/1.1.")
+            http2 = False
+        self.http2 = http2
+        self.per_host = per_host
+        self.reserved_per_host = max(min(reserved_per_host, per_host - 1), 0)
+        self._in_flight = asyncio.Semaphore(max_in_flight)
+        self._hosts = {}
+        self._sms_executor = ThreadPoolExecutor(max_workers=sms_workers, thread_name_prefix="sms-send")
+
+        # Never more requests per host than connections, so none wait inside httpx's pool.
+        self.clients = {
+            # Telegram is the only provider reached through PROXY, as in behaviors.py.
+            DestinationChannel.ChannelType.TELEGRAM: ClientShards(
+                per_host, http2=http2, timeout=TELEGRAM_TIMEOUT, proxy=settings.PROXY or None
+            ),
+            DestinationChannel.ChannelType.Bale: ClientShards(per_host, http2=http2, timeout=BALE_TIMEOUT),
+            DestinationChannel.ChannelType.WEBHOOK: ClientShards(per_host, http2=http2, timeout=WEBHOOK_TIMEOUT),
+        }
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        await asyncio.gather(*(client.aclose() for client in self.clients.values()))
+        self._sms_executor.shutdown(wait=True)
+
+    def _host_limits(self, url: str) -> tuple[asyncio.Semaphore, asyncio.Semaphore]:
+        """(all sends, non-high-priority sends) semaphores of the url's host."""
+        host = urlsplit(url).netloc
+        limits = self._hosts.get(host)
+        if limits is None:
+            limits = self._hosts[host] = (
+                asyncio.Semaphore(self.per_host),
+                asyncio.Semaphore(self.per_host - self.reserved_per_host),
+            )
+        return limits
+
+    async def _post(self, channel_type, url: str, payload: dict, high: bool) -> httpx.Response:
+        host, shared = self._host_limits(url)
+        # Other sends hold at most per_host - reserved_per_host host slots,
+        # so high-priority ones always find one free.
+        async with (contextlib.nullcontext() if high else shared), host:
+            return await self.clients[channel_type].post(url, json=payload)
+
+    async def _send_chat(self, channel_type, base_url: str, name: str, channel, message, high: bool) -> str:
+        token, chat_id = chat_credentials(channel)
+        response = await self._post(
+            channel_type,
+            f"{base_url}/bot{token}/sendMessage",
+            {"chat_id": chat_id, "text": delivery_text(message)},
+            high,
+        )
+        if response.status_code != 200:
+            raise RuntimeError(f"{name} HTTP {response.status_code}: {response.text[:200]}")
+        data = response.json()
+        if not data.get("ok"):
+            raise RuntimeError(f"{name} API error: {data}")
+        return data["result"].get("message_id")
+
+    async def _send(self, attempt: DeliveryAttempt, message: IncomingMessage, high: bool):
+        channel = attempt.channel
+        if channel.type == DestinationChannel.ChannelType.TELEGRAM:
+            return await self._send_chat(channel.type, settings.TELEGRAM_API_BASE, "Telegram", channel, message, high)
+
+        if channel.type == DestinationChannel.ChannelType.Bale:
+            return await self._send_chat(channel.type, settings.BALE_API_BASE, "Bale", channel, message, high)
+
+        if channel.type == DestinationChannel.ChannelType.SMS:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._sms_executor, send_sms_command, channel, message)
+
+        if channel.type == DestinationChannel.ChannelType.WEBHOOK:
+            url, payload = webhook_request(channel, message)
+            response = await self._post(channel.type, url, payload, high)
+            response.raise_for_status()
+            return f"HTTP_{response.status_code}"
+
+        raise NotImplementedError(f"Channel type {channel.type} not supported yet.")
+
+    async def deliver(self, attempt: DeliveryAttempt, high: bool = False) -> DeliveryAttempt:
+        """Sends one attempt and records its outcome on it (not saved). `high` may use reserved host slots."""
+        async with self._in_flight:
+            message = attempt.message
+            with span("delivery.execute", trace_id=message.trace_id or None):
+                channel = attempt.channel
+                set_span_attributes(attempt_id=str(attempt.id), channel_type=channel.type, channel=channel.name)
+                attempt.dispatch_started_at = timezone.now()
+                started = time.perf_counter()
+                try:
+                    provider_id = await self._send(attempt, message, high)
+                except Exception as e:
+                    finish_attempt(attempt, message, time.perf_counter() - started, error=e)
+                else:
+                    finish_attempt(attempt, message, time.perf_counter() - started, provider_id=provider_id)
+        return attempt
@@ -1,10 +1,10 @@
 import requests
 import json
-from config.settings import PROXY
+from django.conf import settings
 
 def send_bale_message(token: str, chat_id: str | int, text: str, reply_to_message_id: int | None = None):
 
-    url = f"https://tapi.bale.ai/bot{token}/sendMessage"
+    url = f"{settings.BALE_API_BASE}/bot{token}/sendMessage"
     payload = {
         "chat_id": chat_id,
         "text": text,
@@ -32,7 +32,7 @@ def send_telegram_message(token: str, chat_id: int | str, text: str,
                           parse_mode: str | None = None,
                           reply_to_message_id: int | None = None,
                           disable_web_page_preview: bool | None = None):
-    url = f"https://api.telegram.org/bot{token}/sendMessage"
+    url = f"{settings.TELEGRAM_API_BASE}/bot{token}/sendMessage"
     payload = {"chat_id": chat_id, "text": text}
     if parse_mode:
         payload["parse_mode"] = parse_mode
@@ -41,7 +41,7 @@ def send_telegram_message(token: str, chat_id: int | str, text: str,
     if disable_web_page_preview is not None:
         payload["disable_web_page_preview"] = disable_web_page_preview
     
-    proxy_url = PROXY
+    proxy_url = settings.PROXY
     proxies = {
             "http": proxy_url,
             "https": proxy_url, 
@@ -0,0 +1,6 @@
+# monitor/bench/__init__.py
+"""
+Building blocks for the ingest benchmark (`manage.py bench_ingest`): an
+in-process stand-in for the MQTT broker, stub provider APIs and a generator
+of realistic MC60 payloads.
+"""
@@ -0,0 +1,57 @@
+# monitor/bench/broker.py
+import queue
+import threading
+import time
+
+import paho.mqtt.client as mqtt
+
+_STOP = object()
+
+
+class InProcessBroker:
+    """
+    Stand-in for the MQTT broker: `publish()` queues a real paho MQTTMessage
+    (stamped with time.monotonic() as paho does on receipt) and worker threads
+    hand each one to `on_message(client, userdata, msg)`, the same callback
+    the consumer registers with paho.
+    """
+
+    def __init__(self, on_message, workers: int = 1, on_worker_exit=None):
+        self.on_message = on_message
+        self.on_worker_exit = on_worker_exit
+        self._queue = queue.Queue()
+        self._mid = 0
+        self._threads = [
+            threading.Thread(target=self._run, name=f"bench-broker-{n}", daemon=True)
+            for n in range(workers)
+        ]
+
+    def start(self):
+        for thread in self._threads:
+            thread.start()
+
+    def publish(self, topic: str, payload: bytes, qos: int = 1):
+        self._mid += 1
+        msg = mqtt.MQTTMessage(mid=self._mid, topic=topic.encode("utf-8"))
+        msg.payload = payload
+        msg.qos = qos
+        msg.timestamp = time.monotonic()
+        self._queue.put(msg)
+
+    def backlog(self) -> int:
+        return self._queue.qsize()
+
+    def close(self):
+        """Waits for every published message to be handled, then stops the workers."""
+        for _ in self._threads:
+            self._queue.put(_STOP)
+        for thread in self._threads:
+            thread.join()
+
+    def _run(self):
+        try:
+            while (msg := self._queue.get()) is not _STOP:
+                self.on_message(None, None, msg)
+        finally:
+            if self.on_worker_exit:
+                self.on_worker_exit()
@@ -0,0 +1,74 @@
+# monitor/bench/payloads.py
+import random
+
+# Sender numbers are drawn from this prefix so benchmark rows are easy to find and delete.
+BENCH_SENDER_PREFIX = "+98999000"
+
+PERSIAN_BODIES = [
+    "بانک ملت\nبرداشت: 1,250,000 ریال\nمانده: 38,420,000\nحساب 1234",
+    "کد تایید شما: 482913\nاین کد را در اختیار دیگران قرار ندهید.",
+    "بانک پارسیان\nواریز 5,000,000 ریال به حساب 7788\n1403/07/21 14:32",
+    "مشترک گرامی، بسته اینترنت شما تا 3 روز دیگر به پایان می رسد.",
+    "رمز یکبار مصرف: 907155 مهلت استفاده 2 دقیقه",
+]
+
+LATIN_BODIES = [
+    "Your verification code is 318204",
+    "ALERT: card ending 4411 charged 12.50 USD at ONLINE STORE",
+    "Delivery scheduled for tomorrow between 9:00 and 12:00",
+    "Balance: 1,204.22 EUR. Available: 1,100.00 EUR",
+]
+
+
+def encode_ucs2(text: str) -> str:
+    """Encodes a body the way the MC60 reports UCS2 messages: UTF-16BE as upper-case hex."""
+    return text.encode("utf-16-be").hex().upper()
+
+
+def encode_ucs2_segments(text: str, reference: int, chars_per_segment: int = 67) -> list[str]:
+    """
+    Splits a long UCS2 message into concatenated SMS parts, each prefixed with
+    the 8-bit reference UDH (05 00 03 ref total seq) and hex encoded.
+    """
+    chunks = [text[i:i + chars_per_segment] for i in range(0, len(text), chars_per_segment)]
+    total = len(chunks)
+    return [
+        (bytes([0x05, 0x00, 0x03, reference & 0xFF, total, sequence]) + chunk.encode("utf-16-be")).hex().upper()
+        for sequence, chunk in enumerate(chunks, start=1)
+    ]
+
+
+class MC60PayloadGenerator:
+    """
+    Produces `sender:content` payloads as published by the MC60 firmware.
+    `unicode_ratio` of the bodies are Persian and arrive UTF-16 hex encoded;
+    the rest are plain GSM text. `multipart_ratio` of the Persian messages are
+    long and arrive as several concatenated parts, published back to back.
+    """
+
+    def __init__(self, seed: int = 0, unicode_ratio: float = 0.7, senders: int = 50, multipart_ratio: float = 0.0):
+        self.random = random.Random(seed)
+        self.unicode_ratio = unicode_ratio
+        self.multipart_ratio = multipart_ratio
+        self.senders = [f"{BENCH_SENDER_PREFIX}{n:04d}" for n in range(senders)]
+        self._pending = []
+
+    def payload(self) -> bytes:
+        if self._pending:
+            return self._pending.pop(0)
+
+        sender = self.random.choice(self.senders)
+        if self.random.random() < self.unicode_ratio:
+            if self.random.random() < self.multipart_ratio:
+                text = "\n".join(self.random.sample(PERSIAN_BODIES, 3))
+                parts = encode_ucs2_segments(text, self.random.randrange(256))
+                self._pending = [f"{sender}:{part}".encode("utf-8") for part in parts[1:]]
+                return f"{sender}:{parts[0]}".encode("utf-8")
+            content = encode_ucs2(self.random.choice(PERSIAN_BODIES))
+        else:
+            content = self.random.choice(LATIN_BODIES)
+        return f"{sender}:{content}".encode("utf-8")
+
+    def __iter__(self):
+        while True:
+            yield self.payload()
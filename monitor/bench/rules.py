@@ -0,0 +1,100 @@
+# monitor/bench/rules.py
+"""
+Synthetic ForwardRule filters and SMS corpora for `manage.py bench_rules`.
+Rules and messages are unsaved model instances, so no database is needed.
+"""
+import random
+
+from ..models import ForwardRule, IncomingMessage
+from .payloads import BENCH_SENDER_PREFIX
+
+PERSIAN_WORDS = [
+    "بانک", "ملت", "پارسیان", "ملی", "سپه", "واریز", "برداشت", "مانده", "حساب", "ریال",
+    "کد", "تایید", "رمز", "یکبار", "مصرف", "مشترک", "گرامی", "بسته", "اینترنت", "شارژ",
+    "قسط", "وام", "سررسید", "پرداخت", "خرید", "کارت", "انتقال", "موفق", "ناموفق", "تاریخ",
+]
+ENGLISH_WORDS = [
+    "bank", "account", "balance", "credit", "debit", "card", "payment", "transfer", "code",
+    "verification", "OTP", "login", "alert", "declined", "approved", "amount", "USD", "EUR",
+    "order", "delivery", "scheduled", "package", "invoice", "due", "reminder", "subscription",
+]
+KEYWORDS = [
+    "بانک ملت", "پارسیان", "واریز", "برداشت", "کد تایید", "رمز یکبار",
+    "balance", "OTP", "declined", "verification code", "transfer",
+]
+REGEXES = [
+    r"\d{5,6}",
+    r"(پارسیان|ملت)",
+    r"واریز\s+\d",
+    r"(?i)otp|verification",
+    r"\d{1,3}(,\d{3})+",
+    r"card ending \d{4}",
+]
+SENDERS = [f"{BENCH_SENDER_PREFIX}{n:04d}" for n in range(200)]
+
+
+def _condition(rng: random.Random) -> dict:
+    op = rng.choice(["eq", "neq", "contains", "icontains", "regex"])
+    if op in ("eq", "neq"):
+        return {"field": "from_number", "op": op, "value": rng.choice(SENDERS)}
+    if op == "regex":
+        # Unique suffixes make every pattern distinct, like hand-written rules are.
+        pattern = rng.choice(REGEXES)
+        return {"field": "body", "op": op, "value": f"{pattern}|never-{rng.randrange(10**9)}"}
+    return {"field": "body", "op": op, "value": rng.choice(KEYWORDS)}
+
+
+def conditions_filters(rng: random.Random) -> dict:
+    """A filter in the `all`/`any` schema read by utils.rule_matches_message."""
+    return {rng.choice(["all", "any"]): [_condition(rng) for _ in range(rng.randint(1, 4))]}
+
+
+def simple_filters(rng: random.Random) -> dict:
+    """A filter in the body_contains/from_number_is schema read by services._check_message_filters."""
+    filters = {}
+    if rng.random() < 0.8:
+        filters["body_contains"] = rng.choice(KEYWORDS)
+    if rng.random() < 0.3 or not filters:
+        filters["from_number_is"] = rng.choice(SENDERS)
+    return filters
+
+
+FILTER_SCHEMAS = {
+    "conditions": conditions_filters,
+    "simple": simple_filters,
+}
+
+
+def synthetic_rules(schema: str, count: int, seed: int = 0) -> list[ForwardRule]:
+    rng = random.Random(seed)
+    make = FILTER_SCHEMAS[schema]
+    return [ForwardRule(name=f"bench-{n}", filters=make(rng)) for n in range(count)]
+
+
+def synthetic_messages(count: int, body_length: int, persian_ratio: float = 0.7, seed: int = 0) -> list[IncomingMessage]:
+    """
+    Messages of roughly `body_length` characters built from banking/OTP style
+    vocabulary, with keywords and digits sprinkled in so some rules match.
+    """
+    rng = random.Random(seed)
+    messages = []
+    for _ in range(count):
+        words = PERSIAN_WORDS if rng.random() < persian_ratio else ENGLISH_WORDS
+        parts = []
+        length = 0
+        while length < body_length:
+            roll = rng.random()
+            if roll < 0.1:
+                part = rng.choice(KEYWORDS)
+            elif roll < 0.2:
+                part = f"{rng.randrange(10**7):,}"
+            else:
+                part = rng.choice(words)
+            parts.append(part)
+            length += len(part) + 1
+        messages.append(IncomingMessage(
+            from_number=rng.choice(SENDERS),
+            to_number="MC60_GATEWAY",
+            body=" ".join(parts)[:body_length],
+        ))
+    return messages
@@ -0,0 +1,98 @@
+# monitor/bench/stubs.py
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _ProviderHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        server = self.server
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        time.sleep(server.delay())
+
+        if server.should_fail():
+            server.count("errors")
+            self._reply(502, {"ok": False, "description": "stub provider error"})
+            return
+
+        try:
+            json.loads(body or b"{}")
+        except ValueError:
+            server.count("errors")
+            self._reply(400, {"ok": False, "description": "invalid JSON"})
+            return
+
+        server.count("ok")
+        if self.path.endswith("/sendMessage"):
+            # Telegram and Bale share the Bot API response shape.
+            self._reply(200, {"ok": True, "result": {"message_id": server.next_id()}})
+        else:
+            self._reply(200, {"received": True})
+
+    def _reply(self, code, payload):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubProviderServer(ThreadingHTTPServer):
+    """
+    Local HTTP server that answers like the Telegram/Bale Bot API
+    (`POST /bot<token>/sendMessage`) and like a webhook receiver (any other
+    path), after `latency_ms` ± `jitter_ms` and failing `error_rate` of requests.
+    """
+    daemon_threads = True
+    # The async relay opens hundreds of connections at once.
+    request_queue_size = 1024
+
+    def __init__(self, latency_ms=50.0, jitter_ms=0.0, error_rate=0.0, seed=0, host="127.0.0.1", port=0):
+        super().__init__((host, port), _ProviderHandler)
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.counts = {"ok": 0, "errors": 0}
+        self._message_id = 0
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self.serve_forever, name="bench-stub-provider", daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def delay(self) -> float:
+        with self._lock:
+            jitter = self.random.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0.0
+        return max(self.latency_ms + jitter, 0.0) / 1000
+
+    def should_fail(self) -> bool:
+        with self._lock:
+            return self.random.random() < self.error_rate
+
+    def next_id(self) -> int:
+        with self._lock:
+            self._message_id += 1
+            return self._message_id
+
+    def count(self, key):
+        with self._lock:
+            self.counts[key] += 1
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
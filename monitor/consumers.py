@@ -0,0 +1,206 @@
+# monitor/consumers.py
+import asyncio
+import json
+
+from channels.exceptions import StopConsumer
+from channels.generic.http import AsyncHttpConsumer
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+from django.conf import settings
+from django.db import DatabaseError
+
+from . import ingest
+from .live import LIVE_FEED_GROUP
+from .metrics import INGEST_FAILURES, MESSAGES_INGESTED
+from .serializers import IncomingSmsPayloadSerializer
+
+STREAMS = ("messages", "deliveries")
+
+# Filters a dashboard may set per stream; lists match any of their values.
+FILTERS = {
+    "messages": ("from_number", "to_number", "body_contains", "processed"),
+    "deliveries": ("status", "channel_id", "rule_id", "message_id"),
+}
+
+
+def _matches(stream: str, data: dict, filters: dict) -> bool:
+    for key, expected in filters.get(stream, {}).items():
+        if key == "body_contains":
+            if expected.lower() not in (data.get("body") or "").lower():
+                return False
+        elif isinstance(expected, list):
+            if data.get(key) not in expected:
+                return False
+        elif data.get(key) != expected:
+            return False
+    return True
+
+
+class LiveFeedConsumer(AsyncJsonWebsocketConsumer):
+    """
+    Pushes new messages and delivery status changes to dashboards.
+
+    After connecting, a client may send
+        {"action": "subscribe", "streams": ["deliveries"],
+         "filters": {"deliveries": {"status": ["failed"], "channel_id": "..."}}}
+    Events are filtered server side and buffered for LIVE_FEED_FLUSH_INTERVAL;
+    repeated updates of the same row within that window collapse into the latest
+    one, and the buffer goes out as
+        {"type": "batch", "events": [{"stream": ..., "data": {...}}, ...]}
+    """
+
+    async def connect(self):
+        user = self.scope.get("user")
+        if user is None or not user.is_authenticated:
+            await self.close(code=4401)
+            return
+
+        self.streams = set(STREAMS)
+        self.filters = {}
+        self.pending = {}
+        self.flush_handle = None
+
+        await self.channel_layer.group_add(LIVE_FEED_GROUP, self.channel_name)
+        await self.accept()
+
+    async def disconnect(self, code):
+        if getattr(self, "flush_handle", None):
+            self.flush_handle.cancel()
+        if hasattr(self, "pending"):
+            await self.channel_layer.group_discard(LIVE_FEED_GROUP, self.channel_name)
+
+    async def receive_json(self, content, **kwargs):
+        if not isinstance(content, dict) or content.get("action") != "subscribe":
+            await self.send_json({"type": "error", "detail": "Expected {\"action\": \"subscribe\", ...}."})
+            return
+
+        streams = content.get("streams", list(STREAMS))
+        filters = content.get("filters") or {}
+        error = self._validate(streams, filters)
+        if error:
+            await self.send_json({"type": "error", "detail": error})
+            return
+
+        self.streams = set(streams)
+        self.filters = filters
+        self.pending.clear()
+        await self.send_json({"type": "subscribed", "streams": sorted(self.streams), "filters": self.filters})
+
+    def _validate(self, streams, filters):
+        if not isinstance(streams, list) or not set(streams) <= set(STREAMS):
+            return f"streams must be a list of: {', '.join(STREAMS)}."
+        if not isinstance(filters, dict):
+            return "filters must be an object keyed by stream."
+        for stream, stream_filters in filters.items():
+            if stream not in FILTERS or not isinstance(stream_filters, dict):
+                return f"Unknown filter stream: {stream}."
+            unknown = set(stream_filters) - set(FILTERS[stream])
+            if unknown:
+                return f"Unknown {stream} filters: {', '.join(sorted(unknown))}."
+            for key, value in stream_filters.items():
+                if key == "body_contains":
+                    if not isinstance(value, str) or not value:
+                        return "body_contains must be a non-empty string."
+                elif not all(isinstance(item, (str, bool)) for item in (value if isinstance(value, list) else [value])):
+                    return f"{stream} filter {key} must be a string, a boolean or a list of them."
+        return None
+
+    async def live_events(self, event):
+        """Handler for the group messages sent by live.LivePublisher."""
+        for item in event["events"]:
+            stream, data = item["stream"], item["data"]
+            if stream in self.streams and _matches(stream, data, self.filters):
+                self.pending[(stream, data["id"])] = data
+
+        if len(self.pending) >= settings.LIVE_FEED_MAX_BATCH:
+            await self.flush()
+        elif self.pending and self.flush_handle is None:
+            self.flush_handle = asyncio.get_running_loop().call_later(
+                settings.LIVE_FEED_FLUSH_INTERVAL, lambda: asyncio.ensure_future(self.flush())
+            )
+
+    async def flush(self):
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        if not self.pending:
+            return
+        events = [{"stream": stream, "data": data} for (stream, _), data in self.pending.items()]
+        self.pending = {}
+        await self.send_json({"type": "batch", "events": events})
+
+
+class DeviceIngestConsumer(AsyncHttpConsumer):
+    """
+    HTTP ingest for ESP32/SIM800 devices: POST one IncomingSmsPayloadSerializer
+    payload, or an array of up to INGEST_MAX_BATCH of them, each carrying its
+    device's ingest token. Messages are stored before the 202 response and
+    routed in the background (see monitor/ingest.py).
+
+    Served ahead of Django (config/asgi.py): devices use none of the session,
+    CSRF or auth middleware, and on an async request each of those costs a
+    hop to a thread.
+    """
+    # HTTP only; nothing is ever sent to this consumer through the channel layer.
+    channel_layer_alias = None
+
+    received = 0
+
+    async def http_request(self, message):
+        self.received += len(message.get("body", b""))
+        limit = settings.DATA_UPLOAD_MAX_MEMORY_SIZE
+        if limit is not None and self.received > limit:
+            INGEST_FAILURES.labels("http", "parse").inc()
+            await self.respond(413, {"detail": f"Body exceeds {limit} bytes."})
+            raise StopConsumer()
+        await super().http_request(message)
+
+    async def respond(self, status, data, headers=()):
+        body = json.dumps(data, ensure_ascii=False).encode()
+        await self.send_response(
+            status,
+            body,
+            headers=[(b"Content-Type", b"application/json"), (b"Content-Length", b"%d" % len(body)), *headers],
+        )
+
+    async def handle(self, body):
+        if self.scope["method"] != "POST":
+            await self.respond(405, {"detail": "Method not allowed."}, headers=[(b"Allow", b"POST")])
+            return
+
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            INGEST_FAILURES.labels("http", "parse").inc()
+            await self.respond(400, {"detail": "Body must be JSON."})
+            return
+
+        items = payload if isinstance(payload, list) else [payload]
+        if not items or len(items) > settings.INGEST_MAX_BATCH or not all(isinstance(item, dict) for item in items):
+            INGEST_FAILURES.labels("http", "parse").inc()
+            await self.respond(400, {"detail": f"Send one payload object or an array of 1 to {settings.INGEST_MAX_BATCH}."})
+            return
+
+        serializer = IncomingSmsPayloadSerializer(data=items, many=True)
+        if not serializer.is_valid():
+            INGEST_FAILURES.labels("http", "parse").inc()
+            await self.respond(400, serializer.errors if isinstance(payload, list) else serializer.errors[0])
+            return
+        data = serializer.validated_data
+
+        try:
+            devices = await ingest.devices_for_tokens(item["token"] for item in data)
+            messages = ingest.build_messages(data, items, devices)
+            await ingest.store_messages(messages)
+        except ingest.InvalidToken:
+            INGEST_FAILURES.labels("http", "auth").inc()
+            await self.respond(401, {"detail": "Invalid device token."})
+            return
+        except DatabaseError as e:
+            INGEST_FAILURES.labels("http", "database").inc()
+            print(f"Database Error: {e}")
+            await self.respond(503, {"detail": "Temporarily unavailable."}, headers=[(b"Retry-After", b"5")])
+            return
+
+        MESSAGES_INGESTED.labels("http").inc(len(messages))
+        ingest.get_router().submit(messages)
+        await self.respond(202, {"accepted": len(messages), "ids": [str(message.id) for message in messages]})
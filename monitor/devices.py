@@ -0,0 +1,113 @@
+# monitor/devices.py
+"""
+Device registry helpers: which modem an inbound SMS came from, and which
+modem an outbound SMS should be sent through.
+
+Outbound load is counted per device and minute in the shared cache, so every
+web/worker process sees the same numbers when picking the least-loaded device.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import Device
+
+# Devices are looked up once per process; last_seen_at is refreshed at most this often.
+TOUCH_INTERVAL = 60
+
+_known = {}
+_known_lock = threading.Lock()
+
+
+def device_id_from_topic(topic: str) -> str | None:
+    """The segment matched by `+` in MQTT_SMS_RX_TOPIC, e.g. "MC60" for device/MC60/sms_rx."""
+    pattern = settings.MQTT_SMS_RX_TOPIC.split("/")
+    levels = topic.split("/")
+    if "+" not in pattern or len(levels) != len(pattern):
+        return None
+    return levels[pattern.index("+")] or None
+
+
+def command_topic(device_id: str) -> str:
+    return settings.MQTT_COMMAND_TOPIC.format(device_id=device_id)
+
+
+def device_for_topic(topic: str) -> Device | None:
+    """Device that published on `topic`, registering it on first sight if enabled."""
+    device_id = device_id_from_topic(topic)
+    if device_id is None:
+        return None
+
+    now = time.monotonic()
+    with _known_lock:
+        cached = _known.get(device_id)
+    if cached is not None and now - cached[1] < TOUCH_INTERVAL:
+        return cached[0]
+
+    device = Device.objects.filter(device_id=device_id).first()
+    if device is None and settings.DEVICE_AUTO_REGISTER:
+        device, _ = Device.objects.get_or_create(device_id=device_id, defaults={"last_seen_at": timezone.now()})
+    elif device is not None:
+        Device.objects.filter(pk=device.pk).update(last_seen_at=timezone.now())
+
+    with _known_lock:
+        _known[device_id] = (device, now)
+    return device
+
+
+def forget_devices() -> None:
+    """Drops this process's device cache (e.g. after devices were deleted)."""
+    with _known_lock:
+        _known.clear()
+
+
+def _load_key(device_id: str, minute: int) -> str:
+    return f"sms:device:{device_id}:sent:{minute}"
+
+
+def record_send(device_id: str) -> None:
+    key = _load_key(device_id, int(time.time() // 60))
+    cache.add(key, 0, timeout=180)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Expired between add() and incr().
+        cache.set(key, 1, timeout=180)
+
+
+def current_load(device_ids) -> dict[str, int]:
+    """Outbound SMS sent by each device in the current minute."""
+    minute = int(time.time() // 60)
+    keys = {_load_key(device_id, minute): device_id for device_id in device_ids}
+    counts = cache.get_many(list(keys))
+    return {device_id: int(counts.get(key) or 0) for key, device_id in keys.items()}
+
+
+def pick_outbound_device(pinned: str | None = None, message=None) -> str:
+    """
+    device_id to send an SMS through:
+    - `pinned` (a channel's "device" setting) if it names a device, or
+      "same" to answer through the device the message arrived on;
+    - otherwise the enabled device that has sent the fewest SMS this minute,
+      preferring devices still under their send_rate_per_minute.
+    Falls back to DEFAULT_DEVICE_ID while no device is registered.
+    """
+    if pinned == "same":
+        if message is not None and message.device_id:
+            device = Device.objects.filter(pk=message.device_id, is_enabled=True).only("device_id").first()
+            if device is not None:
+                return device.device_id
+    elif pinned:
+        return pinned
+
+    devices = list(Device.objects.filter(is_enabled=True).values_list("device_id", "send_rate_per_minute"))
+    if not devices:
+        return settings.DEFAULT_DEVICE_ID
+
+    load = current_load(device_id for device_id, _ in devices)
+    under_limit = [(device_id, limit) for device_id, limit in devices if not limit or load[device_id] < limit]
+    candidates = under_limit or devices
+    return min(candidates, key=lambda item: load[item[0]])[0]
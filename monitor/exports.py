@@ -0,0 +1,115 @@
+# monitor/exports.py
+import csv
+import json
+import uuid
+from datetime import datetime
+
+from asgiref.sync import sync_to_async
+
+# Column layout of each export, in output order. Values are fetched with
+# values_list() so no model instances are built while streaming.
+MESSAGE_EXPORT_FIELDS = (
+    "id",
+    "from_number",
+    "to_number",
+    "body",
+    "received_at",
+    "created_at",
+    "processed",
+)
+
+DELIVERY_EXPORT_FIELDS = (
+    "id",
+    "message_id",
+    "message__from_number",
+    "message__received_at",
+    "rule_id",
+    "rule__name",
+    "channel_id",
+    "channel__name",
+    "channel__type",
+    "status",
+    "provider_message_id",
+    "error",
+    "retry_count",
+    "created_at",
+    "last_attempt_at",
+)
+
+DEFAULT_CHUNK_SIZE = 2000
+
+
+class _Echo:
+    """File-like object for csv.writer that hands each line back instead of buffering it."""
+
+    def write(self, value):
+        return value
+
+
+def _to_text(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    return value
+
+
+def _json_default(value):
+    converted = _to_text(value)
+    if converted is value:
+        raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+    return converted
+
+
+def iter_ndjson(rows, fields, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Encode rows as newline-delimited JSON, yielding one string per chunk of rows."""
+    buffer = []
+    for row in rows:
+        buffer.append(json.dumps(dict(zip(fields, row)), ensure_ascii=False, default=_json_default))
+        if len(buffer) >= chunk_size:
+            yield "\n".join(buffer) + "\n"
+            buffer = []
+    if buffer:
+        yield "\n".join(buffer) + "\n"
+
+
+def iter_csv(rows, fields, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Encode rows as CSV with a header line, yielding one string per chunk of rows."""
+    writer = csv.writer(_Echo())
+    buffer = [writer.writerow(fields)]
+    for row in rows:
+        buffer.append(writer.writerow([_to_text(value) for value in row]))
+        if len(buffer) >= chunk_size:
+            yield "".join(buffer)
+            buffer = []
+    if buffer:
+        yield "".join(buffer)
+
+
+ENCODERS = {
+    "ndjson": (iter_ndjson, "application/x-ndjson", "ndjson"),
+    "csv": (iter_csv, "text/csv; charset=utf-8", "csv"),
+}
+
+
+def stream_queryset(queryset, fields, export_format, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Streams a queryset through a server-side cursor and encodes it on the fly.
+    Only one chunk of rows is held in memory at any time.
+    """
+    encoder = ENCODERS[export_format][0]
+    rows = queryset.values_list(*fields).iterator(chunk_size=chunk_size)
+    return encoder(rows, fields, chunk_size=chunk_size)
+
+
+async def aiter_sync(iterator):
+    """
+    Adapts a sync streaming iterator for ASGI without materializing it.
+    Every step runs in the same sync thread, so the DB cursor never changes threads.
+    """
+    step = sync_to_async(next, thread_sensitive=True)
+    while True:
+        chunk = await step(iterator, None)
+        if chunk is None:
+            break
+        yield chunk
@@ -0,0 +1,365 @@
+# monitor/ingest.py
+"""
+HTTP ingest for devices that cannot speak MQTT (ESP32/SIM800 boards), used by
+consumers.DeviceIngestConsumer.
+
+Tokens: a device sends the token issued for it in the admin; only its SHA-256
+is stored. Tokens are resolved from a per-process dict, then from the shared
+cache, and only on a miss from the database. Unknown tokens are cached as
+well (for INGEST_TOKEN_NEGATIVE_TTL), so a misconfigured device cannot hammer
+the database. Issuing a new token drops the old one from the shared cache;
+other processes stop accepting it within INGEST_TOKEN_LOCAL_TTL seconds.
+
+Inserts: concurrent requests of one worker share INSERTs. The first request
+inserts right away; requests arriving while that INSERT runs go together in
+the next one, so under load every INSERT and commit carries many requests
+without a fixed delay being added to any of them.
+
+Routing: stored messages are routed by a background thread, in batches
+(services.process_incoming_messages), after the response has been sent. A
+batch that keeps failing with database errors is routed message by message
+after INGEST_ROUTE_RETRIES attempts. Messages left unprocessed anyway (the
+worker died, a message cannot be routed) are picked up by sweep_unprocessed,
+which the MQTT consumer and every router run every INGEST_SWEEP_INTERVAL
+seconds, one process at a time, and `manage.py route_unprocessed` on demand.
+It covers every message stored in the last INGEST_SWEEP_WINDOW seconds,
+whichever path stored it; routing claims a message first, so none is routed
+twice.
+
+received_at is the time the server received a message. A device clock can be
+anything, so the timestamp a device sends is kept in raw_payload only.
+"""
+import asyncio
+import hashlib
+import logging
+import queue
+import secrets
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, close_old_connections
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Device, IncomingMessage
+from .services import build_incoming_message, process_incoming_messages
+
+logger = logging.getLogger(__name__)
+
+
+class InvalidToken(Exception):
+    pass
+
+
+# All database work of the endpoint runs on this one thread, so a worker holds
+# a single connection for ingest however many requests are in flight.
+_db_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ingest-db")
+
+
+def _in_db_thread(func):
+    def call(*args):
+        close_old_connections()
+        return func(*args)
+    return sync_to_async(call, thread_sensitive=False, executor=_db_executor)
+
+
+_tokens = {}
+
+
+def _token_hash(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def _cache_key(token_hash: str) -> str:
+    return f"ingest:token:{token_hash}"
+
+
+def issue_ingest_token(device: Device) -> str:
+    """Gives `device` a new ingest token and revokes its previous one. The token is not stored."""
+    token = secrets.token_urlsafe(32)
+    previous = device.ingest_token_hash
+    device.ingest_token_hash = _token_hash(token)
+    device.save(update_fields=["ingest_token_hash", "updated_at"])
+    forget_token(previous)
+    return token
+
+
+def forget_token(token_hash: str) -> None:
+    if token_hash:
+        cache.delete(_cache_key(token_hash))
+        _tokens.pop(token_hash, None)
+
+
+def _lookup(token_hash: str) -> Device | None:
+    key = _cache_key(token_hash)
+    fields = cache.get(key)
+    if fields is None:
+        fields = (
+            Device.objects.filter(ingest_token_hash=token_hash)
+            .values("id", "device_id", "phone_number")
+            .first()
+        ) or {}
+        timeout = settings.INGEST_TOKEN_CACHE_TTL if fields else settings.INGEST_TOKEN_NEGATIVE_TTL
+        cache.set(key, fields, timeout=timeout)
+    # Enough of the device to build messages; it is never saved.
+    return Device(**fields) if fields else None
+
+
+async def devices_for_tokens(tokens) -> dict[str, Device]:
+    """The device of each token; raises InvalidToken if any token is unknown."""
+    now = time.monotonic()
+    found = {}
+    missing = []
+    for token in set(tokens):
+        token_hash = _token_hash(token)
+        entry = _tokens.get(token_hash)
+        if entry is not None and entry[1] > now:
+            found[token] = entry[0]
+        else:
+            missing.append((token, token_hash))
+
+    if missing:
+        devices = await _in_db_thread(lambda: [_lookup(token_hash) for _, token_hash in missing])()
+        if len(_tokens) >= settings.INGEST_TOKEN_LOCAL_MAX:
+            _tokens.clear()
+        for (token, token_hash), device in zip(missing, devices):
+            ttl = settings.INGEST_TOKEN_LOCAL_TTL if device else settings.INGEST_TOKEN_NEGATIVE_TTL
+            _tokens[token_hash] = (device, now + ttl)
+            found[token] = device
+
+    if not all(found.values()):
+        raise InvalidToken()
+    return found
+
+
+def build_messages(items: list[dict], raw_items: list[dict], devices: dict[str, Device]) -> list[IncomingMessage]:
+    """
+    Unsaved messages from validated payloads, received now. The raw payload,
+    including the device's received_at, is kept without the token.
+    """
+    messages = []
+    for item, raw in zip(items, raw_items):
+        message = build_incoming_message(
+            {key: value for key, value in raw.items() if key != "token"},
+            item["from_number"],
+            item["body"],
+            device=devices[item["token"]],
+        )
+        message.to_number = item["to_number"]
+        messages.append(message)
+    return messages
+
+
+def _insert(messages: list[IncomingMessage]) -> None:
+    IncomingMessage.objects.bulk_create(messages)
+
+
+class _InsertBatcher:
+    """Shares INSERTs between the requests of one event loop (see module docstring)."""
+
+    def __init__(self):
+        self._waiting = []
+        self._running = False
+
+    async def insert(self, messages: list[IncomingMessage]) -> None:
+        future = asyncio.get_running_loop().create_future()
+        self._waiting.append((messages, future))
+        if not self._running:
+            self._running = True
+            asyncio.get_running_loop().create_task(self._drain())
+        await future
+
+    async def _drain(self):
+        try:
+            while self._waiting:
+                batch, rows = [], 0
+                while self._waiting and (not batch or rows + len(self._waiting[0][0]) <= settings.INGEST_INSERT_BATCH):
+                    messages, future = self._waiting.pop(0)
+                    batch.append((messages, future))
+                    rows += len(messages)
+                try:
+                    await _in_db_thread(_insert)([message for messages, _ in batch for message in messages])
+                except Exception as e:
+                    for _, future in batch:
+                        if not future.done():
+                            future.set_exception(e)
+                else:
+                    for _, future in batch:
+                        if not future.done():
+                            future.set_result(None)
+        finally:
+            self._running = False
+
+
+_batchers = weakref.WeakKeyDictionary()
+
+
+async def store_messages(messages: list[IncomingMessage]) -> None:
+    """Inserts `messages`, sharing the INSERT with concurrent requests."""
+    loop = asyncio.get_running_loop()
+    batcher = _batchers.get(loop)
+    if batcher is None:
+        batcher = _batchers[loop] = _InsertBatcher()
+    await batcher.insert(messages)
+
+
+def route_unprocessed(older_than: float, within: float, batch_size: int = 200) -> int:
+    """
+    Routes the messages received between `within` and `older_than` seconds ago
+    that are still unprocessed, oldest first. Returns the number routed.
+    """
+    now = timezone.now()
+    pending = IncomingMessage.objects.filter(
+        processed=False,
+        received_at__gte=now - timedelta(seconds=within),
+        received_at__lt=now - timedelta(seconds=older_than),
+    ).order_by("received_at", "id")
+    routed = 0
+    last = None
+    while True:
+        # Keyset pagination, so messages that cannot be routed and stay unprocessed are passed over.
+        after = pending
+        if last is not None:
+            after = pending.filter(
+                Q(received_at__gt=last.received_at) | Q(received_at=last.received_at, id__gt=last.id)
+            )
+        batch = list(after[:batch_size])
+        if not batch:
+            return routed
+        close_old_connections()
+        try:
+            routed += process_incoming_messages(batch)
+        except Exception:
+            routed += _route_each(batch)
+        last = batch[-1]
+
+
+def sweep_unprocessed() -> int:
+    """
+    route_unprocessed with the INGEST_SWEEP_* settings, in at most one process
+    per INGEST_SWEEP_INTERVAL; the others would only find the same messages.
+    Returns the number routed.
+    """
+    if not cache.add("ingest:sweep", 1, timeout=settings.INGEST_SWEEP_INTERVAL):
+        return 0
+    return route_unprocessed(settings.INGEST_SWEEP_AGE, settings.INGEST_SWEEP_WINDOW, settings.INGEST_ROUTE_BATCH)
+
+
+def _route_each(messages) -> int:
+    """Routes messages one by one, so one that cannot be routed does not hold back the others."""
+    routed = 0
+    for message in messages:
+        close_old_connections()
+        try:
+            routed += process_incoming_messages([message])
+        except Exception:
+            # Still unprocessed; the next sweep tries again.
+            logger.exception("Routing ingested message %s failed", message.id)
+    return routed
+
+
+_STOP = object()
+
+
+class IngestRouter:
+    """
+    Routes stored messages from a background thread, `batch_size` per
+    transaction, and sweeps up unprocessed ones every `sweep_interval` seconds.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = 200,
+        retry_interval: float = 2.0,
+        retries: int = 3,
+        sweep_interval: float = 60.0,
+    ):
+        self.batch_size = batch_size
+        self.retry_interval = retry_interval
+        self.retries = retries
+        self.sweep_interval = sweep_interval
+        self._next_sweep = time.monotonic() + sweep_interval
+        self._queue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name="ingest-router", daemon=True)
+        self._thread.start()
+
+    def submit(self, messages) -> None:
+        for message in messages:
+            self._queue.put(message)
+
+    def _run(self):
+        while True:
+            # Checked on every pass, so a steady stream of messages does not postpone the sweep.
+            if time.monotonic() >= self._next_sweep:
+                self._sweep()
+            try:
+                items = [self._queue.get(timeout=max(self._next_sweep - time.monotonic(), 0))]
+            except queue.Empty:
+                continue
+            while len(items) < self.batch_size:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            batch = [item for item in items if item is not _STOP]
+            if batch:
+                self._route(batch)
+            if len(batch) < len(items):
+                return
+
+    def close(self) -> None:
+        """Routes what was submitted before and stops the thread."""
+        self._queue.put(_STOP)
+        self._thread.join()
+
+    def _route(self, batch):
+        # The transaction is all or nothing, so a failed batch can be routed again.
+        for attempt in range(self.retries + 1):
+            close_old_connections()
+            try:
+                process_incoming_messages(batch)
+                return
+            except DatabaseError as e:
+                if attempt == self.retries:
+                    break
+                print(f"Routing {len(batch)} ingested messages failed, retrying in {self.retry_interval}s: {e}")
+                time.sleep(self.retry_interval)
+            except Exception:
+                logger.exception("Routing %d ingested messages failed", len(batch))
+                break
+        _route_each(batch)
+
+    def _sweep(self):
+        self._next_sweep = time.monotonic() + self.sweep_interval
+        try:
+            close_old_connections()
+            routed = sweep_unprocessed()
+        except Exception:
+            logger.exception("Sweeping unprocessed messages failed")
+            return
+        if routed:
+            print(f"Routed {routed} unprocessed messages")
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_router() -> IngestRouter:
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                _router = IngestRouter(
+                    batch_size=settings.INGEST_ROUTE_BATCH,
+                    retry_interval=settings.INGEST_ROUTE_RETRY_INTERVAL,
+                    retries=settings.INGEST_ROUTE_RETRIES,
+                    sweep_interval=settings.INGEST_SWEEP_INTERVAL,
+                )
+    return _router
@@ -0,0 +1,99 @@
+# monitor/live.py
+"""
+Publishes new IncomingMessages and DeliveryAttempt changes to the channel
+layer for the live dashboard feed (see consumers.py).
+
+Events are queued after the transaction commits and sent by one background
+thread with its own event loop, so saving a row never waits on Redis and
+bursts reach the channel layer as a single group message.
+"""
+import asyncio
+import logging
+import queue
+import threading
+
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+LIVE_FEED_GROUP = "live_feed"
+
+
+def message_payload(message) -> dict:
+    return {
+        "id": str(message.id),
+        "from_number": message.from_number,
+        "to_number": message.to_number,
+        "body": message.body,
+        "received_at": message.received_at.isoformat() if message.received_at else None,
+        "processed": message.processed,
+    }
+
+
+def delivery_payload(attempt) -> dict:
+    return {
+        "id": str(attempt.id),
+        "message_id": str(attempt.message_id),
+        "rule_id": str(attempt.rule_id) if attempt.rule_id else None,
+        "channel_id": str(attempt.channel_id),
+        "status": attempt.status,
+        "error": attempt.error,
+        "retry_count": attempt.retry_count,
+        "last_attempt_at": attempt.last_attempt_at.isoformat() if attempt.last_attempt_at else None,
+    }
+
+
+class LivePublisher:
+    def __init__(self, group=LIVE_FEED_GROUP, max_batch=500, linger=0.02):
+        self.group = group
+        self.max_batch = max_batch
+        self.linger = linger
+        self._queue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name="live-publisher", daemon=True)
+        self._thread.start()
+
+    def publish(self, stream: str, data: dict):
+        self._queue.put({"stream": stream, "data": data})
+
+    def _collect(self):
+        events = [self._queue.get()]
+        # Give a burst a moment to arrive so it goes out as one group message.
+        try:
+            while len(events) < self.max_batch:
+                events.append(self._queue.get(timeout=self.linger))
+        except queue.Empty:
+            pass
+        return events
+
+    def _run(self):
+        loop = asyncio.new_event_loop()
+        layer = get_channel_layer()
+        while True:
+            events = self._collect()
+            if layer is None:
+                continue
+            try:
+                loop.run_until_complete(layer.group_send(self.group, {"type": "live.events", "events": events}))
+            except Exception as e:
+                logger.warning("Live feed publish failed (%s events dropped): %s", len(events), e)
+
+
+_publisher = None
+_publisher_lock = threading.Lock()
+
+
+def get_publisher():
+    global _publisher
+    if _publisher is None:
+        with _publisher_lock:
+            if _publisher is None:
+                _publisher = LivePublisher()
+    return _publisher
+
+
+def publish_on_commit(stream: str, data: dict):
+    """Queues an event for the live feed once the current transaction commits."""
+    if settings.LIVE_FEED_ENABLED:
+        transaction.on_commit(lambda: get_publisher().publish(stream, data))
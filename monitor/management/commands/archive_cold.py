@@ -0,0 +1,29 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from ...archive import archive_older_than
+
+
+class Command(BaseCommand):
+    help = "Moves IncomingMessage/DeliveryAttempt rows older than --older-than-days into the cold archive files."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--older-than-days", type=int, default=settings.COLD_ARCHIVE_AFTER_DAYS)
+        parser.add_argument("--dataset", choices=["all", "messages", "deliveries"], default="all")
+        parser.add_argument("--chunk-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        if options["older_than_days"] < 1:
+            raise CommandError("--older-than-days must be at least 1.")
+
+        cutoff = timezone.now() - timedelta(days=options["older_than_days"])
+        self.stdout.write(f"Archiving rows older than {cutoff.isoformat()} to {settings.COLD_ARCHIVE_ROOT}")
+
+        # Deliveries first, though archiving messages takes their deliveries along anyway.
+        datasets = ["deliveries", "messages"] if options["dataset"] == "all" else [options["dataset"]]
+        for dataset in datasets:
+            moved = archive_older_than(dataset, cutoff, chunk_size=options["chunk_size"])
+            self.stdout.write(self.style.SUCCESS(f"{dataset}: archived {moved} rows"))
@@ -0,0 +1,256 @@
+import contextlib
+import json
+import os
+import statistics
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from ...bench.broker import InProcessBroker
+from ...bench.payloads import BENCH_SENDER_PREFIX, MC60PayloadGenerator
+from ...bench.stubs import StubProviderServer
+from ...devices import forget_devices
+from ...models import DeliveryAttempt, DestinationChannel, Device, ForwardRule, IncomingMessage, RuleDestination
+from ...outbox import AsyncOutboxRelay, OutboxRelay
+from .consumer import Command as ConsumerCommand
+
+BENCH_PREFIX = "bench-"
+BENCH_TOPIC = f"device/{BENCH_PREFIX}mc60/sms_rx"
+CHANNEL_TYPES = {
+    "telegram": DestinationChannel.ChannelType.TELEGRAM,
+    "bale": DestinationChannel.ChannelType.Bale,
+    "webhook": DestinationChannel.ChannelType.WEBHOOK,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Replays generated MC60 payloads through the MQTT consumer and the outbox relay at a target rate, "
+        "delivering to local stub Telegram/Bale/webhook servers, and reports throughput, "
+        "latency percentiles and DB queries per message. Run it against a scratch database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--messages", type=int, default=1000)
+        parser.add_argument("--rate", type=float, default=0, help="Messages per second to publish (0 = as fast as possible).")
+        parser.add_argument("--workers", type=int, default=1, help="Consumer threads handling messages.")
+        parser.add_argument("--relay-engine", choices=["threads", "async"], default="threads")
+        parser.add_argument("--relay-workers", type=int, default=8, help="Outbox relay threads calling the stub providers.")
+        parser.add_argument("--max-in-flight", type=int, default=2000, help="Concurrent sends of the async relay.")
+        parser.add_argument("--per-host", type=int, default=100, help="Concurrent sends per host of the async relay (all stubs share one host).")
+        parser.add_argument("--channels", default="telegram,bale,webhook", help="Comma separated destination types to deliver to.")
+        parser.add_argument("--rules", type=int, default=10, help="Additional enabled rules that never match.")
+        parser.add_argument("--latency-ms", type=float, default=50.0, help="Stub provider response time.")
+        parser.add_argument("--jitter-ms", type=float, default=10.0)
+        parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of provider requests answered with 502.")
+        parser.add_argument("--unicode-ratio", type=float, default=0.7, help="Fraction of UTF-16 hex encoded Persian bodies.")
+        parser.add_argument("--multipart-ratio", type=float, default=0.0, help="Fraction of Persian messages sent as concatenated parts.")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", help="Write the results as JSON to this path.")
+        parser.add_argument("--baseline", help="Results JSON of an earlier run to compare against.")
+        parser.add_argument("--max-regression", type=float, default=0.15, help="Allowed relative regression against --baseline.")
+        parser.add_argument("--keep", action="store_true", help="Keep the benchmark rows afterwards.")
+        parser.add_argument("--force", action="store_true", help="Run even if other enabled rules exist.")
+        parser.add_argument("--verbose", action="store_true", help="Show the consumer's per-message output.")
+
+    def handle(self, *args, **options):
+        channel_types = [name.strip() for name in options["channels"].split(",") if name.strip()]
+        unknown = set(channel_types) - set(CHANNEL_TYPES)
+        if unknown:
+            raise CommandError(f"Unknown channel types: {', '.join(sorted(unknown))}")
+
+        other_rules = ForwardRule.objects.filter(is_enabled=True).exclude(name__startswith=BENCH_PREFIX)
+        if other_rules.exists() and not options["force"]:
+            raise CommandError(
+                "Enabled rules exist that would also route benchmark messages to real destinations; "
+                "use a scratch database or pass --force."
+            )
+
+        stub = StubProviderServer(
+            latency_ms=options["latency_ms"],
+            jitter_ms=options["jitter_ms"],
+            error_rate=options["error_rate"],
+            seed=options["seed"],
+        ).start()
+        self._cleanup()
+        try:
+            self._create_scenario(stub.base_url, channel_types, options["rules"])
+            with override_settings(TELEGRAM_API_BASE=stub.base_url, BALE_API_BASE=stub.base_url, PROXY=None):
+                results = self._run(options)
+        finally:
+            stub.stop()
+            if not options["keep"]:
+                self._cleanup()
+
+        results["provider_requests"] = dict(stub.counts)
+        results["config"] = {
+            key: options[key]
+            for key in ("messages", "rate", "workers", "relay_engine", "relay_workers", "max_in_flight", "per_host", "channels", "rules", "latency_ms", "jitter_ms", "error_rate", "unicode_ratio", "multipart_ratio", "seed")
+        }
+        results["config"]["database"] = connection.vendor
+        self._report(results)
+
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as output:
+                json.dump(results, output, indent=2)
+        if options["baseline"]:
+            self._compare(results, options["baseline"], options["max_regression"])
+
+    def _create_scenario(self, base_url, channel_types, filler_rules):
+        rule = ForwardRule.objects.create(name=f"{BENCH_PREFIX}all", filters={})
+        for name in channel_types:
+            if name == "webhook":
+                config = {"url": f"{base_url}/webhook"}
+            else:
+                config = {"token": "bench", "chat_id": 1}
+            channel = DestinationChannel.objects.create(type=CHANNEL_TYPES[name], name=f"{BENCH_PREFIX}{name}", config=config)
+            RuleDestination.objects.create(rule=rule, channel=channel)
+
+        # Enabled rules that are evaluated for every message but never match.
+        ForwardRule.objects.bulk_create(
+            ForwardRule(name=f"{BENCH_PREFIX}filler-{n}", filters={"body_contains": f"no-such-text-{n}"})
+            for n in range(filler_rules)
+        )
+
+    def _cleanup(self):
+        IncomingMessage.objects.filter(from_number__startswith=BENCH_SENDER_PREFIX).delete()
+        ForwardRule.objects.filter(name__startswith=BENCH_PREFIX).delete()
+        DestinationChannel.objects.filter(name__startswith=BENCH_PREFIX).delete()
+        Device.objects.filter(device_id__startswith=BENCH_PREFIX).delete()
+        forget_devices()
+
+    def _run(self, options):
+        consumer = ConsumerCommand()
+        generator = MC60PayloadGenerator(
+            seed=options["seed"], unicode_ratio=options["unicode_ratio"], multipart_ratio=options["multipart_ratio"]
+        )
+        latencies = []
+        queries = []
+        lock = threading.Lock()
+
+        def on_message(client, userdata, msg):
+            with CaptureQueriesContext(connection) as captured:
+                consumer.on_message(client, userdata, msg)
+            finished = time.monotonic()
+            with lock:
+                latencies.append(finished - msg.timestamp)
+                queries.append(len(captured))
+
+        broker = InProcessBroker(on_message, workers=options["workers"], on_worker_exit=connections.close_all)
+        if options["relay_engine"] == "async":
+            relay = AsyncOutboxRelay(batch_size=100, max_in_flight=options["max_in_flight"], per_host=options["per_host"], lease=300)
+        else:
+            relay = OutboxRelay(batch_size=100, workers=options["relay_workers"], lease=300)
+        relay_stop = threading.Event()
+        relay_thread = threading.Thread(target=relay.run, args=(relay_stop, 0.05), name="bench-relay")
+        interval = 1 / options["rate"] if options["rate"] > 0 else 0
+        with open(os.devnull, "w") as devnull, (
+            contextlib.nullcontext() if options["verbose"] else contextlib.redirect_stdout(devnull)
+        ):
+            relay_thread.start()
+            broker.start()
+            started = time.monotonic()
+            for n, payload in zip(range(options["messages"]), generator):
+                if interval:
+                    delay = started + n * interval - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                broker.publish(BENCH_TOPIC, payload)
+            published = time.monotonic()
+            broker.close()
+            ingested = time.monotonic() - started
+            relay_stop.set()
+            relay_thread.join()
+            # Deliver whatever the relay had not picked up yet.
+            while relay.run_once():
+                pass
+            relay.close()
+            elapsed = time.monotonic() - started
+
+        latencies.sort()
+        cuts = self._percentiles(latencies)
+        # From IncomingMessage.received_at to the end of the provider call, as measured by the relay.
+        delivery = sorted(
+            DeliveryAttempt.objects.filter(message__from_number__startswith=BENCH_SENDER_PREFIX)
+            .exclude(total_latency_ms=None)
+            .values_list("total_latency_ms", flat=True)
+        )
+        delivery_cuts = self._percentiles(delivery)
+        return {
+            "handled": len(latencies),
+            "elapsed_s": round(elapsed, 3),
+            "publish_rate": round(len(latencies) / max(published - started, 1e-9), 1),
+            "throughput": round(len(latencies) / elapsed, 1),
+            "ingest_throughput": round(len(latencies) / ingested, 1),
+            "latency_ms": {
+                "p50": round(cuts[49] * 1000, 2),
+                "p95": round(cuts[94] * 1000, 2),
+                "p99": round(cuts[98] * 1000, 2),
+                "max": round(latencies[-1] * 1000, 2) if latencies else None,
+            },
+            "delivery_latency_ms": {
+                "p50": round(delivery_cuts[49], 2) if delivery else None,
+                "p95": round(delivery_cuts[94], 2) if delivery else None,
+                "p99": round(delivery_cuts[98], 2) if delivery else None,
+                "max": round(delivery[-1], 2) if delivery else None,
+            },
+            "queries_per_message": {
+                "mean": round(statistics.fmean(queries), 2) if queries else None,
+                "max": max(queries, default=None),
+            },
+        }
+
+    @staticmethod
+    def _percentiles(values):
+        return statistics.quantiles(values, n=100, method="inclusive") if len(values) > 1 else values * 99
+
+    def _report(self, results):
+        latency = results["latency_ms"]
+        per_message = results["queries_per_message"]
+        self.stdout.write(
+            f"Database: {results['config']['database']}, workers: {results['config']['workers']}, "
+            f"relay: {results['config']['relay_engine']}, "
+            f"channels: {results['config']['channels']}"
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"{results['handled']} messages in {results['elapsed_s']}s: {results['throughput']} msg/s "
+            f"(published at {results['publish_rate']} msg/s)"
+        ))
+        delivery = results["delivery_latency_ms"]
+        self.stdout.write(
+            f"Ingest latency ms: p50 {latency['p50']}, p95 {latency['p95']}, p99 {latency['p99']}, max {latency['max']} "
+            f"({results['ingest_throughput']} msg/s)"
+        )
+        self.stdout.write(
+            f"Delivery latency ms: p50 {delivery['p50']}, p95 {delivery['p95']}, p99 {delivery['p99']}, max {delivery['max']}"
+        )
+        self.stdout.write(f"Queries per message: mean {per_message['mean']}, max {per_message['max']}")
+        self.stdout.write(f"Provider requests: {results['provider_requests']}")
+
+    def _compare(self, results, baseline_path, allowed):
+        with open(baseline_path, encoding="utf-8") as source:
+            baseline = json.load(source)
+
+        checks = [
+            ("throughput", baseline["throughput"], results["throughput"], True),
+            ("p95 latency", baseline["latency_ms"]["p95"], results["latency_ms"]["p95"], False),
+            ("queries per message", baseline["queries_per_message"]["mean"], results["queries_per_message"]["mean"], False),
+        ]
+        regressions = []
+        for name, before, after, higher_is_better in checks:
+            if not before:
+                continue
+            change = (after - before) / before
+            worse = -change if higher_is_better else change
+            line = f"{name}: {before} -> {after} ({change:+.1%})"
+            if worse > allowed:
+                regressions.append(line)
+                self.stdout.write(self.style.ERROR(line))
+            else:
+                self.stdout.write(line)
+
+        if regressions:
+            raise CommandError(f"{len(regressions)} metric(s) regressed by more than {allowed:.0%} against {baseline_path}")
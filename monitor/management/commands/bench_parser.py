@@ -0,0 +1,76 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from ...bench.payloads import MC60PayloadGenerator
+from ...mc60 import MC60ParseError, parse_frame
+
+
+def legacy_parse(payload: bytes):
+    """The parsing the consumer did inline before monitor/mc60.py, kept as the baseline."""
+    raw_body = payload.decode("utf-8")
+    if ":" not in raw_body:
+        raise ValueError("Invalid message format from MC60")
+    sender, content = raw_body.split(":", 1)
+    decoded_content = content
+    if all(c in '0123456789ABCDEFabcdef' for c in content) and len(content) > 4:
+        try:
+            decoded_content = bytes.fromhex(content).decode('utf-16-be')
+        except:
+            pass
+    return sender, decoded_content
+
+
+PARSERS = {
+    "legacy": legacy_parse,
+    "mc60": parse_frame,
+}
+
+
+class Command(BaseCommand):
+    help = "Times the MC60 payload parser against the previous inline parsing on a generated corpus."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--payloads", type=int, default=200_000)
+        parser.add_argument("--unicode-ratio", type=float, default=0.7)
+        parser.add_argument("--multipart-ratio", type=float, default=0.2)
+        parser.add_argument("--malformed-ratio", type=float, default=0.01)
+        parser.add_argument("--repeat", type=int, default=3, help="Runs per parser; the fastest is reported.")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        corpus = self._corpus(options)
+        size = sum(len(payload) for payload in corpus)
+        self.stdout.write(f"{len(corpus)} payloads, {size / 1024 / 1024:.1f} MiB")
+
+        for name, parse in PARSERS.items():
+            best = None
+            for _ in range(max(options["repeat"], 1)):
+                errors = 0
+                started = time.perf_counter()
+                for payload in corpus:
+                    try:
+                        parse(payload)
+                    except (MC60ParseError, ValueError):
+                        errors += 1
+                elapsed = time.perf_counter() - started
+                best = elapsed if best is None else min(best, elapsed)
+
+            self.stdout.write(self.style.SUCCESS(
+                f"{name:<8} {best / len(corpus) * 1e6:8.2f} us/payload "
+                f"{size / best / 1024 / 1024:8.1f} MiB/s  errors={errors}"
+            ))
+
+    def _corpus(self, options):
+        generator = MC60PayloadGenerator(
+            seed=options["seed"],
+            unicode_ratio=options["unicode_ratio"],
+            multipart_ratio=options["multipart_ratio"],
+        )
+        rng = random.Random(options["seed"])
+        malformed = [b"no separator here", b":missing sender", b"\xff\xfe:not utf-8"]
+        return [
+            rng.choice(malformed) if rng.random() < options["malformed_ratio"] else payload
+            for payload, _ in zip(generator, range(options["payloads"]))
+        ]
@@ -0,0 +1,142 @@
+import json
+import subprocess
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ...bench.rules import synthetic_messages, synthetic_rules
+from ...services import _check_message_filters
+from ...utils import rule_matches_message
+
+
+def _per_rule(check):
+    """Adapts a (rule, message) predicate to the engine interface: prepare(rules) -> match(message)."""
+    def prepare(rules):
+        def match(message):
+            return sum(1 for rule in rules if check(rule, message))
+        return match
+    return prepare
+
+
+# name -> (filter schema, prepare). `prepare(rules)` runs once per rule set and
+# returns a callable counting the rules a message matches; a compiled engine
+# can do its compilation in prepare and register itself here.
+ENGINES = {
+    "rule_matches_message": ("conditions", _per_rule(rule_matches_message)),
+    "check_message_filters": ("simple", _per_rule(lambda rule, message: _check_message_filters(message, rule.filters))),
+}
+
+
+def _int_list(value):
+    return [int(item) for item in value.split(",") if item.strip()]
+
+
+class Command(BaseCommand):
+    help = (
+        "Times rule evaluation engines on synthetic ForwardRule filters and Persian/English "
+        "message corpora as rule count and body length grow. No database access."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--engines", default=",".join(ENGINES), help="Comma separated engine names.")
+        parser.add_argument("--rules", type=_int_list, default=[100, 1000, 5000], help="Rule counts, e.g. 100,1000,5000.")
+        parser.add_argument("--body-lengths", type=_int_list, default=[70, 160, 670], help="Body lengths in characters.")
+        parser.add_argument("--messages", type=int, default=100, help="Messages per corpus.")
+        parser.add_argument("--persian-ratio", type=float, default=0.7)
+        parser.add_argument("--repeat", type=int, default=3, help="Runs per case; the fastest is reported.")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", help="Write the results as JSON to this path.")
+        parser.add_argument("--baseline", help="Results JSON of an earlier run to compare against.")
+        parser.add_argument("--max-regression", type=float, default=0.15, help="Allowed relative slowdown against --baseline.")
+
+    def handle(self, *args, **options):
+        engines = [name.strip() for name in options["engines"].split(",") if name.strip()]
+        unknown = set(engines) - set(ENGINES)
+        if unknown:
+            raise CommandError(f"Unknown engines: {', '.join(sorted(unknown))}")
+
+        corpora = {
+            length: synthetic_messages(options["messages"], length, options["persian_ratio"], options["seed"])
+            for length in options["body_lengths"]
+        }
+
+        cases = []
+        for name in engines:
+            schema, prepare = ENGINES[name]
+            for rule_count in options["rules"]:
+                rules = synthetic_rules(schema, rule_count, options["seed"])
+                prepare_started = time.perf_counter()
+                match = prepare(rules)
+                prepare_ms = (time.perf_counter() - prepare_started) * 1000
+
+                for length, messages in corpora.items():
+                    best, matches = self._time(match, messages, options["repeat"])
+                    case = {
+                        "engine": name,
+                        "rules": rule_count,
+                        "body_length": length,
+                        "messages": len(messages),
+                        "matches": matches,
+                        "prepare_ms": round(prepare_ms, 3),
+                        "us_per_message": round(best / len(messages) * 1e6, 3),
+                        "ns_per_rule": round(best / (len(messages) * rule_count) * 1e9, 1),
+                    }
+                    cases.append(case)
+                    self.stdout.write(
+                        f"{name:<24} rules={rule_count:<6} body={length:<4} "
+                        f"{case['us_per_message']:>12,.1f} us/msg {case['ns_per_rule']:>9,.1f} ns/rule "
+                        f"matches={matches}"
+                    )
+
+        results = {"commit": self._commit(), "config": {
+            key: options[key] for key in ("rules", "body_lengths", "messages", "persian_ratio", "repeat", "seed")
+        }, "cases": cases}
+
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as output:
+                json.dump(results, output, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+        if options["baseline"]:
+            self._compare(cases, options["baseline"], options["max_regression"])
+
+    def _time(self, match, messages, repeat):
+        best = None
+        for _ in range(max(repeat, 1)):
+            started = time.perf_counter()
+            matches = sum(match(message) for message in messages)
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return best, matches
+
+    def _commit(self):
+        try:
+            return subprocess.run(
+                ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    def _compare(self, cases, baseline_path, allowed):
+        with open(baseline_path, encoding="utf-8") as source:
+            baseline = json.load(source)
+        before = {
+            (case["engine"], case["rules"], case["body_length"]): case["us_per_message"]
+            for case in baseline["cases"]
+        }
+
+        self.stdout.write(f"Compared with {baseline_path} ({baseline.get('commit') or 'unknown commit'}):")
+        regressions = 0
+        for case in cases:
+            key = (case["engine"], case["rules"], case["body_length"])
+            if not before.get(key):
+                continue
+            change = (case["us_per_message"] - before[key]) / before[key]
+            line = f"{key[0]} rules={key[1]} body={key[2]}: {before[key]} -> {case['us_per_message']} us/msg ({change:+.1%})"
+            if change > allowed:
+                regressions += 1
+                self.stdout.write(self.style.ERROR(line))
+            else:
+                self.stdout.write(line)
+
+        if regressions:
+            raise CommandError(f"{regressions} case(s) slowed down by more than {allowed:.0%}")
@@ -0,0 +1,87 @@
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from ...uuids import uuid7
+
+GENERATORS = {
+    "uuid4": uuid.uuid4,
+    "uuid7": uuid7,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares insert throughput and primary key index size for random (uuid4) "
+        "and time-ordered (uuid7) keys, using scratch tables that are dropped afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=200_000)
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--payload-size", type=int, default=160, help="Bytes of filler per row, roughly an SMS body.")
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"Backend: {connection.vendor}, rows: {options['rows']}, batch: {options['batch_size']}"
+        )
+        for name, generator in GENERATORS.items():
+            table = f"bench_pk_{name}"
+            self._create_table(table)
+            try:
+                elapsed = self._insert(table, generator, options)
+                index_size = self._index_size(table)
+            finally:
+                with connection.cursor() as cursor:
+                    cursor.execute(f"DROP TABLE IF EXISTS {table}")
+
+            size = f"{index_size / 1024 / 1024:.1f} MiB" if index_size is not None else "n/a"
+            self.stdout.write(self.style.SUCCESS(
+                f"{name}: {options['rows'] / elapsed:,.0f} rows/s ({elapsed:.2f}s), pk index {size}"
+            ))
+
+    def _create_table(self, table):
+        key_type = "uuid" if connection.vendor == "postgresql" else "char(32)"
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {table}")
+            cursor.execute(f"CREATE TABLE {table} (id {key_type} PRIMARY KEY, payload text NOT NULL)")
+
+    def _insert(self, table, generator, options):
+        payload = "x" * options["payload_size"]
+        as_text = connection.vendor != "postgresql"
+        sql = f"INSERT INTO {table} (id, payload) VALUES (%s, %s)"
+
+        started = time.perf_counter()
+        remaining = options["rows"]
+        while remaining > 0:
+            count = min(options["batch_size"], remaining)
+            rows = [
+                (generator().hex if as_text else generator(), payload)
+                for _ in range(count)
+            ]
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.executemany(sql, rows)
+            remaining -= count
+        return time.perf_counter() - started
+
+    def _index_size(self, table):
+        with connection.cursor() as cursor:
+            if connection.vendor == "postgresql":
+                cursor.execute(
+                    "SELECT pg_relation_size(indexrelid) FROM pg_index WHERE indrelid = %s::regclass AND indisprimary",
+                    [table],
+                )
+                return cursor.fetchone()[0]
+            if connection.vendor == "sqlite":
+                try:
+                    cursor.execute(
+                        "SELECT SUM(pgsize) FROM dbstat WHERE name = "
+                        "(SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = %s)",
+                        [table],
+                    )
+                except Exception:
+                    return None
+                return cursor.fetchone()[0]
+        return None
@@ -1,27 +1,61 @@
 import time
+import threading
 import json
 import logging
 import paho.mqtt.client as mqtt
 from datetime import datetime
 from django.core.management.base import BaseCommand
-from django.db import DatabaseError, close_old_connections
-from ...models import IncomingMessage,FailedLog
-from ...services import process_incoming_message
+from django.db import close_old_connections
+from ...models import FailedLog
+from ...devices import device_for_topic
+from ...ingest import sweep_unprocessed
+from ...mc60 import parse_frame
+from ...reassembly import get_reassembly_buffer
+from ...services import create_incoming_message, process_incoming_message
+from ...spool import UNAVAILABLE, SpoolDrainer, get_spool, spool_record
 from config.settings import MQTT_BROKER_HOST
-from django.utils import timezone
+from django.conf import settings
+from ...metrics import (
+    CONSUMER_IN_FLIGHT,
+    INGEST_FAILURES,
+    INGEST_LAG,
+    MESSAGES_INGESTED,
+    start_metrics_server,
+)
+from ...tracing import span
 
 logger = logging.getLogger(__name__)
 
 class Command(BaseCommand):
     help = "MQTT Consumer for MC60 Gateway SMS Integration"
 
-    TOPIC = "device/MC60/sms_rx"
+    TOPIC = settings.MQTT_SMS_RX_TOPIC
     BROKER_HOST = MQTT_BROKER_HOST
     BROKER_PORT = 1883
 
+    spool = None
+
     def handle(self, *args, **options):
         self.stdout.write(self.style.SUCCESS(f"[*] Starting MQTT Consumer for MC60 Gateway"))
 
+        if settings.CONSUMER_METRICS_PORT:
+            start_metrics_server(settings.CONSUMER_METRICS_PORT)
+            self.stdout.write(f"Serving metrics on :{settings.CONSUMER_METRICS_PORT}/metrics")
+
+        if settings.SPOOL_ENABLED:
+            self.spool = get_spool()
+            drainer = SpoolDrainer(
+                self.spool,
+                batch_size=settings.SPOOL_DRAIN_BATCH,
+                retry_interval=settings.SPOOL_RETRY_INTERVAL,
+                max_attempts=settings.SPOOL_MAX_ATTEMPTS,
+            )
+            threading.Thread(target=drainer.run, name="spool-drain", daemon=True).start()
+            self.stdout.write(f"Spooling to {settings.SPOOL_DIR} ({self.spool.pending} pending)")
+
+        threading.Thread(target=self.flush_reassembly, name="reassembly-flush", daemon=True).start()
+        threading.Thread(target=self.sweep_unprocessed, name="ingest-sweep", daemon=True).start()
+
         client = mqtt.Client(client_id="Django_Gateway_Worker", clean_session=False)
         client.on_connect = self.on_connect
         client.on_message = self.on_message
@@ -43,47 +77,137 @@ class Command(BaseCommand):
             print(f"[Error] Connection failed with code {rc}")
 
     def on_message(self, client, userdata, msg):
+        with CONSUMER_IN_FLIGHT.track_inprogress(), span("mqtt.on_message", topic=msg.topic):
+            self.handle_message(msg)
+
+    def handle_message(self, msg):
         close_old_connections()
-        raw_body = msg.payload.decode("utf-8")
-        
+        raw_body = msg.payload.decode("utf-8", errors="replace")
+        raw_payload = raw_body
+
         try:
-            if ":" not in raw_body:
-                raise ValueError("Invalid message format from MC60")
+            frame = parse_frame(msg.payload)
+            sender = frame.sender
+            body, raw_payload = frame.body, raw_body
 
-            sender, content = raw_body.split(":", 1)
+            if frame.is_multipart:
+                assembled = get_reassembly_buffer().add(frame, raw_body, topic=msg.topic)
+                if assembled is None:
+                    print(f"Buffered part {frame.segment.sequence}/{frame.segment.total} from {sender}")
+                    return
+                body, raw_payload = assembled.body, assembled.raw_parts
 
-            decoded_content = content
-            if all(c in '0123456789ABCDEFabcdef' for c in content) and len(content) > 4:
-                try:
-                    decoded_content = bytes.fromhex(content).decode('utf-16-be')
-                except:
-                    pass
-
-            msg = IncomingMessage.objects.create(
-                from_number=sender,
-                to_number="MC60_GATEWAY",
-                body=decoded_content,
-                received_at=timezone.now(),
-                raw_payload=raw_body,
-            )
+            # Keep arrival order behind a backlog, and don't wait on a database that is still down.
+            if self.spool is not None and self.spool.pending:
+                self.spool_message(raw_payload, sender, body, topic=msg.topic)
+                print(f"Spooled SMS from {sender} ({self.spool.pending} pending)")
+                return
+
+            try:
+                device = device_for_topic(msg.topic)
+
+                with span("db.create_message") as create_span:
+                    message = create_incoming_message(
+                        raw_payload, sender, body, trace_id=create_span.trace_id, device=device
+                    )
+            except UNAVAILABLE as db_e:
+                if self.spool is None:
+                    raise
+                INGEST_FAILURES.labels("mqtt", "database").inc()
+                self.spool_message(raw_payload, sender, body, topic=msg.topic)
+                print(f"Database Error: {db_e}. Spooled SMS from {sender}.")
+                return
+
+            # paho stamps each message with time.monotonic() when it is read off the socket.
+            ingest_lag = time.monotonic() - msg.timestamp
+            INGEST_LAG.labels("mqtt").observe(ingest_lag)
+            create_span.set_attribute("ingest_lag_ms", round(ingest_lag * 1000, 3))
+            MESSAGES_INGESTED.labels("mqtt").inc()
 
             try:
-                deliveries_created = process_incoming_message(msg)
-                status_message = f"Message saved. {deliveries_created} delivery attempts initiated."
+                deliveries_created = process_incoming_message(message)
+                status_message = f"Message saved. {deliveries_created} delivery attempts queued."
 
             except Exception as e:
+                INGEST_FAILURES.labels("mqtt", "processing").inc()
                 status_message = f"Message saved, but processing failed: {e}"
 
             print(status_message)
 
             print(f"Saved SMS from {sender}!")
 
-        except DatabaseError as db_e:
+        except UNAVAILABLE as db_e:
+            INGEST_FAILURES.labels("mqtt", "database").inc()
             print(f"Database Error: {db_e}")
         except Exception as e:
+            # Including DatabaseErrors about the message itself, e.g. DataError: replaying can only fail the same way
+            # until the cause is fixed, so they are logged rather than spooled.
+            INGEST_FAILURES.labels("mqtt", "parse").inc()
             print(f"Error processing message: {e}")
-            FailedLog.objects.create(
-                raw_data=msg.payload.decode("utf-8"),
-                error_message=str(e),
-                source_tag="mc60_mqtt"
-            )
\ No newline at end of file
+            # One log per part of a reassembled message, so replay_failed can still recover them.
+            FailedLog.objects.bulk_create(
+                FailedLog(raw_data=raw, error_message=str(e), source_tag="mc60_mqtt", topic=msg.topic)
+                for raw in (raw_payload if isinstance(raw_payload, list) else [raw_body])
+            )
+
+    def spool_message(self, raw_payload, sender, body, topic=""):
+        """Keeps a message that cannot be stored right now; the spool drainer stores it later."""
+        with span("spool.append") as spool_span:
+            self.spool.append(spool_record(raw_payload, sender, body, topic=topic, trace_id=spool_span.trace_id))
+        MESSAGES_INGESTED.labels("mqtt").inc()
+
+    def sweep_unprocessed(self):
+        """Routes messages left unprocessed by any process, whether or not HTTP ingest sees traffic."""
+        while True:
+            time.sleep(settings.INGEST_SWEEP_INTERVAL)
+            close_old_connections()
+            try:
+                routed = sweep_unprocessed()
+            except Exception as e:
+                print(f"Sweeping unprocessed messages failed: {e}")
+                continue
+            if routed:
+                print(f"Routed {routed} unprocessed messages")
+
+    def flush_reassembly(self):
+        """Stores multipart SMS whose missing parts never arrived within REASSEMBLY_TTL."""
+        while True:
+            time.sleep(settings.REASSEMBLY_FLUSH_INTERVAL)
+            close_old_connections()
+            try:
+                expired = get_reassembly_buffer().pop_expired()
+            except Exception as e:
+                print(f"Reassembly flush failed: {e}")
+                continue
+
+            for assembled in expired:
+                if self.spool is not None and self.spool.pending:
+                    self.spool_message(assembled.raw_parts, assembled.sender, assembled.body, topic=assembled.topic)
+                    continue
+                try:
+                    message = create_incoming_message(
+                        assembled.raw_parts, assembled.sender, assembled.body, device=device_for_topic(assembled.topic)
+                    )
+                except Exception as e:
+                    if self.spool is not None and isinstance(e, UNAVAILABLE):
+                        INGEST_FAILURES.labels("mqtt", "database").inc()
+                        self.spool_message(assembled.raw_parts, assembled.sender, assembled.body, topic=assembled.topic)
+                        print(f"Database Error: {e}. Spooled multipart SMS from {assembled.sender}.")
+                        continue
+                    INGEST_FAILURES.labels("mqtt", "reassembly").inc()
+                    print(f"Error storing multipart SMS from {assembled.sender}: {e}")
+                    # One log per part, so replay_failed can still recover them.
+                    FailedLog.objects.bulk_create(
+                        FailedLog(raw_data=raw, error_message=str(e), source_tag="mc60_mqtt", topic=assembled.topic)
+                        for raw in assembled.raw_parts
+                    )
+                    continue
+
+                MESSAGES_INGESTED.labels("mqtt").inc()
+                # A stored message is not logged as failed: replaying the log would store it again.
+                try:
+                    process_incoming_message(message)
+                    print(f"Stored incomplete multipart SMS from {assembled.sender} ({len(assembled.raw_parts)} parts)")
+                except Exception as e:
+                    INGEST_FAILURES.labels("mqtt", "processing").inc()
+                    print(f"Stored incomplete multipart SMS from {assembled.sender}, but processing failed: {e}")
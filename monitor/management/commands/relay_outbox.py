@@ -0,0 +1,91 @@
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from ...metrics import start_metrics_server
+from ...models import DeliveryOutbox
+from ...outbox import AsyncOutboxRelay, OutboxRelay
+
+
+WRITE_FAILED = (
+    "Writing some delivery outcomes failed; their outbox rows stay claimed "
+    "and are dispatched again once their lease runs out."
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Dispatches committed DeliveryOutbox rows to their providers. Runs until stopped; "
+        "on PostgreSQL several relays can run at once."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--engine", choices=["threads", "async"], default=settings.OUTBOX_ENGINE)
+        parser.add_argument("--batch-size", type=int, default=settings.OUTBOX_BATCH_SIZE)
+        parser.add_argument("--workers", type=int, default=settings.OUTBOX_WORKERS, help="Concurrent provider calls (threads engine).")
+        parser.add_argument("--max-in-flight", type=int, default=settings.DELIVERY_MAX_IN_FLIGHT, help="Concurrent sends (async engine).")
+        parser.add_argument("--per-host", type=int, default=settings.DELIVERY_PER_HOST_LIMIT, help="Concurrent sends per host (async engine).")
+        parser.add_argument("--no-http2", action="store_true", help="Async engine: use HTTP/1.1 only.")
+        parser.add_argument("--reserved-workers", type=int, default=settings.OUTBOX_RESERVED_WORKERS, help="Extra threads for high-priority rows only (threads engine).")
+        parser.add_argument("--reserved-in-flight", type=int, default=settings.DELIVERY_RESERVED_IN_FLIGHT, help="In-flight slots kept for high-priority rows (async engine).")
+        parser.add_argument("--reserved-per-host", type=int, default=settings.DELIVERY_RESERVED_PER_HOST, help="Per-host slots kept for high-priority rows (async engine).")
+        parser.add_argument("--lease", type=float, default=settings.OUTBOX_LEASE, help="Seconds a claimed row stays locked.")
+        parser.add_argument("--poll-interval", type=float, default=settings.OUTBOX_POLL_INTERVAL)
+        parser.add_argument("--once", action="store_true", help="Drain the rows that are due now, then exit.")
+        parser.add_argument("--metrics-port", type=int, default=0)
+
+    def handle(self, *args, **options):
+        if connection.vendor == "sqlite":
+            self.stdout.write(self.style.WARNING("SQLite has no SKIP LOCKED; run a single relay."))
+            # Two claiming loops in one relay would race just like two relays.
+            options["reserved_workers"] = 0
+        if options["metrics_port"]:
+            start_metrics_server(options["metrics_port"])
+            self.stdout.write(f"Serving metrics on :{options['metrics_port']}/metrics")
+
+        if options["engine"] == "async":
+            relay = AsyncOutboxRelay(
+                options["batch_size"],
+                options["max_in_flight"],
+                options["per_host"],
+                options["lease"],
+                http2=settings.DELIVERY_HTTP2 and not options["no_http2"],
+                reserved_in_flight=options["reserved_in_flight"],
+                reserved_per_host=options["reserved_per_host"],
+            )
+            concurrency = (
+                f"async, up to {options['max_in_flight']} in flight, "
+                f"{relay.reserved_in_flight} reserved for high priority"
+            )
+        else:
+            relay = OutboxRelay(
+                options["batch_size"], options["workers"], options["lease"], reserved_workers=options["reserved_workers"]
+            )
+            concurrency = f"{options['workers']} workers + {relay.reserved_workers} for high priority"
+        try:
+            if options["once"]:
+                total = 0
+                while claimed := relay.run_once():
+                    total += claimed
+                written = relay.flush()
+                summary = f"Relayed {total} outbox rows; {DeliveryOutbox.objects.count()} left (not due or locked)."
+                if not written:
+                    raise CommandError(f"{summary} {WRITE_FAILED}")
+                self.stdout.write(self.style.SUCCESS(summary))
+                return
+
+            stop = threading.Event()
+            # Finish the sends in flight and write their outcomes before exiting,
+            # so claimed rows are not left locked.
+            signal.signal(signal.SIGTERM, lambda *_: stop.set())
+            signal.signal(signal.SIGINT, lambda *_: stop.set())
+            self.stdout.write(self.style.SUCCESS(
+                f"[*] Relaying delivery outbox ({concurrency}, batches of {options['batch_size']})"
+            ))
+            relay.run(stop, options["poll_interval"])
+        finally:
+            if not relay.close():
+                self.stderr.write(self.style.ERROR(WRITE_FAILED))
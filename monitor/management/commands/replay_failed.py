@@ -0,0 +1,128 @@
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from ...models import FailedLog
+from ...mc60 import MC60ParseError, parse_frame
+from ...services import replay_failed_log
+
+
+class Command(BaseCommand):
+    help = (
+        "Replays FailedLog payloads through parse -> persist -> route in parallel workers. "
+        "A log is stored at most once, however often it is replayed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--source", help="Only logs with this source_tag.")
+        parser.add_argument("--since", help="Only logs created at or after this ISO datetime.")
+        parser.add_argument("--until", help="Only logs created before this ISO datetime.")
+        parser.add_argument("--error-contains", help="Only logs whose error message contains this text.")
+        parser.add_argument("--limit", type=int)
+        parser.add_argument("--workers", type=int, default=4)
+        parser.add_argument("--chunk-size", type=int, default=100, help="Logs handed to a worker at a time.")
+        parser.add_argument("--progress-every", type=float, default=2.0, help="Seconds between progress lines.")
+        parser.add_argument("--dry-run", action="store_true", help="Only report how many payloads would parse now.")
+
+    def handle(self, *args, **options):
+        logs = FailedLog.objects.filter(replayed_at__isnull=True)
+        if options["source"]:
+            logs = logs.filter(source_tag=options["source"])
+        if options["since"]:
+            logs = logs.filter(created_at__gte=self._datetime("--since", options["since"]))
+        if options["until"]:
+            logs = logs.filter(created_at__lt=self._datetime("--until", options["until"]))
+        if options["error_contains"]:
+            logs = logs.filter(error_message__icontains=options["error_contains"])
+        logs = logs.order_by("created_at")
+        if options["limit"]:
+            logs = logs[:options["limit"]]
+
+        if options["dry_run"]:
+            self._dry_run(logs)
+            return
+
+        ids = list(logs.values_list("id", flat=True))
+        if not ids:
+            self.stdout.write("Nothing to replay.")
+            return
+
+        workers = options["workers"]
+        if connection.vendor == "sqlite" and workers > 1:
+            # No row locks on SQLite, so parallel workers could replay the same log twice.
+            self.stdout.write(self.style.WARNING("SQLite has no SKIP LOCKED; using a single worker."))
+            workers = 1
+
+        chunk_size = max(options["chunk_size"], 1)
+        chunks = [ids[i:i + chunk_size] for i in range(0, len(ids), chunk_size)]
+        self.totals = Counter()
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+        self.last_report = self.started
+        self.total = len(ids)
+        self.progress_every = options["progress_every"]
+
+        self.stdout.write(f"Replaying {len(ids)} failed logs with {workers} workers...")
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="replay") as executor:
+            for _ in executor.map(self._replay_chunk, chunks):
+                pass
+
+        self._report(final=True)
+
+    def _datetime(self, option, value):
+        try:
+            parsed = parse_datetime(value)
+        except ValueError:
+            parsed = None
+        if parsed is None:
+            raise CommandError(f"{option} must be an ISO datetime, e.g. 2024-05-01T00:00:00Z; got {value!r}")
+        if timezone.is_naive(parsed):
+            parsed = timezone.make_aware(parsed)
+        return parsed
+
+    def _replay_chunk(self, ids):
+        try:
+            for log_id in ids:
+                try:
+                    outcome = replay_failed_log(log_id)
+                except Exception as e:
+                    self.stderr.write(f"Replay of {log_id} failed: {e}")
+                    outcome = "error"
+                with self.lock:
+                    self.totals[outcome] += 1
+                self._report()
+        finally:
+            connection.close()
+
+    def _report(self, final=False):
+        with self.lock:
+            now = time.monotonic()
+            if not final and now - self.last_report < self.progress_every:
+                return
+            self.last_report = now
+            done = sum(self.totals.values())
+            rate = done / max(now - self.started, 1e-9)
+            counts = ", ".join(f"{key}={self.totals[key]}" for key in ("replayed", "failed", "skipped", "error"))
+            line = f"{done}/{self.total} ({rate:,.0f}/s) {counts}"
+            self.stdout.write(self.style.SUCCESS(line) if final else line)
+
+    def _dry_run(self, logs):
+        totals = Counter()
+        errors = Counter()
+        for raw_data in logs.values_list("raw_data", flat=True).iterator(chunk_size=2000):
+            try:
+                parse_frame(raw_data)
+                totals["parse"] += 1
+            except MC60ParseError as e:
+                totals["fail"] += 1
+                errors[e.code] += 1
+
+        self.stdout.write(f"{totals['parse']} would parse, {totals['fail']} would still fail.")
+        for error, count in errors.most_common(10):
+            self.stdout.write(f"  {count} x {error}")
@@ -0,0 +1,70 @@
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from ...partitions import (
+    PARTITIONED_MODELS,
+    add_months,
+    archive_partition,
+    detach_partition,
+    drop_partition,
+    ensure_partitions,
+    expired_partitions,
+    month_start,
+    partitioning_enabled,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Creates upcoming monthly partitions and applies the retention policy to "
+        "IncomingMessage/DeliveryAttempt partitions older than --keep-months."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--keep-months", type=int, default=settings.RETENTION_KEEP_MONTHS)
+        parser.add_argument("--months-ahead", type=int, default=settings.PARTITION_MONTHS_AHEAD)
+        parser.add_argument(
+            "--action",
+            choices=["detach", "drop", "archive"],
+            default="detach",
+            help="detach keeps old partitions as standalone tables; archive dumps them to .csv.gz before dropping.",
+        )
+        parser.add_argument("--archive-dir", default=settings.ARCHIVE_ROOT)
+        parser.add_argument("--dry-run", action="store_true")
+
+    def handle(self, *args, **options):
+        if not partitioning_enabled():
+            raise CommandError("Partitioned tables not found; retention requires PostgreSQL with migration 0012 applied.")
+
+        keep_months = options["keep_months"]
+        if keep_months < 1:
+            raise CommandError("--keep-months must be at least 1.")
+
+        if not options["dry_run"]:
+            for name, moved in ensure_partitions(options["months_ahead"]):
+                if moved:
+                    self.stdout.write(f"Created partition {name} ({moved} rows moved from the DEFAULT partition)")
+                else:
+                    self.stdout.write(f"Created partition {name}")
+
+        cutoff = add_months(month_start(datetime.now(timezone.utc)), -keep_months)
+        self.stdout.write(f"Retention cutoff: {cutoff.date()} (action: {options['action']})")
+
+        for model, _ in PARTITIONED_MODELS:
+            table = model._meta.db_table
+            for partition in expired_partitions(table, cutoff):
+                if options["dry_run"]:
+                    self.stdout.write(f"[dry-run] would {options['action']} {partition}")
+                    continue
+
+                if options["action"] == "detach":
+                    detach_partition(table, partition)
+                    self.stdout.write(self.style.SUCCESS(f"Detached {partition}"))
+                elif options["action"] == "drop":
+                    drop_partition(table, partition)
+                    self.stdout.write(self.style.SUCCESS(f"Dropped {partition}"))
+                else:
+                    path = archive_partition(table, partition, options["archive_dir"])
+                    self.stdout.write(self.style.SUCCESS(f"Archived {partition} to {path}"))
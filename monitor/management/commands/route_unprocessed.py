@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from ...ingest import route_unprocessed
+
+
+class Command(BaseCommand):
+    help = (
+        "Routes messages that are still unprocessed some time after they were received, "
+        "e.g. because the process that stored them died. The ingest router runs the same sweep periodically."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--older-than", type=float, default=settings.INGEST_SWEEP_AGE,
+            help="Seconds since a message was received before it is swept; recent ones may still be being routed.",
+        )
+        parser.add_argument("--within", type=float, default=settings.INGEST_SWEEP_WINDOW, help="Seconds to look back.")
+        parser.add_argument("--batch-size", type=int, default=settings.INGEST_ROUTE_BATCH)
+
+    def handle(self, *args, **options):
+        routed = route_unprocessed(options["older_than"], options["within"], options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Routed {routed} unprocessed messages."))
@@ -0,0 +1,95 @@
+import json
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from ...models import ForwardRule
+from ...simulation import FILTER_KEYS, load_candidates, simulate
+
+
+def _datetime(value):
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise ValueError(value)
+    return parsed if timezone.is_aware(parsed) else timezone.make_aware(parsed)
+
+
+def _filters(value):
+    filters = json.loads(value)
+    if not isinstance(filters, dict) or set(filters) - set(FILTER_KEYS):
+        raise ValueError(value)
+    if not all(isinstance(item, str) and item for item in filters.values()):
+        raise ValueError(value)
+    return filters
+
+
+class Command(BaseCommand):
+    help = (
+        "Counts the incoming messages in a time range that candidate rule filters would have "
+        "matched, with sample messages. Nothing is forwarded."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--filters", type=_filters, action="append", default=[],
+            help=f'Candidate filters as JSON, e.g. \'{{"body_contains": "code"}}\' (keys: {", ".join(FILTER_KEYS)}). Repeatable.',
+        )
+        parser.add_argument("--rule", type=uuid.UUID, action="append", default=[], help="Existing ForwardRule id. Repeatable.")
+        parser.add_argument("--start", type=_datetime, help="ISO datetime; default: --days before --end.")
+        parser.add_argument("--end", type=_datetime, help="ISO datetime; default: now.")
+        parser.add_argument("--days", type=float, default=30)
+        parser.add_argument("--chunk-size", type=int, default=settings.RULE_SIMULATION_CHUNK_SIZE)
+        parser.add_argument("--workers", type=int, default=settings.RULE_SIMULATION_WORKERS, help="Evaluating processes; 0 runs inline.")
+        parser.add_argument("--samples", type=int, default=settings.RULE_SIMULATION_SAMPLES)
+        parser.add_argument("--database", default="default", help="Database alias to read from, e.g. replica_0.")
+        parser.add_argument("--output", help="Write the result as JSON to this path.")
+
+    def handle(self, *args, **options):
+        end = options["end"] or timezone.now()
+        start = options["start"] or end - timedelta(days=options["days"])
+        if start >= end:
+            raise CommandError("--start must be before --end")
+        try:
+            candidates = load_candidates(options["filters"], options["rule"], using=options["database"])
+        except ForwardRule.DoesNotExist as e:
+            raise CommandError(str(e))
+        if not candidates:
+            raise CommandError("Give at least one --filters or --rule.")
+
+        self.stdout.write(
+            f"Simulating {len(candidates)} candidate(s) over {start.isoformat()} .. {end.isoformat()} "
+            f"with {options['workers']} worker(s)"
+        )
+        result = None
+        for event in simulate(
+            candidates,
+            start,
+            end,
+            chunk_size=options["chunk_size"],
+            workers=options["workers"],
+            sample_size=options["samples"],
+            using=options["database"],
+        ):
+            if event["event"] == "progress":
+                self.stdout.write(f"  scanned {event['scanned']:,}", ending="\r")
+                self.stdout.flush()
+            else:
+                result = event
+
+        seconds = result["elapsed_ms"] / 1000
+        rate = result["scanned"] / seconds if seconds else 0
+        self.stdout.write(f"Scanned {result['scanned']:,} messages in {seconds:.2f}s ({rate:,.0f}/s)")
+        for candidate in result["candidates"]:
+            label = candidate["name"] or json.dumps(candidate["filters"], ensure_ascii=False)
+            self.stdout.write(self.style.SUCCESS(f"{label}: {candidate['matches']:,} matches"))
+            for sample in candidate["samples"]:
+                self.stdout.write(f"    {sample['received_at']} {sample['from_number']}: {sample['body'][:80]}")
+
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as output:
+                json.dump(result, output, ensure_ascii=False, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Result written to {options['output']}"))
@@ -0,0 +1,184 @@
+# monitor/mc60.py
+"""
+Parser for the `sender:content` frames the MC60 gateway publishes.
+
+The modem runs in text mode, so `content` is either plain GSM text or, for
+UCS2 messages, the UTF-16BE bytes as hex. A UCS2 part of a concatenated SMS
+still carries its User Data Header (3GPP TS 23.040 9.2.3.24), which is
+reported on the frame so the parts can be joined.
+"""
+import codecs
+import re
+import unicodedata
+from dataclasses import dataclass
+
+# Whole-string check in C instead of a per-character Python loop. UCS2 text is
+# two bytes per character, so its hex length is a multiple of four.
+_UCS2_HEX = re.compile(r"(?:[0-9A-Fa-f]{4})+")
+_UCS2_WITH_UDH_HEX = re.compile(r"(?:[0-9A-Fa-f]{2})+")
+# Decoded "text" containing these was almost certainly never UCS2.
+_CONTROL_CHARS = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f\x7f-\x9f]")
+
+MIN_UCS2_HEX_LENGTH = 5
+MAX_SENDER_LENGTH = 32  # IncomingMessage.from_number
+
+# Code points no SMS text is made of: unassigned, private use, lone surrogates.
+_NOT_TEXT = {"Cn", "Co", "Cs"}
+# Japanese mixes these three; they count as one script.
+_SCRIPT_ALIASES = {"HIRAGANA": "CJK", "KATAKANA": "CJK"}
+
+
+class MC60ParseError(ValueError):
+    """A frame that cannot be turned into a message; `code` says why."""
+
+    def __init__(self, code: str, message: str):
+        super().__init__(f"{code}: {message}")
+        self.code = code
+
+
+@dataclass(frozen=True, slots=True)
+class Segment:
+    """Concatenation info from the UDH: part `sequence` of `total`."""
+    reference: int
+    total: int
+    sequence: int
+
+
+@dataclass(frozen=True, slots=True)
+class MC60Frame:
+    sender: str
+    body: str
+    encoding: str  # "ucs2" or "text"
+    segment: Segment | None = None
+
+    @property
+    def is_multipart(self) -> bool:
+        return self.segment is not None
+
+
+def _parse_udh(data: memoryview) -> tuple[Segment, int] | None:
+    """
+    Concatenation header at the start of the user data, either
+    05 00 03 <ref> <total> <seq> (8-bit reference) or
+    06 08 04 <ref hi> <ref lo> <total> <seq> (16-bit reference).
+    Returns the segment and the offset where the text starts.
+    """
+    if len(data) >= 6 and data[0] == 0x05 and data[1] == 0x00 and data[2] == 0x03:
+        reference, total, sequence, offset = data[3], data[4], data[5], 6
+    elif len(data) >= 7 and data[0] == 0x06 and data[1] == 0x08 and data[2] == 0x04:
+        reference, total, sequence, offset = (data[3] << 8) | data[4], data[5], data[6], 7
+    else:
+        return None
+
+    if total < 2 or not 1 <= sequence <= total:
+        raise MC60ParseError("invalid_udh", f"segment {sequence} of {total}")
+    return Segment(reference, total, sequence), offset
+
+
+def _decode_ucs2(content: str) -> tuple[str, Segment | None]:
+    data = bytes.fromhex(content)
+    view = memoryview(data)
+    try:
+        header = _parse_udh(view)
+        offset = 0
+        segment = None
+        if header is not None:
+            segment, offset = header
+        if (len(data) - offset) % 2:
+            raise MC60ParseError("invalid_ucs2", "odd number of UTF-16 bytes")
+        try:
+            # Decodes straight from the buffer; slicing a memoryview copies nothing.
+            text, _ = codecs.utf_16_be_decode(view[offset:], "strict", True)
+        except UnicodeDecodeError as e:
+            raise MC60ParseError("invalid_ucs2", str(e)) from None
+        if _CONTROL_CHARS.search(text):
+            raise MC60ParseError("invalid_ucs2", "decodes to control characters")
+        # A number is only taken for UCS2 if every character is below U+1000
+        # (Latin, Arabic, Cyrillic, ...); otherwise e.g. 12345678 would become U+1234 U+5678.
+        if content.isdigit() and any(ord(char) >= 0x1000 for char in text):
+            raise MC60ParseError("invalid_ucs2", "a number, not UCS2")
+        if not _plausible_text(text):
+            raise MC60ParseError("invalid_ucs2", "does not decode to text of one script")
+        return text, segment
+    finally:
+        view.release()
+
+
+# Per character: "" (not a letter), "!" (not text) or the script of a letter.
+_char_classes = {}
+
+
+def _char_class(char: str) -> str:
+    category = unicodedata.category(char)
+    if category in _NOT_TEXT:
+        return "!"
+    if category[0] != "L":
+        return ""
+    script = unicodedata.name(char, "").split(" ", 1)[0]
+    return _SCRIPT_ALIASES.get(script, script)
+
+
+def _plausible_text(text: str) -> bool:
+    """
+    No unassigned or private-use characters, and letters of at most one script
+    besides Latin. Hex that is not UCS2 decodes to characters from unrelated
+    blocks, so this rejects almost all of it.
+    """
+    classes = set()
+    for char in set(text):
+        found = _char_classes.get(char)
+        if found is None:
+            found = _char_classes[char] = _char_class(char)
+        classes.add(found)
+    if "!" in classes:
+        return False
+    return len(classes - {"", "LATIN"}) <= 1
+
+
+def _looks_like_ucs2(content: str) -> bool:
+    if len(content) < MIN_UCS2_HEX_LENGTH:
+        return False
+    if _UCS2_HEX.fullmatch(content):
+        return True
+    # A 16-bit reference UDH is 7 bytes, which leaves the hex length at 4n + 2.
+    return content.startswith("060804") and _UCS2_WITH_UDH_HEX.fullmatch(content) is not None
+
+
+def parse_frame(payload: bytes | str) -> MC60Frame:
+    """Parses one MQTT payload. Raises MC60ParseError for malformed frames."""
+    if isinstance(payload, (bytes, bytearray, memoryview)):
+        try:
+            payload = bytes(payload).decode("utf-8")
+        except UnicodeDecodeError as e:
+            raise MC60ParseError("invalid_utf8", str(e)) from None
+
+    sender, separator, content = payload.partition(":")
+    if not separator:
+        raise MC60ParseError("missing_separator", "expected 'sender:content'")
+    sender = sender.strip()
+    if not sender:
+        raise MC60ParseError("empty_sender", "sender is empty")
+    if len(sender) > MAX_SENDER_LENGTH:
+        raise MC60ParseError("invalid_sender", f"sender longer than {MAX_SENDER_LENGTH} characters")
+
+    if _looks_like_ucs2(content):
+        try:
+            body, segment = _decode_ucs2(content)
+        except MC60ParseError:
+            # Plain text that only looks like hex, e.g. a long number or a hex id.
+            # Without the DCS a frame cannot tell every such text apart from UCS2:
+            # "CAFEBABE" decodes to two Hangul syllables and is read as UCS2.
+            return MC60Frame(sender, content, "text")
+        return MC60Frame(sender, body, "ucs2", segment)
+
+    return MC60Frame(sender, content, "text")
+
+
+def join_segments(frames) -> str:
+    """Body of a concatenated SMS from all of its parts, in sequence order."""
+    parts = sorted(frames, key=lambda frame: frame.segment.sequence)
+    total = parts[0].segment.total
+    sequences = [frame.segment.sequence for frame in parts]
+    if sequences != list(range(1, total + 1)):
+        raise MC60ParseError("incomplete_message", f"have parts {sequences} of {total}")
+    return "".join(frame.body for frame in parts)
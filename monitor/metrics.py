@@ -0,0 +1,121 @@
+# monitor/metrics.py
+"""
+Prometheus metrics for the ingest -> match -> deliver pipeline.
+
+When PROMETHEUS_MULTIPROC_DIR is set (see Dockerfile), every process writes its
+samples to that directory and `build_registry()` aggregates all of them, so a
+scrape of any gunicorn/uvicorn worker returns totals for the whole server.
+"""
+import os
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+    start_http_server,
+)
+
+MULTIPROC_DIR = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+if MULTIPROC_DIR:
+    os.makedirs(MULTIPROC_DIR, exist_ok=True)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+MESSAGES_INGESTED = Counter(
+    "esp_messages_ingested_total",
+    "Incoming SMS stored in the database.",
+    ["source"],
+)
+INGEST_FAILURES = Counter(
+    "esp_ingest_failures_total",
+    "Incoming payloads that could not be stored or processed.",
+    ["source", "stage"],
+)
+INGEST_LAG = Histogram(
+    "esp_ingest_lag_seconds",
+    "Time from receiving a payload to committing its IncomingMessage.",
+    ["source"],
+    buckets=LATENCY_BUCKETS,
+)
+RULE_MATCHING = Histogram(
+    "esp_rule_matching_seconds",
+    "Time spent evaluating ForwardRule filters for one message.",
+    buckets=(0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25),
+)
+DELIVERY_LATENCY = Histogram(
+    "esp_delivery_latency_seconds",
+    "Provider round-trip time of a delivery attempt.",
+    ["channel_type"],
+    buckets=LATENCY_BUCKETS,
+)
+DELIVERIES = Counter(
+    "esp_deliveries_total",
+    "Finished delivery attempts.",
+    ["channel_type", "status"],
+)
+CONSUMER_IN_FLIGHT = Gauge(
+    "esp_consumer_in_flight_messages",
+    "MQTT messages currently being handled by consumer processes.",
+    multiprocess_mode="livesum",
+)
+PENDING_DELIVERIES = Gauge(
+    "esp_pending_deliveries",
+    "Delivery attempts still pending (sampled when /metrics is scraped).",
+    multiprocess_mode="mostrecent",
+)
+DB_POOL_WAIT = Histogram(
+    "esp_db_pool_wait_seconds",
+    "Time spent getting a connection from the database pool (including opening one).",
+    ["alias"],
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10),
+)
+DB_POOL_CONNECTIONS = Gauge(
+    "esp_db_pool_connections",
+    "Pooled database connections by state.",
+    ["alias", "state"],
+    multiprocess_mode="livesum",
+)
+DB_POOL_TIMEOUTS = Counter(
+    "esp_db_pool_timeouts_total",
+    "Checkouts that gave up because the pool stayed full.",
+    ["alias"],
+)
+DB_REPLICA_LAG = Gauge(
+    "esp_db_replica_lag_seconds",
+    "Replication lag of each read replica, as last measured by the router.",
+    ["alias"],
+    multiprocess_mode="mostrecent",
+)
+
+SPOOL_RECORDS = Counter(
+    "esp_spool_records_total",
+    "Incoming messages written to / drained from the consumer's local spool.",
+    ["event"],
+)
+SPOOL_PENDING = Gauge(
+    "esp_spool_pending",
+    "Spooled incoming messages not yet stored in the database.",
+    multiprocess_mode="livesum",
+)
+
+
+def build_registry():
+    if not MULTIPROC_DIR:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def render_latest() -> tuple[bytes, str]:
+    return generate_latest(build_registry()), CONTENT_TYPE_LATEST
+
+
+def start_metrics_server(port: int) -> None:
+    """Serves /metrics from a background thread (used by long-running commands)."""
+    start_http_server(port, registry=build_registry())
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.16 on 2026-10-19 13:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0009_failedlog'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='incomingmessage',
+            name='received_at',
+            field=models.DateTimeField(db_index=True),
+        ),
+        migrations.AddIndex(
+            model_name='deliveryattempt',
+            index=models.Index(fields=['created_at'], name='deliveryattempt_created_idx'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+from django.db import migrations
+
+# Trigram indexes make ILIKE '%term%' on message bodies and numbers an index scan.
+# They only exist on PostgreSQL; on other backends this migration is a no-op.
+TRIGRAM_INDEXES = (
+    ("incomingmessage_body_trgm", "body"),
+    ("incomingmessage_from_trgm", "from_number"),
+    ("incomingmessage_to_trgm", "to_number"),
+)
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    table = apps.get_model("monitor", "IncomingMessage")._meta.db_table
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for name, column in TRIGRAM_INDEXES:
+        schema_editor.execute(
+            f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} "
+            f"ON {table} USING gin ({column} gin_trgm_ops)"
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name, _ in TRIGRAM_INDEXES:
+        schema_editor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction.
+    atomic = False
+
+    dependencies = [
+        ('monitor', '0010_export_time_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
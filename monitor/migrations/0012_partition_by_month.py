@@ -0,0 +1,145 @@
+# Generated by Django 4.2.16 on 2026-10-19 13:28
+
+from datetime import datetime, timezone
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Converts the two append-only tables into monthly RANGE partitioned tables
+# (PostgreSQL only). Existing rows are not copied: the old table is renamed and
+# attached as a single "legacy" partition that covers everything up to the end
+# of the month of its newest row. Monthly partitions follow from there, plus a
+# DEFAULT partition so inserts never fail if maintenance falls behind.
+#
+# PostgreSQL requires the partition key in every unique constraint, so the
+# database primary key becomes (id, <key>). Django still treats `id` as the pk,
+# but the database no longer enforces that `id` alone is unique (ids are UUIDv7s
+# generated by the application), and a lookup by `id` alone searches every
+# partition (see monitor/partitions.py).
+PARTITIONED_TABLES = (
+    ("monitor_incomingmessage", "received_at"),
+    ("monitor_deliveryattempt", "created_at"),
+)
+MONTHS_AHEAD = 3
+
+
+def _add_months(month_start, months):
+    index = month_start.year * 12 + month_start.month - 1 + months
+    return month_start.replace(year=index // 12, month=index % 12 + 1)
+
+
+def _month_start(value):
+    return datetime(value.year, value.month, 1, tzinfo=timezone.utc)
+
+
+def _indexes(cursor, table):
+    cursor.execute(
+        "SELECT indexname, indexdef FROM pg_indexes "
+        "WHERE schemaname = current_schema() AND tablename = %s AND indexname <> %s",
+        [table, f"{table}_pkey"],
+    )
+    return cursor.fetchall()
+
+
+def _foreign_keys(cursor, table):
+    # LIKE ... INCLUDING CONSTRAINTS does not copy foreign keys.
+    cursor.execute(
+        "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+        "WHERE conrelid = %s::regclass AND contype = 'f'",
+        [table],
+    )
+    return cursor.fetchall()
+
+
+def _partition_table(cursor, table, key):
+    legacy = f"{table}_legacy"
+    indexes = _indexes(cursor, table)
+    foreign_keys = _foreign_keys(cursor, table)
+
+    cursor.execute(f"ALTER TABLE {table} RENAME TO {legacy}")
+    # The (id, <key>) primary key index is built on the legacy table when it is attached.
+    cursor.execute(f"ALTER TABLE {legacy} DROP CONSTRAINT {table}_pkey")
+    for position, (name, _) in enumerate(indexes):
+        cursor.execute(f"ALTER INDEX {name} RENAME TO {legacy}_idx{position}")
+
+    cursor.execute(
+        f"CREATE TABLE {table} (LIKE {legacy} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) "
+        f"PARTITION BY RANGE ({key})"
+    )
+    cursor.execute(f"ALTER TABLE {table} ADD CONSTRAINT {table}_pkey PRIMARY KEY (id, {key})")
+    for _, definition in indexes:
+        # Definitions were read before the rename, so they recreate each index on
+        # the parent under its original name. Matching indexes on the legacy
+        # table are attached to them instead of being rebuilt.
+        cursor.execute(definition)
+    for name, definition in foreign_keys:
+        cursor.execute(f"ALTER TABLE {table} ADD CONSTRAINT {name} {definition}")
+
+    cursor.execute(f"SELECT max({key}) FROM {legacy}")
+    newest = cursor.fetchone()[0]
+    current_month = _month_start(datetime.now(timezone.utc))
+    boundary = _add_months(_month_start(newest), 1) if newest else current_month
+    boundary = max(boundary, current_month)
+
+    cursor.execute(
+        f"ALTER TABLE {table} ATTACH PARTITION {legacy} FOR VALUES FROM (MINVALUE) TO (%s)",
+        [boundary],
+    )
+
+    month = boundary
+    last = _add_months(current_month, MONTHS_AHEAD + 1)
+    while month < last:
+        upper = _add_months(month, 1)
+        cursor.execute(
+            f"CREATE TABLE {table}_p{month:%Y%m} PARTITION OF {table} FOR VALUES FROM (%s) TO (%s)",
+            [month, upper],
+        )
+        month = upper
+    cursor.execute(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT")
+
+
+def _unpartition_table(cursor, table, key):
+    legacy = f"{table}_legacy"
+    cursor.execute(f"CREATE TABLE {legacy}_all (LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+    cursor.execute(f"INSERT INTO {legacy}_all SELECT * FROM {table}")
+    indexes = _indexes(cursor, table)
+    foreign_keys = _foreign_keys(cursor, table)
+    cursor.execute(f"DROP TABLE {table} CASCADE")
+    cursor.execute(f"ALTER TABLE {legacy}_all RENAME TO {table}")
+    cursor.execute(f"ALTER TABLE {table} ADD CONSTRAINT {table}_pkey PRIMARY KEY (id)")
+    for _, definition in indexes:
+        cursor.execute(definition.replace(" ON ONLY ", " ON "))
+    for name, definition in foreign_keys:
+        cursor.execute(f"ALTER TABLE {table} ADD CONSTRAINT {name} {definition}")
+
+
+def partition_tables(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for table, key in PARTITIONED_TABLES:
+            _partition_table(cursor, table, key)
+
+
+def unpartition_tables(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for table, key in PARTITIONED_TABLES:
+            _unpartition_table(cursor, table, key)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0011_message_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='deliveryattempt',
+            name='message',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='deliveries', to='monitor.incomingmessage'),
+        ),
+        migrations.RunPython(partition_tables, unpartition_tables),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 4.2.16 on 2026-10-19 13:34
+
+from django.db import migrations, models
+import monitor.uuids
+
+# Only the Python-side default changes: new rows get time-ordered UUIDv7 keys,
+# existing uuid4 keys are left as they are and no table or index is rewritten.
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0012_partition_by_month'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='deliveryattempt',
+            name='id',
+            field=models.UUIDField(default=monitor.uuids.uuid7, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='destinationchannel',
+            name='id',
+            field=models.UUIDField(default=monitor.uuids.uuid7, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='failedlog',
+            name='id',
+            field=models.UUIDField(default=monitor.uuids.uuid7, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='forwardrule',
+            name='id',
+            field=models.UUIDField(default=monitor.uuids.uuid7, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='incomingmessage',
+            name='id',
+            field=models.UUIDField(default=monitor.uuids.uuid7, editable=False, primary_key=True, serialize=False),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.16 on 2026-10-19 13:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0013_time_ordered_uuid_keys'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='incomingmessage',
+            name='trace_id',
+            field=models.CharField(blank=True, default='', max_length=32),
+        ),
+    ]
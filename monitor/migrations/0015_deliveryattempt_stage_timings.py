@@ -0,0 +1,33 @@
+# Generated by Django 4.2.16 on 2026-10-19 13:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0014_incomingmessage_trace_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='deliveryattempt',
+            name='dispatch_started_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='deliveryattempt',
+            name='enqueued_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='deliveryattempt',
+            name='provider_duration_ms',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='deliveryattempt',
+            name='total_latency_ms',
+            field=models.FloatField(blank=True, help_text='From IncomingMessage.received_at to the end of the attempt.', null=True),
+        ),
+    ]
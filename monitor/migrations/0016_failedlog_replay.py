@@ -0,0 +1,29 @@
+# Generated by Django 4.2.16 on 2026-10-19 13:49
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0015_deliveryattempt_stage_timings'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='failedlog',
+            name='replay_error',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='failedlog',
+            name='replayed_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='failedlog',
+            name='replayed_message',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='replayed_from', to='monitor.incomingmessage'),
+        ),
+    ]
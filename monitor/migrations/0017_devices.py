@@ -0,0 +1,37 @@
+# Generated by Django 4.2.16 on 2026-10-19 13:55
+
+from django.db import migrations, models
+import django.db.models.deletion
+import monitor.uuids
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0016_failedlog_replay'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Device',
+            fields=[
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('id', models.UUIDField(default=monitor.uuids.uuid7, editable=False, primary_key=True, serialize=False)),
+                ('device_id', models.CharField(help_text='Topic segment, as in device/<device_id>/sms_rx.', max_length=64, unique=True)),
+                ('name', models.CharField(blank=True, max_length=128)),
+                ('phone_number', models.CharField(blank=True, help_text='Number of the SIM; stored as to_number of received SMS.', max_length=32)),
+                ('is_enabled', models.BooleanField(default=True, help_text='Disabled devices still receive, but are not used for sending.')),
+                ('send_rate_per_minute', models.PositiveIntegerField(default=0, help_text='Outbound SMS per minute before another device is preferred (0 = no limit).')),
+                ('last_seen_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.AddField(
+            model_name='incomingmessage',
+            name='device',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='messages', to='monitor.device'),
+        ),
+    ]
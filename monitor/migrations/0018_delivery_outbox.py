@@ -0,0 +1,28 @@
+# Generated by Django 4.2.16 on 2026-10-19 13:59
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0017_devices'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeliveryOutbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('available_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('locked_until', models.DateTimeField(blank=True, null=True)),
+                ('claims', models.IntegerField(default=0, help_text='How many times a relay has picked this row up.')),
+                ('attempt', models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='outbox', to='monitor.deliveryattempt')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['available_at'], name='deliveryoutbox_available_idx')],
+            },
+        ),
+    ]
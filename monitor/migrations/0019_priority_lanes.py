@@ -0,0 +1,31 @@
+# Generated by Django 4.2.16 on 2026-10-19 14:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0018_delivery_outbox'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='deliveryoutbox',
+            name='deliveryoutbox_available_idx',
+        ),
+        migrations.AddField(
+            model_name='deliveryoutbox',
+            name='priority',
+            field=models.PositiveSmallIntegerField(default=5),
+        ),
+        migrations.AddField(
+            model_name='forwardrule',
+            name='priority',
+            field=models.PositiveSmallIntegerField(choices=[(0, 'Low (bulk, marketing)'), (5, 'Normal'), (10, 'High (OTP, bank alerts)')], default=5, help_text='Deliveries of higher priority are dispatched first; high priority has reserved relay capacity.'),
+        ),
+        migrations.AddIndex(
+            model_name='deliveryoutbox',
+            index=models.Index(fields=['-priority', 'available_at'], name='deliveryoutbox_claim_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.16 on 2026-10-19 14:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0019_priority_lanes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='device',
+            name='ingest_token_hash',
+            field=models.CharField(blank=True, db_index=True, editable=False, help_text='SHA-256 of the token the device sends to the HTTP ingest endpoint.', max_length=64),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.16 on 2026-10-19 15:21
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def copy_attempt_created_at(apps, schema_editor):
+    DeliveryAttempt = apps.get_model("monitor", "DeliveryAttempt")
+    DeliveryOutbox = apps.get_model("monitor", "DeliveryOutbox")
+    DeliveryOutbox.objects.update(
+        attempt_created_at=Subquery(
+            DeliveryAttempt.objects.filter(id=OuterRef("attempt_id")).values("created_at")[:1]
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0020_device_ingest_token'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='deliveryoutbox',
+            name='attempt_created_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(copy_attempt_created_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.16 on 2026-10-19 15:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0021_outbox_attempt_created_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='failedlog',
+            name='topic',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+    ]
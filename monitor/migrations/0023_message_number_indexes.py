@@ -0,0 +1,74 @@
+from django.db import migrations, models
+
+NUMBER_INDEXES = (
+    ("incomingmessage_from_idx", "from_number"),
+    ("incomingmessage_to_idx", "to_number"),
+)
+
+
+def _partitions(cursor, table):
+    cursor.execute(
+        "SELECT child.relname FROM pg_inherits "
+        "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "WHERE pg_inherits.inhparent = to_regclass(%s)",
+        [table],
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+
+def create_number_indexes(apps, schema_editor):
+    model = apps.get_model("monitor", "IncomingMessage")
+    table = model._meta.db_table
+    if schema_editor.connection.vendor != "postgresql":
+        for name, column in NUMBER_INDEXES:
+            schema_editor.add_index(model, models.Index(fields=[column], name=name))
+        return
+
+    with schema_editor.connection.cursor() as cursor:
+        partitions = _partitions(cursor, table)
+    for name, column in NUMBER_INDEXES:
+        if not partitions:
+            schema_editor.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} ({column})")
+            continue
+        # A partitioned table cannot be indexed concurrently: the parent index is created
+        # invalid and empty, each partition is indexed concurrently and attached, and the
+        # parent index becomes valid once every partition has one.
+        schema_editor.execute(f"CREATE INDEX IF NOT EXISTS {name} ON ONLY {table} ({column})")
+        for partition in partitions:
+            schema_editor.execute(
+                f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {partition}_{column}_idx ON {partition} ({column})"
+            )
+            schema_editor.execute(f"ALTER INDEX {name} ATTACH PARTITION {partition}_{column}_idx")
+
+
+def drop_number_indexes(apps, schema_editor):
+    # Dropping the parent index drops the attached partition indexes with it.
+    for name, _ in NUMBER_INDEXES:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction.
+    atomic = False
+
+    dependencies = [
+        ('monitor', '0022_failedlog_topic'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(
+                    model_name='incomingmessage',
+                    index=models.Index(fields=['from_number'], name='incomingmessage_from_idx'),
+                ),
+                migrations.AddIndex(
+                    model_name='incomingmessage',
+                    index=models.Index(fields=['to_number'], name='incomingmessage_to_idx'),
+                ),
+            ],
+            database_operations=[
+                migrations.RunPython(create_number_indexes, drop_number_indexes),
+            ],
+        ),
+    ]
@@ -1,8 +1,8 @@
-import uuid
 from django.db import models
 from django.utils import timezone
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.conf import settings
+from .uuids import uuid7
 
 class TimeStampedModel(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
@@ -13,28 +13,71 @@ class TimeStampedModel(models.Model):
 
 
 
+class Device(TimeStampedModel):
+    """An SMS modem (e.g. an MC60) publishing on device/<device_id>/..."""
+    id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
+
+    device_id = models.CharField(max_length=64, unique=True, help_text="Topic segment, as in device/<device_id>/sms_rx.")
+    name = models.CharField(max_length=128, blank=True)
+    phone_number = models.CharField(max_length=32, blank=True, help_text="Number of the SIM; stored as to_number of received SMS.")
+    is_enabled = models.BooleanField(default=True, help_text="Disabled devices still receive, but are not used for sending.")
+    send_rate_per_minute = models.PositiveIntegerField(default=0, help_text="Outbound SMS per minute before another device is preferred (0 = no limit).")
+    last_seen_at = models.DateTimeField(null=True, blank=True)
+    ingest_token_hash = models.CharField(
+        max_length=64, blank=True, db_index=True, editable=False,
+        help_text="SHA-256 of the token the device sends to the HTTP ingest endpoint.",
+    )
+
+    def __str__(self):
+        return self.name or self.device_id
+
+
 class IncomingMessage(TimeStampedModel):
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
 
     # Sms Info
     from_number = models.CharField(max_length=32)
     to_number = models.CharField(max_length=32)
     body = models.TextField()
-    received_at = models.DateTimeField()
+    received_at = models.DateTimeField(db_index=True)
 
     # MetaData
     raw_payload = models.JSONField(default=dict, blank=True)
     processed = models.BooleanField(default=False)
+    trace_id = models.CharField(max_length=32, blank=True, default="")
+    device = models.ForeignKey(Device, on_delete=models.SET_NULL, null=True, blank=True, related_name="messages")
+
+    class Meta:
+        indexes = [
+            # Exact matches of search terms too short for the trigram indexes (monitor/search.py).
+            models.Index(fields=["from_number"], name="incomingmessage_from_idx"),
+            models.Index(fields=["to_number"], name="incomingmessage_to_idx"),
+        ]
 
     def __str__(self):
         return f"{self.to_number} <- {self.from_number}"
 
 
 class FailedLog(TimeStampedModel):
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
     raw_data = models.TextField(help_text="The original un-processed payload")
     error_message = models.TextField(blank=True, null=True)    
     source_tag = models.CharField(max_length=64, blank=True, default="mqtt_gateway")
+    # MQTT topic the payload arrived on: names the device, and keeps the parts of a multipart SMS together on replay.
+    topic = models.CharField(max_length=255, blank=True, default="")
+
+    # Set by replay_failed_log once the payload has been ingested.
+    replayed_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    replayed_message = models.ForeignKey(
+        IncomingMessage,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="replayed_from",
+        # IncomingMessage is partitioned; its primary key is (id, received_at).
+        db_constraint=False,
+    )
+    replay_error = models.TextField(blank=True, default="")
 
     class Meta:
         verbose_name = "Failed Log"
@@ -52,7 +95,7 @@ class DestinationChannel(TimeStampedModel):
         EMAIL = "email", "Email"
         Bale = "bale", "Bale"
 
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
 
     type = models.CharField(max_length=32, choices=ChannelType.choices)
     name = models.CharField(max_length=128)
@@ -66,7 +109,12 @@ class DestinationChannel(TimeStampedModel):
 
 
 class ForwardRule(TimeStampedModel):
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    class Priority(models.IntegerChoices):
+        LOW = 0, "Low (bulk, marketing)"
+        NORMAL = 5, "Normal"
+        HIGH = 10, "High (OTP, bank alerts)"
+
+    id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
 
     name = models.CharField(max_length=128)
     is_enabled = models.BooleanField(default=True)
@@ -74,6 +122,11 @@ class ForwardRule(TimeStampedModel):
     filters = models.JSONField(default=dict, blank=True)
 
     stop_processing = models.BooleanField(default=False)
+    priority = models.PositiveSmallIntegerField(
+        choices=Priority.choices,
+        default=Priority.NORMAL,
+        help_text="Deliveries of higher priority are dispatched first; high priority has reserved relay capacity.",
+    )
 
     def __str__(self):
         return f"Rule:{self.name}"
@@ -106,8 +159,16 @@ class DeliveryAttempt(TimeStampedModel):
         SENT = "sent", "Sent"
         FAILED = "failed", "Failed"
 
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
-    message = models.ForeignKey(IncomingMessage, on_delete=models.CASCADE, related_name="deliveries")
+    id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
+    # No database-level constraint: on PostgreSQL both tables are range-partitioned
+    # by time (see migration 0012), and a partitioned table cannot be referenced by a
+    # FK on `id` alone. Cascades are still applied by the ORM.
+    message = models.ForeignKey(
+        IncomingMessage,
+        on_delete=models.CASCADE,
+        related_name="deliveries",
+        db_constraint=False,
+    )
     rule = models.ForeignKey(ForwardRule, on_delete=models.SET_NULL, null=True, blank=True)
     channel = models.ForeignKey(DestinationChannel, on_delete=models.CASCADE, related_name="deliveries")
 
@@ -118,5 +179,49 @@ class DeliveryAttempt(TimeStampedModel):
     last_attempt_at = models.DateTimeField(null=True, blank=True)
     retry_count = models.IntegerField(default=0)
 
+    # Per-stage timings for latency analytics (see monitor/analytics.py).
+    enqueued_at = models.DateTimeField(null=True, blank=True)
+    dispatch_started_at = models.DateTimeField(null=True, blank=True)
+    provider_duration_ms = models.FloatField(null=True, blank=True)
+    total_latency_ms = models.FloatField(null=True, blank=True, help_text="From IncomingMessage.received_at to the end of the attempt.")
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["created_at"], name="deliveryattempt_created_idx"),
+        ]
+
     def __str__(self):
         return f"{self.message.id} -> {self.channel} [{self.status}]"
+
+
+class DeliveryOutbox(models.Model):
+    """
+    A delivery attempt waiting to be dispatched by the relay (manage.py relay_outbox).
+
+    Rows are written in the same transaction as their DeliveryAttempt, so an
+    attempt is dispatched if and only if it was committed, and no provider call
+    ever runs inside the ingest transaction. A relay claims rows by setting
+    `locked_until`; rows whose lease ran out (e.g. the relay died) are claimed again.
+    """
+    attempt = models.OneToOneField(
+        DeliveryAttempt,
+        on_delete=models.CASCADE,
+        related_name="outbox",
+        db_constraint=False,  # DeliveryAttempt is partitioned on PostgreSQL
+    )
+    available_at = models.DateTimeField(default=timezone.now)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    claims = models.IntegerField(default=0, help_text="How many times a relay has picked this row up.")
+    # Copied from the attempt, so it is loaded from its partition alone.
+    attempt_created_at = models.DateTimeField(null=True, blank=True)
+    # Copied from the rule, so claiming needs no join.
+    priority = models.PositiveSmallIntegerField(default=ForwardRule.Priority.NORMAL)
+
+    class Meta:
+        indexes = [
+            # Claim order: highest priority first, then oldest.
+            models.Index(fields=["-priority", "available_at"], name="deliveryoutbox_claim_idx"),
+        ]
+
+    def __str__(self):
+        return f"outbox {self.attempt_id}"
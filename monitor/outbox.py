@@ -0,0 +1,296 @@
+# monitor/outbox.py
+"""
+Relay for the delivery outbox.
+
+process_incoming_message only records pending DeliveryAttempts and their
+DeliveryOutbox rows. The relay claims committed rows in batches (SKIP LOCKED on
+PostgreSQL, so several relays can run side by side), commits the claim, and
+only then calls the providers, with no transaction open.
+
+Two engines: OutboxRelay sends each claimed batch from a thread pool, and
+AsyncOutboxRelay keeps thousands of sends in flight on one event loop (see
+async_delivery.py). Both hand finished attempts to a DeliveryStatusWriter,
+which saves them and removes their outbox rows in batches.
+
+Rows are claimed highest priority first (ForwardRule.priority, copied onto the
+row). High-priority rows also have capacity of their own: OutboxRelay runs a
+second loop with `reserved_workers` threads that only claims them, and
+AsyncOutboxRelay keeps `reserved_in_flight` of its slots for them. Bulk
+traffic can fill everything else without delaying OTPs and bank alerts.
+
+Delivery is at-least-once: if a relay dies after a provider accepted a message
+but before the attempt was saved, the row is dispatched again once its lease
+runs out. Attempts that are no longer pending are never sent twice.
+"""
+import asyncio
+import contextlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.db import close_old_connections, connection, connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .async_delivery import AsyncDeliveryEngine
+from .models import DeliveryAttempt, DeliveryOutbox, ForwardRule
+from .services import _execute_delivery_attempt
+from .status_writer import DeliveryStatusWriter
+
+
+HIGH = ForwardRule.Priority.HIGH
+
+
+def claim_batch(batch_size: int, lease: float, min_priority: int | None = None) -> list[tuple]:
+    """
+    Locks up to `batch_size` due rows (of at least `min_priority`) for `lease`
+    seconds, highest priority first; returns (row id, attempt id, priority,
+    attempt created_at) tuples.
+    """
+    now = timezone.now()
+    queryset = DeliveryOutbox.objects.select_for_update(skip_locked=True).filter(available_at__lte=now)
+    if min_priority is not None:
+        queryset = queryset.filter(priority__gte=min_priority)
+    # Without SKIP LOCKED (SQLite) the transaction would lock nothing, and there a
+    # read-then-write transaction fails at once instead of waiting for other writers.
+    locking = connection.features.has_select_for_update_skip_locked
+    with transaction.atomic() if locking else contextlib.nullcontext():
+        rows = list(
+            queryset.filter(Q(locked_until__isnull=True) | Q(locked_until__lte=now))
+            .order_by("-priority", "available_at")
+            .values_list("id", "attempt_id", "priority", "attempt_created_at")[:batch_size]
+        )
+        if rows:
+            DeliveryOutbox.objects.filter(id__in=[row[0] for row in rows]).update(
+                locked_until=now + timedelta(seconds=lease),
+                claims=F("claims") + 1,
+            )
+    return rows
+
+
+def claim_attempts(
+    batch_size: int, lease: float, min_priority: int | None = None
+) -> tuple[list[int], list[tuple[int, DeliveryAttempt, int]]]:
+    """
+    Claims a batch and loads its attempts. Returns the ids of rows that need no
+    delivery, and (row id, attempt, priority) tuples to dispatch.
+    """
+    rows = claim_batch(batch_size, lease, min_priority)
+    if not rows:
+        return [], []
+
+    queryset = DeliveryAttempt.objects.select_related("message", "channel").filter(
+        id__in=[attempt_id for _, attempt_id, _, _ in rows]
+    )
+    created = [created_at for _, _, _, created_at in rows]
+    if None not in created:
+        # Only the partitions holding the batch are searched, not all of them.
+        queryset = queryset.filter(created_at__range=(min(created), max(created)))
+    attempts = {attempt.id: attempt for attempt in queryset}
+    done = []
+    pending = []
+    for row_id, attempt_id, priority, _ in rows:
+        attempt = attempts.get(attempt_id)
+        # Gone (message deleted, partition dropped) or already finished before a crash.
+        if attempt is None or attempt.status != DeliveryAttempt.Status.PENDING:
+            done.append(row_id)
+        else:
+            pending.append((row_id, attempt, priority))
+    return done, pending
+
+
+class OutboxRelay:
+    def __init__(self, batch_size: int, workers: int, lease: float, reserved_workers: int = 0):
+        self.batch_size = batch_size
+        self.lease = lease
+        self.executor = ThreadPoolExecutor(max_workers=max(workers, 1), thread_name_prefix="outbox")
+        self.reserved_workers = max(reserved_workers, 0)
+        self.reserved_executor = (
+            ThreadPoolExecutor(max_workers=self.reserved_workers, thread_name_prefix="outbox-high")
+            if self.reserved_workers else None
+        )
+        self.writer = DeliveryStatusWriter()
+
+    def _dispatch(self, row_id: int, attempt: DeliveryAttempt, priority: int):
+        close_old_connections()
+        try:
+            _execute_delivery_attempt(attempt, attempt.message, save=False)
+        except Exception as e:
+            # Provider errors are recorded on the attempt, so this is a bug; the row
+            # stays claimed and is retried after its lease.
+            print(f"Outbox dispatch of {attempt.id} failed: {e}")
+            return
+        self.writer.submit(attempt, row_id)
+
+    def run_once(self, reserved: bool = False) -> int:
+        """
+        Claims and dispatches one batch, of any priority or (`reserved`) of high
+        priority on the reserved workers. Returns the number of rows claimed.
+        """
+        if reserved:
+            # No more than the reserved workers can start, so the rest stay claimable by the main loop.
+            done, pending = claim_attempts(min(self.batch_size, self.reserved_workers), self.lease, HIGH)
+            executor = self.reserved_executor
+        else:
+            done, pending = claim_attempts(self.batch_size, self.lease)
+            executor = self.executor
+        self.writer.complete(done)
+        for _ in executor.map(lambda item: self._dispatch(*item), pending):
+            pass
+        return len(done) + len(pending)
+
+    def _loop(self, stop: threading.Event, poll_interval: float, reserved: bool):
+        batch_size = min(self.batch_size, self.reserved_workers) if reserved else self.batch_size
+        while not stop.is_set():
+            try:
+                claimed = self.run_once(reserved)
+            except Exception as e:
+                print(f"Outbox relay error: {e}")
+                close_old_connections()
+                claimed = 0
+            if claimed < batch_size:
+                stop.wait(poll_interval)
+        connections.close_all()
+
+    def run(self, stop: threading.Event, poll_interval: float):
+        """Relays until `stop` is set, waiting `poll_interval` whenever the outbox is drained."""
+        reserved = None
+        if self.reserved_executor is not None:
+            reserved = threading.Thread(
+                target=self._loop, args=(stop, poll_interval, True), name="outbox-high", daemon=True
+            )
+            reserved.start()
+        self._loop(stop, poll_interval, False)
+        if reserved is not None:
+            reserved.join()
+
+    def flush(self) -> bool:
+        """Waits until the outcomes of everything dispatched so far are written; False if a write failed."""
+        return self.writer.flush()
+
+    def close(self) -> bool:
+        self.executor.shutdown(wait=True)
+        if self.reserved_executor is not None:
+            self.reserved_executor.shutdown(wait=True)
+        return self.writer.close()
+
+
+class AsyncOutboxRelay:
+    """
+    Keeps up to `max_in_flight` attempts in flight on one event loop, claiming
+    more as sends finish. Claims run on a database thread beside the loop, so
+    the ORM is never called from async code.
+
+    Two lanes share the slots: the shared lane claims rows of any priority
+    (highest first) into at most `max_in_flight - reserved_in_flight` slots,
+    and the reserved lane claims only high-priority rows into any free slot.
+    """
+
+    def __init__(
+        self,
+        batch_size: int,
+        max_in_flight: int,
+        per_host: int,
+        lease: float,
+        http2: bool = True,
+        reserved_in_flight: int = 0,
+        reserved_per_host: int = 0,
+    ):
+        self.batch_size = batch_size
+        self.max_in_flight = max(max_in_flight, 1)
+        self.reserved_in_flight = max(min(reserved_in_flight, self.max_in_flight - 1), 0)
+        self.per_host = per_host
+        self.reserved_per_host = reserved_per_host
+        self.lease = lease
+        self.http2 = http2
+        self.writer = DeliveryStatusWriter()
+
+    def run(self, stop: threading.Event, poll_interval: float):
+        """Relays until `stop` is set, then finishes the sends in flight."""
+        asyncio.run(self._run(stop, poll_interval))
+
+    def run_once(self) -> int:
+        """Dispatches everything due now. Returns the number of rows claimed."""
+        return asyncio.run(self._run(None, 0.05))
+
+    def flush(self) -> bool:
+        return self.writer.flush()
+
+    def close(self) -> bool:
+        return self.writer.close()
+
+    async def _run(self, stop: threading.Event | None, poll_interval: float) -> int:
+        loop = asyncio.get_running_loop()
+        db = ThreadPoolExecutor(max_workers=1, thread_name_prefix="outbox-db")
+        wakeup = asyncio.Event()
+        in_flight = {"reserved": 0, "shared": 0}
+        # Loop time of each lane's next claim; 0 while its last claim came back full.
+        next_claim = {"reserved": 0.0, "shared": 0.0}
+        claimed_total = 0
+
+        def room(lane):
+            free = self.max_in_flight - in_flight["reserved"] - in_flight["shared"]
+            if lane == "reserved":
+                return free if self.reserved_in_flight else 0
+            return min(free, self.max_in_flight - self.reserved_in_flight - in_flight["shared"])
+
+        async def deliver(lane, row_id, attempt, priority):
+            try:
+                await engine.deliver(attempt, high=priority >= HIGH)
+            except Exception as e:
+                # Left claimed, like a failed dispatch in OutboxRelay.
+                print(f"Outbox dispatch of {attempt.id} failed: {e}")
+            else:
+                self.writer.submit(attempt, row_id)
+            finally:
+                in_flight[lane] -= 1
+                wakeup.set()
+
+        async def claim(lane) -> int:
+            size = min(self.batch_size, room(lane))
+            try:
+                done, pending = await loop.run_in_executor(
+                    db, claim_attempts, size, self.lease, HIGH if lane == "reserved" else None
+                )
+            except Exception as e:
+                print(f"Outbox relay error: {e}")
+                await loop.run_in_executor(db, close_old_connections)
+                done, pending = [], []
+            self.writer.complete(done)
+            for row_id, attempt, priority in pending:
+                in_flight[lane] += 1
+                asyncio.create_task(deliver(lane, row_id, attempt, priority))
+            # A full batch means more rows are probably waiting: claim again right away.
+            next_claim[lane] = 0.0 if len(done) + len(pending) == size else loop.time() + poll_interval
+            return len(done) + len(pending)
+
+        try:
+            async with AsyncDeliveryEngine(
+                self.max_in_flight, self.per_host, http2=self.http2, reserved_per_host=self.reserved_per_host
+            ) as engine:
+                while True:
+                    stopping = stop is not None and stop.is_set()
+                    claimed = None
+                    if not stopping:
+                        # High-priority rows first, so they take free slots before bulk does.
+                        for lane in ("reserved", "shared"):
+                            if room(lane) > 0 and loop.time() >= next_claim[lane]:
+                                count = await claim(lane)
+                                claimed = (claimed or 0) + count
+                                claimed_total += count
+
+                    busy = in_flight["reserved"] + in_flight["shared"]
+                    if not busy and (stopping or (stop is None and claimed == 0)):
+                        break
+                    if any(room(lane) > 0 and not next_claim[lane] for lane in next_claim):
+                        await asyncio.sleep(0)
+                    else:
+                        wakeup.clear()
+                        try:
+                            await asyncio.wait_for(wakeup.wait(), timeout=poll_interval)
+                        except asyncio.TimeoutError:
+                            pass
+        finally:
+            await loop.run_in_executor(db, connections.close_all)
+            db.shutdown(wait=True)
+        return claimed_total
@@ -0,0 +1,196 @@
+# monitor/partitions.py
+"""
+Maintenance helpers for the monthly partitions created by migration 0012.
+Everything here is PostgreSQL only; callers should check `partitioning_enabled()`.
+
+The database primary key of a partitioned table is (id, <partition key>), so
+PostgreSQL no longer guarantees that `id` alone is unique; that rests on ids
+being UUIDv7s generated by the application. Lookups and writes by `id` alone
+have to search every partition, so hot paths also filter on the partition key.
+"""
+import gzip
+import os
+import re
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+from django.db import connection, transaction
+from django.utils.dateparse import parse_datetime
+
+from .models import DeliveryAttempt, IncomingMessage
+
+# (model, partition key). Deliveries are listed first so retention removes them
+# before the messages they point to.
+PARTITIONED_MODELS = (
+    (DeliveryAttempt, "created_at"),
+    (IncomingMessage, "received_at"),
+)
+
+_BOUND_RE = re.compile(r"FOR VALUES FROM \((?P<lower>.+?)\) TO \((?P<upper>.+?)\)")
+
+
+@dataclass
+class Partition:
+    name: str
+    lower: datetime | None  # None means MINVALUE
+    upper: datetime | None  # None means MAXVALUE
+    is_default: bool = False
+
+    def __str__(self):
+        if self.is_default:
+            return f"{self.name} [DEFAULT]"
+        lower = self.lower.date() if self.lower else "MINVALUE"
+        upper = self.upper.date() if self.upper else "MAXVALUE"
+        return f"{self.name} [{lower} .. {upper})"
+
+
+def month_start(value: datetime) -> datetime:
+    return datetime(value.year, value.month, 1, tzinfo=timezone.utc)
+
+
+def add_months(value: datetime, months: int) -> datetime:
+    index = value.year * 12 + value.month - 1 + months
+    return value.replace(year=index // 12, month=index % 12 + 1)
+
+
+def _parse_bound(value: str) -> datetime | None:
+    if value in ("MINVALUE", "MAXVALUE"):
+        return None
+    return parse_datetime(value.strip("'"))
+
+
+def partitioning_enabled() -> bool:
+    if connection.vendor != "postgresql":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)",
+            [IncomingMessage._meta.db_table],
+        )
+        row = cursor.fetchone()
+    return bool(row) and row[0] == "p"
+
+
+def list_partitions(table: str) -> list[Partition]:
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT child.relname, pg_get_expr(child.relpartbound, child.oid) "
+            "FROM pg_inherits "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE pg_inherits.inhparent = %s::regclass",
+            [table],
+        )
+        rows = cursor.fetchall()
+
+    partitions = []
+    for name, bound in rows:
+        if bound == "DEFAULT":
+            partitions.append(Partition(name, None, None, is_default=True))
+            continue
+        match = _BOUND_RE.match(bound)
+        partitions.append(Partition(name, _parse_bound(match["lower"]), _parse_bound(match["upper"])))
+    return sorted(partitions, key=lambda p: (p.is_default, p.lower or datetime.min.replace(tzinfo=timezone.utc)))
+
+
+def _covers(partition: Partition, moment: datetime) -> bool:
+    if partition.is_default:
+        return False
+    return (partition.lower is None or partition.lower <= moment) and (
+        partition.upper is None or moment < partition.upper
+    )
+
+
+def _create_partition(table: str, key: str, name: str, lower: datetime, default: Partition | None) -> int:
+    """
+    Creates the partition for [lower, next month). PostgreSQL refuses to while
+    the DEFAULT partition holds rows of that range (late or future-dated rows),
+    so those are moved into the new partition first: the DEFAULT partition is
+    detached, the rows moved, and it is attached again, all in one transaction.
+    Returns the number of rows moved.
+    """
+    upper = add_months(lower, 1)
+    with transaction.atomic(), connection.cursor() as cursor:
+        stray = False
+        if default is not None:
+            cursor.execute(
+                f"SELECT EXISTS (SELECT 1 FROM {default.name} WHERE {key} >= %s AND {key} < %s)",
+                [lower, upper],
+            )
+            stray = cursor.fetchone()[0]
+        if stray:
+            cursor.execute(f"ALTER TABLE {table} DETACH PARTITION {default.name}")
+        cursor.execute(
+            f"CREATE TABLE {name} PARTITION OF {table} FOR VALUES FROM (%s) TO (%s)",
+            [lower, upper],
+        )
+        if not stray:
+            return 0
+        cursor.execute(
+            f"WITH moved AS (DELETE FROM {default.name} WHERE {key} >= %s AND {key} < %s RETURNING *) "
+            f"INSERT INTO {name} SELECT * FROM moved",
+            [lower, upper],
+        )
+        moved = cursor.rowcount
+        cursor.execute(f"ALTER TABLE {table} ATTACH PARTITION {default.name} DEFAULT")
+    return moved
+
+
+def ensure_partitions(months_ahead: int, now: datetime | None = None) -> list[tuple[str, int]]:
+    """
+    Creates any missing monthly partitions from the current month up to
+    `months_ahead`. Returns (partition, rows moved from the DEFAULT partition).
+    """
+    current = month_start(now or datetime.now(timezone.utc))
+    created = []
+    for model, key in PARTITIONED_MODELS:
+        table = model._meta.db_table
+        existing = list_partitions(table)
+        default = next((p for p in existing if p.is_default), None)
+        for offset in range(months_ahead + 1):
+            lower = add_months(current, offset)
+            if any(_covers(p, lower) for p in existing):
+                continue
+            name = f"{table}_p{lower:%Y%m}"
+            created.append((name, _create_partition(table, key, name, lower, default)))
+    return created
+
+
+def expired_partitions(table: str, cutoff: datetime) -> list[Partition]:
+    """Partitions whose whole range lies before `cutoff`."""
+    return [
+        p for p in list_partitions(table)
+        if not p.is_default and p.upper is not None and p.upper <= cutoff
+    ]
+
+
+def detach_partition(table: str, partition: Partition) -> None:
+    with connection.cursor() as cursor:
+        cursor.execute(f"ALTER TABLE {table} DETACH PARTITION {partition.name}")
+
+
+def drop_partition(table: str, partition: Partition) -> None:
+    with transaction.atomic():
+        detach_partition(table, partition)
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE {partition.name}")
+
+
+def archive_partition(table: str, partition: Partition, directory: str) -> str:
+    """
+    Dumps a partition with COPY into `<directory>/<name>.csv.gz`, then drops it.
+    The file is fully written and fsynced before the partition is removed.
+    """
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{partition.name}.csv.gz")
+    tmp_path = f"{path}.tmp"
+
+    with open(tmp_path, "wb") as raw, gzip.GzipFile(fileobj=raw, mode="wb") as gz:
+        with connection.cursor() as cursor:
+            cursor.copy_expert(f"COPY {partition.name} TO STDOUT WITH (FORMAT csv, HEADER)", gz)
+        gz.close()
+        raw.flush()
+        os.fsync(raw.fileno())
+    os.replace(tmp_path, path)
+
+    drop_partition(table, partition)
+    return path
@@ -0,0 +1,195 @@
+# monitor/reassembly.py
+"""
+Joins the parts of concatenated SMS before they become IncomingMessages.
+
+Parts are buffered by (topic, sender, reference, total): the topic names the
+gateway device, so two gateways receiving from the same sender with the same
+reference never have their parts merged. A complete message is
+returned exactly once, by whichever consumer receives its last part; groups
+that stay incomplete for REASSEMBLY_TTL seconds are handed out by
+`pop_expired()` so what did arrive is still stored and forwarded.
+
+Two backends: "local" keeps groups in process memory (single consumer), and
+"redis" keeps them in Redis so parts of one message may reach different
+consumer replicas. The Redis side runs as Lua scripts, so adding a part and
+claiming a group are atomic.
+"""
+import json
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from django.conf import settings
+
+from .mc60 import MC60Frame
+
+MISSING_PART = " … "
+
+
+@dataclass(frozen=True)
+class AssembledMessage:
+    sender: str
+    body: str
+    raw_parts: list[str]
+    complete: bool
+    topic: str = ""
+
+
+def assemble(topic: str, sender: str, total: int, parts: dict[int, tuple[str, str]]) -> AssembledMessage:
+    """`parts` maps sequence -> (body, raw payload). Missing parts are marked in the body."""
+    bodies = [parts[sequence][0] if sequence in parts else MISSING_PART for sequence in range(1, total + 1)]
+    return AssembledMessage(
+        topic=topic,
+        sender=sender,
+        body="".join(bodies),
+        raw_parts=[parts[sequence][1] for sequence in sorted(parts)],
+        complete=len(parts) == total,
+    )
+
+
+class LocalReassemblyBuffer:
+    """In-process buffer, bounded by TTL and by `max_groups` (oldest groups are flushed first)."""
+
+    def __init__(self, ttl: float, max_groups: int):
+        self.ttl = ttl
+        self.max_groups = max_groups
+        self._groups = OrderedDict()
+        self._evicted = []
+        self._lock = threading.Lock()
+
+    def add(self, frame: MC60Frame, raw: str, topic: str = "") -> AssembledMessage | None:
+        segment = frame.segment
+        key = (topic, frame.sender, segment.reference, segment.total)
+        with self._lock:
+            group = self._groups.get(key)
+            if group is None:
+                group = self._groups[key] = {"first_seen": time.monotonic(), "parts": {}}
+                while len(self._groups) > self.max_groups:
+                    (group_topic, sender, _, total), oldest = self._groups.popitem(last=False)
+                    self._evicted.append(assemble(group_topic, sender, total, oldest["parts"]))
+            group["parts"].setdefault(segment.sequence, (frame.body, raw))
+            if len(group["parts"]) < segment.total:
+                return None
+            del self._groups[key]
+        return assemble(topic, frame.sender, segment.total, group["parts"])
+
+    def pop_expired(self) -> list[AssembledMessage]:
+        cutoff = time.monotonic() - self.ttl
+        with self._lock:
+            expired, self._evicted = self._evicted, []
+            # Groups are kept in arrival order, so the expired ones are at the front.
+            while self._groups:
+                key, group = next(iter(self._groups.items()))
+                if group["first_seen"] > cutoff:
+                    break
+                del self._groups[key]
+                expired.append(assemble(key[0], key[1], key[3], group["parts"]))
+        return expired
+
+
+# KEYS: group hash, index zset. ARGV: sequence, part, total, now, key ttl.
+_ADD_SCRIPT = """
+redis.call('HSETNX', KEYS[1], ARGV[1], ARGV[2])
+redis.call('EXPIRE', KEYS[1], ARGV[5])
+redis.call('ZADD', KEYS[2], 'NX', ARGV[4], KEYS[1])
+if redis.call('HLEN', KEYS[1]) >= tonumber(ARGV[3]) then
+    redis.call('ZREM', KEYS[2], KEYS[1])
+    local parts = redis.call('HGETALL', KEYS[1])
+    redis.call('DEL', KEYS[1])
+    return parts
+end
+return false
+"""
+
+# KEYS: index zset, group hash. Only the caller that removes the index entry gets the parts.
+_CLAIM_SCRIPT = """
+if redis.call('ZREM', KEYS[1], KEYS[2]) == 1 then
+    local parts = redis.call('HGETALL', KEYS[2])
+    redis.call('DEL', KEYS[2])
+    return parts
+end
+return false
+"""
+
+
+def _text(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+
+class RedisReassemblyBuffer:
+    """
+    Shared buffer: one hash per group (sequence -> [body, raw]) plus a sorted set
+    indexing groups by first arrival, which `pop_expired()` scans.
+    """
+
+    def __init__(self, ttl: float, max_groups: int, prefix: str = "mc60:reassembly"):
+        from django_redis import get_redis_connection
+
+        self.ttl = ttl
+        self.max_groups = max_groups
+        self.prefix = prefix
+        self.index = f"{prefix}:index"
+        self.redis = get_redis_connection("default")
+        self._add = self.redis.register_script(_ADD_SCRIPT)
+        self._claim = self.redis.register_script(_CLAIM_SCRIPT)
+
+    def _key(self, topic, sender, reference, total):
+        return f"{self.prefix}:{topic}:{sender}:{reference}:{total}"
+
+    def _parse(self, key, flat) -> AssembledMessage:
+        # A sender never contains ":" (it ends at the first one in the frame); a topic may.
+        fields = key[len(self.prefix) + 1:].rsplit(":", 3)
+        # Groups buffered before keys carried the topic have three fields.
+        topic, sender, _, total = fields if len(fields) == 4 else [""] + fields
+        parts = {
+            int(flat[i]): tuple(json.loads(flat[i + 1]))
+            for i in range(0, len(flat), 2)
+        }
+        return assemble(topic, sender, int(total), parts)
+
+    def add(self, frame: MC60Frame, raw: str, topic: str = "") -> AssembledMessage | None:
+        segment = frame.segment
+        key = self._key(topic, frame.sender, segment.reference, segment.total)
+        part = json.dumps([frame.body, raw], ensure_ascii=False)
+        # The hash outlives the TTL so pop_expired() still finds the parts.
+        flat = self._add(keys=[key, self.index], args=[segment.sequence, part, segment.total, time.time(), int(self.ttl * 4) + 1])
+        if not flat:
+            return None
+        return self._parse(key, [_text(item) for item in flat])
+
+    def pop_expired(self) -> list[AssembledMessage]:
+        cutoff = time.time() - self.ttl
+        # Over max_groups, the oldest groups are flushed early to bound Redis memory.
+        overflow = max(self.redis.zcard(self.index) - self.max_groups, 0)
+        keys = self.redis.zrangebyscore(self.index, "-inf", cutoff)
+        if overflow:
+            keys += self.redis.zrange(self.index, 0, overflow - 1)
+
+        expired = []
+        for key in dict.fromkeys(_text(item) for item in keys):
+            flat = self._claim(keys=[self.index, key])
+            if flat:
+                expired.append(self._parse(key, [_text(item) for item in flat]))
+        return expired
+
+
+BACKENDS = {
+    "local": LocalReassemblyBuffer,
+    "redis": RedisReassemblyBuffer,
+}
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_reassembly_buffer():
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                _buffer = BACKENDS[settings.REASSEMBLY_BACKEND](
+                    ttl=settings.REASSEMBLY_TTL,
+                    max_groups=settings.REASSEMBLY_MAX_GROUPS,
+                )
+    return _buffer
@@ -0,0 +1,171 @@
+# monitor/replicas.py
+"""
+Read-replica routing.
+
+Writes always go to "default" (the primary). Reads go to a replica only inside
+`read_from_replica()`, which the read-only dashboard views enter through
+ReplicaReadMixin; everything else — the consumer, the relay, admin, write
+endpoints — keeps reading from the primary.
+
+A replica is used only while its replication lag is within REPLICA_MAX_LAG
+seconds. Lag is measured at most every REPLICA_LAG_CHECK_INTERVAL seconds per
+process; a replica that cannot be reached counts as too far behind.
+
+Read-your-writes: a successful write request pins its user to the primary for
+REPLICA_STICKY_SECONDS (a key in the shared cache), so the lists they reload
+right after adding a rule or channel already show it.
+"""
+import contextvars
+import itertools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+from .metrics import DB_REPLICA_LAG
+
+logger = logging.getLogger(__name__)
+
+REPLICA_PREFIX = "replica_"
+
+_read_alias = contextvars.ContextVar("replica_read_alias", default=None)
+
+_lag = {}
+_lag_lock = threading.Lock()
+_rotation = None
+
+# Zero while the replica has replayed everything it received, so an idle
+# primary does not make the replica look stale.
+_LAG_SQL = """
+SELECT CASE
+    WHEN NOT pg_is_in_recovery() THEN 0
+    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+END
+"""
+
+
+def replica_aliases() -> list[str]:
+    return [alias for alias in settings.DATABASES if alias.startswith(REPLICA_PREFIX)]
+
+
+def replica_lag(alias: str) -> float | None:
+    """Seconds `alias` is behind the primary, or None when it cannot be reached."""
+    now = time.monotonic()
+    with _lag_lock:
+        cached = _lag.get(alias)
+    if cached is not None and now - cached[1] < settings.REPLICA_LAG_CHECK_INTERVAL:
+        return cached[0]
+
+    connection = connections[alias]
+    lag = 0.0
+    try:
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute(_LAG_SQL)
+                lag = float(cursor.fetchone()[0])
+        else:
+            connection.ensure_connection()
+    except DatabaseError as e:
+        logger.warning("Replica %s is unavailable: %s", alias, e)
+        lag = None
+    if lag is not None:
+        DB_REPLICA_LAG.labels(alias).set(lag)
+
+    with _lag_lock:
+        _lag[alias] = (lag, now)
+    return lag
+
+
+def pick_replica() -> str | None:
+    """A replica within REPLICA_MAX_LAG, round-robin; None when every replica is behind or down."""
+    global _rotation
+    aliases = replica_aliases()
+    if not aliases:
+        return None
+    if _rotation is None:
+        _rotation = itertools.cycle(aliases)
+
+    for _ in range(len(aliases)):
+        alias = next(_rotation)
+        lag = replica_lag(alias)
+        if lag is not None and lag <= settings.REPLICA_MAX_LAG:
+            return alias
+    return None
+
+
+def _pin_key(user_id) -> str:
+    return f"replica:pin:{user_id}"
+
+
+def pin_to_primary(user) -> None:
+    """Sends `user`'s reads to the primary for the next REPLICA_STICKY_SECONDS."""
+    if settings.REPLICA_STICKY_SECONDS > 0 and getattr(user, "is_authenticated", False):
+        cache.set(_pin_key(user.pk), 1, timeout=settings.REPLICA_STICKY_SECONDS)
+
+
+def is_pinned(user) -> bool:
+    if settings.REPLICA_STICKY_SECONDS <= 0 or not getattr(user, "is_authenticated", False):
+        return False
+    return cache.get(_pin_key(user.pk)) is not None
+
+
+def alias_for_reads(user) -> str:
+    """Where a read-only request by `user` should read from."""
+    if not replica_aliases() or is_pinned(user):
+        return DEFAULT_DB_ALIAS
+    return pick_replica() or DEFAULT_DB_ALIAS
+
+
+@contextmanager
+def read_from_replica(alias: str):
+    """Routes ORM reads inside the block to `alias`."""
+    token = _read_alias.set(alias)
+    try:
+        yield alias
+    finally:
+        _read_alias.reset(token)
+
+
+class ReplicaRouter:
+    """DATABASE_ROUTERS entry. Replicas mirror the primary, so they never migrate."""
+
+    def db_for_read(self, model, **hints):
+        # None falls back to the instance's own database (for related lookups), then "default".
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        # Explicit, so an object read from a replica is still saved to the primary.
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaReadMixin:
+    """
+    For read-only DRF views: after authentication, the request's queries go to
+    a fresh-enough replica unless the user wrote something a moment ago.
+    `self.read_db` is the chosen alias, for querysets evaluated after the view
+    returns (streaming responses).
+    """
+    read_db = DEFAULT_DB_ALIAS
+    _replica_token = None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.read_db = alias_for_reads(request.user)
+        self._replica_token = _read_alias.set(self.read_db)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        if self._replica_token is not None:
+            _read_alias.reset(self._replica_token)
+            self._replica_token = None
+        return super().finalize_response(request, response, *args, **kwargs)
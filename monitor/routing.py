@@ -0,0 +1,13 @@
+# monitor/routing.py
+from django.urls import path
+
+from .consumers import DeviceIngestConsumer, LiveFeedConsumer
+
+websocket_urlpatterns = [
+    path("ws/live/", LiveFeedConsumer.as_asgi()),
+]
+
+# Served before Django's own URLs (config/asgi.py).
+http_urlpatterns = [
+    path("monitor/ingest/sms/", DeviceIngestConsumer.as_asgi()),
+]
@@ -0,0 +1,139 @@
+# monitor/rulestats.py
+"""
+Per-rule hit counters and evaluation cost.
+
+The matcher records, for every rule it evaluates, whether the rule matched and
+how long its filters took. Counts are kept in process memory and added to
+Redis (one hash per rule, HINCRBY) at most every RULE_STATS_FLUSH_INTERVAL
+seconds, by whichever thread records after the interval has passed, and once
+more at exit. A thread recording inside a transaction flushes once it has
+committed, so no Redis round trip runs while the transaction holds its locks.
+There is no background thread, so forked workers need no setup.
+
+Totals are shared by every consumer and worker process and survive restarts;
+`reset_rule_stats()` clears them, e.g. after a rule's filters were changed.
+"""
+import atexit
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ("evaluations", "matches", "eval_ns")
+
+_pending = {}
+_pending_lock = threading.Lock()
+_last_flush = time.monotonic()
+
+
+def _key(rule_id) -> str:
+    return f"rulestats:{rule_id}"
+
+
+def _redis():
+    from django_redis import get_redis_connection
+
+    return get_redis_connection("default")
+
+
+def record(timings) -> None:
+    """Adds one message's evaluations: an iterable of (rule_id, matched, elapsed_ns)."""
+    global _last_flush
+    if not settings.RULE_STATS_ENABLED:
+        return
+    now = time.monotonic()
+    with _pending_lock:
+        for rule_id, matched, elapsed_ns in timings:
+            counters = _pending.get(rule_id)
+            if counters is None:
+                counters = _pending[rule_id] = [0, 0, 0, None]
+            counters[0] += 1
+            counters[2] += elapsed_ns
+            if matched:
+                counters[1] += 1
+                counters[3] = now
+        due = now - _last_flush >= settings.RULE_STATS_FLUSH_INTERVAL
+        if due:
+            _last_flush = now
+    if due:
+        if transaction.get_connection().in_atomic_block:
+            # Dropped on rollback; the counts stay pending for the next flush.
+            transaction.on_commit(flush)
+        else:
+            flush()
+
+
+def flush() -> None:
+    """Adds the counts recorded in this process since the last flush to Redis."""
+    with _pending_lock:
+        pending = dict(_pending)
+        _pending.clear()
+    if not pending:
+        return
+
+    # Monotonic match times -> wall clock, for "last matched" in the admin.
+    offset = time.time() - time.monotonic()
+    try:
+        pipe = _redis().pipeline(transaction=False)
+        for rule_id, (evaluations, matches, eval_ns, matched_at) in pending.items():
+            key = _key(rule_id)
+            pipe.hincrby(key, "evaluations", evaluations)
+            pipe.hincrby(key, "matches", matches)
+            pipe.hincrby(key, "eval_ns", eval_ns)
+            if matched_at is not None:
+                pipe.hset(key, "last_matched_at", f"{matched_at + offset:.3f}")
+        pipe.execute()
+    except Exception as e:
+        logger.warning("Flushing rule stats failed, keeping them for the next flush: %s", e)
+        with _pending_lock:
+            for rule_id, counters in pending.items():
+                current = _pending.setdefault(rule_id, [0, 0, 0, None])
+                for index in range(3):
+                    current[index] += counters[index]
+                current[3] = current[3] or counters[3]
+
+
+atexit.register(flush)
+
+
+def _stats(raw: dict) -> dict:
+    values = {(name.decode() if isinstance(name, bytes) else name): value for name, value in raw.items()}
+    evaluations, matches, eval_ns = (int(values.get(field, 0)) for field in FIELDS)
+    last_matched = values.get("last_matched_at")
+    return {
+        "evaluations": evaluations,
+        "matches": matches,
+        "match_rate": round(matches / evaluations, 4) if evaluations else None,
+        "total_eval_ms": round(eval_ns / 1e6, 3),
+        "avg_eval_us": round(eval_ns / evaluations / 1e3, 3) if evaluations else None,
+        "last_matched_at": (
+            datetime.fromtimestamp(float(last_matched), tz=timezone.utc) if last_matched else None
+        ),
+    }
+
+
+def rule_stats(rule_ids) -> dict:
+    """Flushed totals per rule id (zeros for rules never evaluated); {} if Redis is unreachable."""
+    rule_ids = list(rule_ids)
+    if not rule_ids:
+        return {}
+    try:
+        pipe = _redis().pipeline(transaction=False)
+        for rule_id in rule_ids:
+            pipe.hgetall(_key(rule_id))
+        rows = pipe.execute()
+    except Exception as e:
+        logger.warning("Reading rule stats failed: %s", e)
+        return {}
+    return {rule_id: _stats(raw) for rule_id, raw in zip(rule_ids, rows)}
+
+
+def reset_rule_stats(rule_ids) -> None:
+    keys = [_key(rule_id) for rule_id in rule_ids]
+    if keys:
+        _redis().delete(*keys)
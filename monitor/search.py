@@ -0,0 +1,41 @@
+# monitor/search.py
+from django.db import connection
+from django.db.models import Q
+
+# pg_trgm can only use the GIN index for ILIKE when the pattern has at least
+# one full trigram, so shorter terms are matched exactly against the numbers,
+# through the btree indexes from migration 0023 (before pg_trgm 1.6 the GIN
+# indexes cannot serve equality).
+MIN_TRIGRAM_LENGTH = 3
+
+MESSAGE_SEARCH_FIELDS = ("body", "from_number", "to_number")
+
+
+def message_search_q(term: str, prefix: str = "") -> Q:
+    """
+    Builds the lookup used to search IncomingMessage body and sender fields.
+    `prefix` lets related models search through a foreign key, e.g. "message__".
+
+    On PostgreSQL every lookup here is served by an index: the gin_trgm_ops
+    indexes from migration 0011, or the number indexes from migration 0023 for
+    short terms. On SQLite the same lookups fall back to a LIKE scan.
+    """
+    term = term.strip()
+    if not term:
+        return Q()
+
+    if len(term) < MIN_TRIGRAM_LENGTH and connection.vendor == "postgresql":
+        return Q(**{f"{prefix}from_number": term}) | Q(**{f"{prefix}to_number": term})
+
+    query = Q()
+    for field in MESSAGE_SEARCH_FIELDS:
+        query |= Q(**{f"{prefix}{field}__icontains": term})
+    return query
+
+
+def search_messages(queryset, term: str, prefix: str = ""):
+    """Filters a queryset of messages (or of rows pointing at messages) by a search term."""
+    query = message_search_q(term, prefix)
+    if not query:
+        return queryset
+    return queryset.filter(query)
@@ -1,17 +1,27 @@
 # app/serializers.py
+from django.conf import settings
 from rest_framework import serializers
 from .models import *
+from .rulestats import rule_stats
+from .simulation import FILTER_KEYS
 
 
 
 class IncomingSmsPayloadSerializer(serializers.Serializer):
     """Payload sent by device (ESP32/SIM800)."""
-    from_ = serializers.CharField(source="from_number")  # maps to model field
-    to = serializers.CharField(source="to_number")
+    from_ = serializers.CharField(source="from_number", max_length=32)  # maps to model field
+    to = serializers.CharField(source="to_number", max_length=32)
     token = serializers.CharField()
-    body = serializers.CharField()
+    body = serializers.CharField(allow_blank=True, trim_whitespace=False)
+    # The device's clock; only kept in raw_payload, messages are stamped with the server time.
     received_at = serializers.DateTimeField(required=False)
 
+    def get_fields(self):
+        # Devices send "from", which cannot be an attribute name.
+        fields = super().get_fields()
+        fields["from"] = fields.pop("from_")
+        return fields
+
 
 class IncomingMessageSerializer(serializers.ModelSerializer):
     """Read-only representation of stored IncomingMessage."""
@@ -59,9 +69,17 @@ class DeliveryAttemptSerializer(serializers.ModelSerializer):
 
 class ForwardRuleSerializer(serializers.ModelSerializer):
     destination_channels = serializers.SerializerMethodField()
+    stats = serializers.SerializerMethodField()
     class Meta:
         model = ForwardRule
-        fields = ['id', 'name', 'filters', 'is_enabled', 'destination_channels']
+        fields = ['id', 'name', 'filters', 'is_enabled', 'priority', 'destination_channels', 'stats']
+
+    def get_stats(self, obj):
+        """Evaluation/match counters from rulestats; lists pass them all in context["rule_stats"]."""
+        stats = self.context.get("rule_stats")
+        if stats is None:
+            stats = rule_stats([obj.pk])
+        return stats.get(obj.pk)
 
     def get_destination_channels(self, obj):
         actions = obj.actions.filter(is_enabled=True)
@@ -136,4 +154,91 @@ class RuleDestinationCreateSerializer(serializers.ModelSerializer):
 
 class RuleDestinationDeleteSerializer(serializers.Serializer):
     rule_id = serializers.UUIDField()
-    channel_id = serializers.UUIDField()        
\ No newline at end of file
+    channel_id = serializers.UUIDField()        
+
+class ExportQuerySerializer(serializers.Serializer):
+    """Query parameters accepted by the streaming export endpoints."""
+    export_format = serializers.ChoiceField(choices=["ndjson", "csv"], default="ndjson")
+    start = serializers.DateTimeField(required=False)
+    end = serializers.DateTimeField(required=False)
+    sender = serializers.CharField(required=False)
+    status = serializers.CharField(required=False)
+    chunk_size = serializers.IntegerField(required=False, min_value=100, max_value=20000, default=2000)
+
+    def validate(self, attrs):
+        start = attrs.get("start")
+        end = attrs.get("end")
+        if start and end and start >= end:
+            raise serializers.ValidationError({"end": "end must be after start"})
+        return attrs
+
+
+class ArchiveQuerySerializer(serializers.Serializer):
+    """Query parameters for reading rows back from the cold archive."""
+    MAX_RANGE_DAYS = 31
+
+    start = serializers.DateTimeField()
+    end = serializers.DateTimeField()
+    sender = serializers.CharField(required=False)
+    status = serializers.CharField(required=False)
+    message_id = serializers.UUIDField(required=False)
+    limit = serializers.IntegerField(required=False, min_value=1, max_value=5000, default=500)
+
+    def validate(self, attrs):
+        if attrs["start"] >= attrs["end"]:
+            raise serializers.ValidationError({"end": "end must be after start"})
+        if (attrs["end"] - attrs["start"]).days > self.MAX_RANGE_DAYS:
+            raise serializers.ValidationError({"end": f"range is limited to {self.MAX_RANGE_DAYS} days"})
+        return attrs
+
+
+class LatencyQuerySerializer(serializers.Serializer):
+    """Query parameters for the delivery latency percentiles endpoint."""
+    start = serializers.DateTimeField(required=False)
+    end = serializers.DateTimeField(required=False)
+    metric = serializers.ChoiceField(choices=["total", "provider", "queue"], default="total")
+
+    def validate(self, attrs):
+        start = attrs.get("start")
+        end = attrs.get("end")
+        if start and end and start >= end:
+            raise serializers.ValidationError({"end": "end must be after start"})
+        return attrs
+
+
+class RuleSimulationSerializer(serializers.Serializer):
+    """
+    Candidate filters to dry-run over message history: inline `filters` and/or
+    existing (e.g. still disabled) `rules`. The window defaults to the last 30 days.
+    """
+    filters = serializers.ListField(child=serializers.DictField(), required=False, default=list)
+    rules = serializers.ListField(child=serializers.UUIDField(), required=False, default=list)
+    start = serializers.DateTimeField(required=False)
+    end = serializers.DateTimeField(required=False)
+    samples = serializers.IntegerField(required=False, min_value=0, max_value=100)
+
+    def validate_filters(self, value):
+        for filters in value:
+            unknown = set(filters) - set(FILTER_KEYS)
+            if unknown:
+                raise serializers.ValidationError(
+                    f"Unknown filter keys {sorted(unknown)}; expected {list(FILTER_KEYS)}."
+                )
+            for key, filter_value in filters.items():
+                if not isinstance(filter_value, str) or not filter_value:
+                    raise serializers.ValidationError(f"{key} must be a non-empty string.")
+        return value
+
+    def validate(self, attrs):
+        count = len(attrs["filters"]) + len(attrs["rules"])
+        if not count:
+            raise serializers.ValidationError("Give at least one of filters or rules.")
+        if count > settings.RULE_SIMULATION_MAX_CANDIDATES:
+            raise serializers.ValidationError(
+                f"At most {settings.RULE_SIMULATION_MAX_CANDIDATES} candidates per simulation."
+            )
+        start = attrs.get("start")
+        end = attrs.get("end")
+        if start and end and start >= end:
+            raise serializers.ValidationError({"end": "end must be after start"})
+        return attrs
@@ -2,103 +2,166 @@
 
 import requests
 import json
+import time
+from datetime import timedelta
+from django.conf import settings
 from django.utils import timezone
-from django.db import transaction
-from monitor.models import IncomingMessage, ForwardRule, DeliveryAttempt, DestinationChannel
+from django.db import DatabaseError, connection, transaction
+from monitor.models import IncomingMessage, ForwardRule, DeliveryAttempt, DeliveryOutbox, DestinationChannel, FailedLog, Device, RuleDestination
+from django.db.models import Prefetch
 from django.core.exceptions import ValidationError
 from .behaviors import send_bale_message,send_telegram_message
+from .devices import command_topic, device_for_topic, pick_outbound_device, record_send
+from .mc60 import MC60ParseError, parse_frame
+from .reassembly import assemble
+from .live import message_payload, publish_on_commit
+from .status_writer import write_statuses
 from paho.mqtt import publish
 import paho.mqtt.client as mqtt
 from config.settings import MQTT_BROKER_HOST
+from .metrics import DELIVERIES, DELIVERY_LATENCY, RULE_MATCHING
+from . import rulestats
+from .tracing import set_span_attributes, span
 
 
-def _execute_delivery_attempt(attempt: DeliveryAttempt, message: IncomingMessage):
-    """
-    Dispatcher function to execute the actual delivery based on the channel type.
-    Updates the DeliveryAttempt status (SENT/FAILED).
-    """
-    channel = attempt.channel
-    cfg = channel.config or {}
+def _record_timings(attempt: DeliveryAttempt, message: IncomingMessage, provider_seconds: float):
+    """Fills the per-stage timing columns once the provider call has returned or failed."""
+    finished = timezone.now()
+    DELIVERY_LATENCY.labels(attempt.channel.type).observe(provider_seconds)
+    attempt.last_attempt_at = finished
+    attempt.provider_duration_ms = provider_seconds * 1000
+    attempt.total_latency_ms = (finished - message.received_at).total_seconds() * 1000
+
 
+def delivery_text(message: IncomingMessage) -> str:
+    """The text forwarded to chat channels (Telegram, Bale)."""
     local_time = timezone.localtime(message.received_at)
     time_str = local_time.strftime('%Y-%m-%d %H:%M:%S')
 
-    
-    text = (
+    return (
         f"از شماره: {message.from_number}\n"
         f"به شماره: {message.to_number}\n"
-         f"تاریخ و زمان: {time_str}\n"
+        f"تاریخ و زمان: {time_str}\n"
         f"==================================\n"
         f"متن پیام:\n"
         f"{message.body}"
     )
-    try:
-        if channel.type == DestinationChannel.ChannelType.TELEGRAM:
-            token = cfg.get("token")
-            chat_id = cfg.get("chat_id")
-            if not token or not chat_id:
-                raise ValueError("Telegram token or chat_id is missing in config.")
-                
-            result = send_telegram_message(token, chat_id, text)
-            provider_id = result.get("message_id")
-
-        elif channel.type == DestinationChannel.ChannelType.Bale:
-            token = cfg.get("token")
-            chat_id = cfg.get("chat_id")
-            if not token or not chat_id:
-                raise ValueError("Bale token or chat_id is missing in config.")
-                
-            result = send_bale_message(token, chat_id, text)
-            provider_id = result.get("message_id")
-
-        elif channel.type == DestinationChannel.ChannelType.SMS:
-            target_phone = cfg.get("phone") 
-            if not target_phone:
-                raise ValueError("Target phone number is missing in SMS channel config.")
-
-            mqtt_payload = f"SEND_SMS:{target_phone}:{message.body}"
-            command_topic = f"device/MC60/commands" 
-            
-            publish.single(
-                command_topic,
-                payload=mqtt_payload,
-                hostname=MQTT_BROKER_HOST,
-                port=1883,
-                qos=1
-            )
-            
-            provider_id = f"MQTT_SENT_{timezone.now().timestamp()}"
 
-        elif channel.type == DestinationChannel.ChannelType.WEBHOOK:
-            url = cfg.get("url")
-            if not url:
-                raise ValueError("Webhook URL is missing in config.")
-            
-            payload = {
-                "from": message.from_number,
-                "to": message.to_number,
-                "body": message.body,
-            }
-            r = requests.post(url, json=payload, timeout=8)
-            r.raise_for_status()
-            provider_id = f"HTTP_{r.status_code}"
 
-        else:
-            raise NotImplementedError(f"Channel type {channel.type} not supported yet.")
+def chat_credentials(channel: DestinationChannel) -> tuple[str, str | int]:
+    cfg = channel.config or {}
+    token = cfg.get("token")
+    chat_id = cfg.get("chat_id")
+    if not token or not chat_id:
+        raise ValueError(f"{channel.get_type_display()} token or chat_id is missing in config.")
+    return token, chat_id
+
+
+def webhook_request(channel: DestinationChannel, message: IncomingMessage) -> tuple[str, dict]:
+    url = (channel.config or {}).get("url")
+    if not url:
+        raise ValueError("Webhook URL is missing in config.")
+    payload = {
+        "from": message.from_number,
+        "to": message.to_number,
+        "body": message.body,
+    }
+    return url, payload
+
+
+def send_sms_command(channel: DestinationChannel, message: IncomingMessage) -> str:
+    """Asks a gateway device to send the message as SMS; returns the provider id."""
+    cfg = channel.config or {}
+    target_phone = cfg.get("phone")
+    if not target_phone:
+        raise ValueError("Target phone number is missing in SMS channel config.")
+
+    mqtt_payload = f"SEND_SMS:{target_phone}:{message.body}"
+    device_id = pick_outbound_device(cfg.get("device"), message)
+
+    publish.single(
+        command_topic(device_id),
+        payload=mqtt_payload,
+        hostname=MQTT_BROKER_HOST,
+        port=1883,
+        qos=1
+    )
+    record_send(device_id)
+
+    return f"MQTT_SENT_{device_id}_{timezone.now().timestamp()}"
 
+
+def finish_attempt(
+    attempt: DeliveryAttempt,
+    message: IncomingMessage,
+    provider_seconds: float,
+    provider_id=None,
+    error: Exception | None = None,
+):
+    """Sets the outcome of a provider call on `attempt` (SENT/FAILED) without saving it."""
+    _record_timings(attempt, message, provider_seconds)
+    if error is None:
         attempt.status = DeliveryAttempt.Status.SENT
         attempt.provider_message_id = str(provider_id)
-        attempt.last_attempt_at = timezone.now()
-        attempt.save()
-
-    except Exception as e:
-        error_msg = f"Delivery failed: {e}"
+    else:
+        # Some network errors (e.g. httpx timeouts) have an empty message.
+        error_msg = f"Delivery failed: {str(error) or type(error).__name__}"
         print(error_msg)
+        set_span_attributes(error=error_msg[:500])
         attempt.status = DeliveryAttempt.Status.FAILED
         attempt.error = error_msg[:500]
         attempt.retry_count += 1
-        attempt.last_attempt_at = timezone.now()
-        attempt.save()
+
+    DELIVERIES.labels(attempt.channel.type, attempt.status).inc()
+    set_span_attributes(status=attempt.status)
+
+
+def _execute_delivery_attempt(attempt: DeliveryAttempt, message: IncomingMessage, save: bool = True):
+    """
+    Dispatcher function to execute the actual delivery based on the channel type.
+    Updates the DeliveryAttempt status (SENT/FAILED) and writes it with
+    write_statuses; with save=False the caller writes it (the outbox relay hands
+    it to a DeliveryStatusWriter).
+    Called by the outbox relay, never inside a transaction: a slow provider must
+    not hold a database connection and its locks open.
+    """
+    if connection.in_atomic_block:
+        raise RuntimeError("Deliveries must not be dispatched inside a transaction; queue them in DeliveryOutbox.")
+
+    # Continues the message's trace, as AsyncDeliveryEngine.deliver does; the relay has no span of its own.
+    with span("delivery.execute", trace_id=message.trace_id or None):
+        channel = attempt.channel
+        set_span_attributes(attempt_id=str(attempt.id), channel_type=channel.type, channel=channel.name)
+
+        attempt.dispatch_started_at = timezone.now()
+        started = time.perf_counter()
+        try:
+            if channel.type == DestinationChannel.ChannelType.TELEGRAM:
+                result = send_telegram_message(*chat_credentials(channel), delivery_text(message))
+                provider_id = result.get("message_id")
+
+            elif channel.type == DestinationChannel.ChannelType.Bale:
+                result = send_bale_message(*chat_credentials(channel), delivery_text(message))
+                provider_id = result.get("message_id")
+
+            elif channel.type == DestinationChannel.ChannelType.SMS:
+                provider_id = send_sms_command(channel, message)
+
+            elif channel.type == DestinationChannel.ChannelType.WEBHOOK:
+                url, payload = webhook_request(channel, message)
+                r = requests.post(url, json=payload, timeout=8)
+                r.raise_for_status()
+                provider_id = f"HTTP_{r.status_code}"
+
+            else:
+                raise NotImplementedError(f"Channel type {channel.type} not supported yet.")
+
+        except Exception as e:
+            finish_attempt(attempt, message, time.perf_counter() - started, error=e)
+        else:
+            finish_attempt(attempt, message, time.perf_counter() - started, provider_id=provider_id)
+        if save:
+            write_statuses([attempt])
 
 
 def _check_message_filters(message: IncomingMessage, filters: dict) -> bool:
@@ -118,39 +181,256 @@ def _check_message_filters(message: IncomingMessage, filters: dict) -> bool:
     return True
 
 
-@transaction.atomic
-def process_incoming_message(message: IncomingMessage) -> int:
+def _enabled_rules() -> list[ForwardRule]:
+    """The enabled rules, each with its enabled actions (and their channels) in `enabled_actions`."""
+    return list(
+        ForwardRule.objects.filter(is_enabled=True).prefetch_related(
+            Prefetch(
+                "actions",
+                queryset=RuleDestination.objects.filter(is_enabled=True).select_related("channel"),
+                to_attr="enabled_actions",
+            )
+        )
+    )
+
+
+def _enabled_actions(rule: ForwardRule):
+    if hasattr(rule, "enabled_actions"):
+        return rule.enabled_actions
+    return rule.actions.filter(is_enabled=True).select_related("channel")
+
+
+def _match_rules(message: IncomingMessage, rules: list[ForwardRule] | None = None) -> list[ForwardRule]:
     """
-    The core service logic: finds matching rules and creates delivery attempts.
+    Returns the enabled rules whose filters match, in evaluation order,
+    stopping after the first matching rule with stop_processing set.
+    Each rule's outcome and evaluation time go to rulestats. `rules` are the
+    enabled rules when the caller already loaded them (_enabled_rules).
     """
-    deliveries_created = 0
-
+    matched = []
     rules_qs = ForwardRule.objects.filter(
         is_enabled=True
     )
 
+    with span("rules.evaluate") as rules_span:
+        started = time.perf_counter()
+        evaluated = 0
+        timings = []
+        # Fetched up front so the query is not charged to the first rule. One clock
+        # read per rule: each rule is charged the time since the previous one finished.
+        rules = list(rules_qs) if rules is None else rules
+        clock = time.perf_counter_ns
+        last = clock()
+        for rule in rules:
+            evaluated += 1
+            is_match = _check_message_filters(message, rule.filters)
+            now = clock()
+            timings.append((rule.id, is_match, now - last))
+            last = now
+            if not is_match:
+                continue
+            matched.append(rule)
+            if rule.stop_processing:
+                break
+        RULE_MATCHING.observe(time.perf_counter() - started)
+        rulestats.record(timings)
+        rules_span.set_attribute("rules_evaluated", evaluated)
+        rules_span.set_attribute("rules_matched", len(matched))
+
+    return matched
+
+
+def process_incoming_message(message: IncomingMessage, rules: list[ForwardRule] | None = None) -> int:
+    """
+    The core service logic: finds matching rules and creates pending delivery
+    attempts, each with a DeliveryOutbox row. Nothing is sent here; the relay
+    (manage.py relay_outbox) dispatches the attempts once the transaction commits.
+
+    The message is claimed by flipping `processed` first, so when two routers
+    (e.g. live ingest and ingest.route_unprocessed) reach the same message, the
+    second one waits for the first and then returns 0 without routing it again.
+    """
+    with span("process_incoming_message", trace_id=message.trace_id or None, message_id=str(message.id)):
+        # Rules are read before the transaction opens, so it only holds the writes.
+        targets = [
+            (rule, rule_action.channel)
+            for rule in _match_rules(message, rules)
+            for rule_action in _enabled_actions(rule)
+        ]
+
+        with transaction.atomic():
+            # Filtered on the partition key too, so only one partition is searched.
+            updated_at = timezone.now()
+            claimed = IncomingMessage.objects.filter(
+                id=message.id, received_at=message.received_at, processed=False
+            ).update(processed=True, updated_at=updated_at)
+            if not claimed:
+                return 0
+            message.processed = True
+            message.updated_at = updated_at
+            # An update sends no post_save, so the live feed is fed here.
+            publish_on_commit("messages", message_payload(message))
+
+            attempts = [
+                DeliveryAttempt.objects.create(
+                    message=message,
+                    rule=rule,
+                    channel=channel,
+                    status=DeliveryAttempt.Status.PENDING,
+                    enqueued_at=timezone.now(),
+                )
+                for rule, channel in targets
+            ]
+            DeliveryOutbox.objects.bulk_create(
+                DeliveryOutbox(attempt=attempt, attempt_created_at=attempt.created_at, priority=rule.priority)
+                for attempt, (rule, _) in zip(attempts, targets)
+            )
+
+    return len(attempts)
+
 
-    for rule in rules_qs:
-        if not _check_message_filters(message, rule.filters):
+def process_incoming_messages(messages) -> int:
+    """
+    Routes a batch of stored messages in one transaction, each in its own
+    savepoint. A message whose routing fails for any reason other than a
+    DatabaseError is left unprocessed, as in live ingest. Rules and their
+    actions are read once for the batch. Returns the number routed.
+    """
+    rules = _enabled_rules()
+    routed = 0
+    with transaction.atomic():
+        for message in messages:
+            try:
+                process_incoming_message(message, rules)
+                routed += 1
+            except DatabaseError:
+                raise
+            except Exception as e:
+                print(f"Message {message.id} saved, but processing failed: {e}")
+    return routed
+
+
+def build_incoming_message(
+    raw_body: str | list[str],
+    sender: str,
+    body: str,
+    trace_id: str = "",
+    device: Device | None = None,
+    received_at=None,
+    **fields,
+) -> IncomingMessage:
+    """An unsaved IncomingMessage; `received_at` defaults to now."""
+    return IncomingMessage(
+        from_number=sender,
+        to_number=(device.phone_number or f"{device.device_id}_GATEWAY") if device else "MC60_GATEWAY",
+        device=device,
+        body=body,
+        received_at=received_at or timezone.now(),
+        raw_payload=raw_body,
+        trace_id=trace_id,
+        **fields,
+    )
+
+
+def create_incoming_message(
+    raw_body: str | list[str], sender: str, body: str, trace_id: str = "", device: Device | None = None
+) -> IncomingMessage:
+    """`raw_body` is the MQTT payload, or the list of payloads of a reassembled multipart SMS."""
+    message = build_incoming_message(raw_body, sender, body, trace_id=trace_id, device=device)
+    message.save(force_insert=True)
+    return message
+
+
+def _multipart_logs(log: FailedLog, frame) -> list[tuple[FailedLog, object]]:
+    """
+    Locks the unreplayed logs holding the parts of `frame`'s message, `log`
+    included, as (log, frame) pairs. Parts that failed together are logged
+    together, so siblings are looked for within the reassembly TTL.
+    """
+    window = timedelta(seconds=2 * settings.REASSEMBLY_TTL)
+    candidates = FailedLog.objects.select_for_update(skip_locked=True).filter(
+        replayed_at__isnull=True,
+        source_tag=log.source_tag,
+        topic=log.topic,
+        raw_data__startswith=log.raw_data.partition(":")[0] + ":",
+        created_at__range=(log.created_at - window, log.created_at + window),
+    ).exclude(pk=log.pk).order_by("created_at")
+
+    parts = {frame.segment.sequence: (log, frame)}
+    for candidate in candidates:
+        try:
+            other = parse_frame(candidate.raw_data)
+        except MC60ParseError:
             continue
+        if (
+            other.sender == frame.sender
+            and other.is_multipart
+            and other.segment.reference == frame.segment.reference
+            and other.segment.total == frame.segment.total
+        ):
+            parts.setdefault(other.segment.sequence, (candidate, other))
+    return [parts[sequence] for sequence in sorted(parts)]
+
+
+def replay_failed_log(log_id) -> str:
+    """
+    Runs a FailedLog payload through parse -> persist -> route again.
 
-        rule_actions = rule.actions.filter(is_enabled=True)
+    The log row itself is the idempotency key: it is locked, and the message is
+    stored in the same transaction that sets replayed_at and replayed_message,
+    so a log is never stored twice, while an SMS that legitimately arrived
+    twice still is. A part of a concatenated SMS is stored together with the
+    parts logged alongside it, as one message; parts that were never logged
+    are marked in the body as in the reassembly buffer.
 
-        for rule_action in rule_actions:
-            attempt = DeliveryAttempt.objects.create(
-                message=message,
-                rule=rule,
-                channel=rule_action.channel,
-                status=DeliveryAttempt.Status.PENDING,
+    Returns "replayed" (a new message was stored), "failed" (still does not
+    parse; the error is kept in replay_error) or "skipped" (already replayed,
+    or locked by another replayer).
+    """
+    with transaction.atomic():
+        log = (
+            FailedLog.objects.select_for_update(skip_locked=True)
+            .filter(pk=log_id, replayed_at__isnull=True)
+            .first()
+        )
+        if log is None:
+            return "skipped"
+
+        try:
+            frame = parse_frame(log.raw_data)
+        except MC60ParseError as e:
+            log.replay_error = str(e)
+            log.save(update_fields=["replay_error", "updated_at"])
+            return "failed"
+
+        if frame.is_multipart:
+            parts = _multipart_logs(log, frame)
+            assembled = assemble(
+                log.topic,
+                frame.sender,
+                frame.segment.total,
+                {part.segment.sequence: (part.body, part_log.raw_data) for part_log, part in parts},
             )
-            deliveries_created += 1
-            
-            _execute_delivery_attempt(attempt, message)
+            logs = [part_log for part_log, _ in parts]
+            message = create_incoming_message(
+                assembled.raw_parts, assembled.sender, assembled.body, device=device_for_topic(log.topic)
+            )
+        else:
+            logs = [log]
+            message = create_incoming_message(log.raw_data, frame.sender, frame.body, device=device_for_topic(log.topic))
 
-        if rule.stop_processing:
-            break
-            
-    message.processed = True
-    message.save()
-    
-    return deliveries_created
\ No newline at end of file
+        replay_error = ""
+        try:
+            process_incoming_message(message)
+        except Exception as e:
+            replay_error = f"Message saved, but processing failed: {e}"
+
+        replayed_at = timezone.now()
+        for part_log in logs:
+            part_log.replay_error = replay_error
+            part_log.replayed_at = replayed_at
+            part_log.replayed_message = message
+            part_log.updated_at = replayed_at
+        FailedLog.objects.bulk_update(logs, ["replayed_at", "replayed_message", "replay_error", "updated_at"])
+
+    return "replayed"
@@ -1,6 +1,29 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from django.db import transaction
 from django.core.cache import cache
 from .behaviors import send_bale_message,send_telegram_message
 
+from .models import DeliveryAttempt, Device, IncomingMessage
+from .ingest import forget_token
+from .live import delivery_payload, message_payload, publish_on_commit
+
+
+@receiver(post_save, sender=IncomingMessage)
+def publish_message_event(sender, instance, raw=False, **kwargs):
+    # Fixture loads are not live events.
+    if raw:
+        return
+    publish_on_commit("messages", message_payload(instance))
+
+
+@receiver(post_save, sender=DeliveryAttempt)
+def publish_delivery_event(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    publish_on_commit("deliveries", delivery_payload(instance))
+
+
+@receiver(post_delete, sender=Device)
+def revoke_device_token(sender, instance, **kwargs):
+    forget_token(instance.ingest_token_hash)
@@ -0,0 +1,177 @@
+# monitor/simulation.py
+"""
+Dry runs of candidate ForwardRule filters over IncomingMessage history.
+
+`simulate()` reads the messages received in [start, end) through a server-side
+cursor, `chunk_size` rows at a time, and evaluates every candidate against each
+chunk with the same matcher live routing uses (services._check_message_filters).
+Chunks are evaluated in a process pool of `workers` processes while the next
+chunks are being read, so the scan is bound by the database rather than by one
+core. At most `2 * workers` chunks are in flight, which keeps memory flat.
+
+Only the id (as text; decoding UUIDs and timestamps costs more than matching),
+sender and body are read during the scan; sample messages are loaded in one
+query at the end. Results are merged in chunk order, so counts and samples are
+the same for any worker count. Candidates are evaluated independently of each other and of the
+existing rules (stop_processing is not applied).
+"""
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import NamedTuple
+
+from django.conf import settings
+from django.db.models import TextField
+from django.db.models.functions import Cast
+
+from .models import ForwardRule, IncomingMessage
+from .services import _check_message_filters
+
+# The keys _check_message_filters reads; anything else would be ignored and match every message.
+FILTER_KEYS = ("body_contains", "from_number_is")
+
+
+class _Row(NamedTuple):
+    id: str
+    from_number: str
+    body: str
+
+
+def _init_worker():
+    # Forked workers inherit the configured app registry; spawned ones set it up here.
+    import django
+    from django.apps import apps
+
+    if not apps.ready:
+        django.setup()
+
+
+def evaluate_chunk(filters: list[dict], rows: list[tuple], sample_size: int) -> list[tuple[int, list[tuple]]]:
+    """(matches, ids of the first `sample_size` matching rows) per candidate filter."""
+    counts = [0] * len(filters)
+    samples = [[] for _ in filters]
+    for values in rows:
+        row = _Row(*values)
+        for index, candidate in enumerate(filters):
+            if _check_message_filters(row, candidate):
+                counts[index] += 1
+                if len(samples[index]) < sample_size:
+                    samples[index].append(row.id)
+    return list(zip(counts, samples))
+
+
+def load_candidates(filters: list[dict] = (), rule_ids=(), using: str | None = None) -> list[dict]:
+    """Candidates from inline filters and from existing rules (enabled or not), in that order."""
+    candidates = [{"rule": None, "name": None, "filters": item} for item in filters]
+    rules = ForwardRule.objects.using(using).in_bulk(rule_ids)
+    missing = [str(rule_id) for rule_id in rule_ids if rule_id not in rules]
+    if missing:
+        raise ForwardRule.DoesNotExist(f"Unknown rules: {', '.join(missing)}")
+    candidates += [
+        {"rule": str(rule_id), "name": rules[rule_id].name, "filters": rules[rule_id].filters or {}}
+        for rule_id in rule_ids
+    ]
+    return candidates
+
+
+def _prefilter(queryset, filters: list[dict]):
+    """Narrows the scan in SQL where that is exact: every candidate pins a sender."""
+    senders = [item.get("from_number_is") for item in filters]
+    if all(senders):
+        return queryset.filter(from_number__in=set(senders))
+    return queryset
+
+
+def _chunks(queryset, chunk_size: int):
+    rows = (
+        queryset.annotate(key=Cast("id", TextField()))
+        .values_list("key", "from_number", "body")
+        .iterator(chunk_size=chunk_size)
+    )
+    while chunk := list(islice(rows, chunk_size)):
+        yield chunk
+
+
+def _load_samples(queryset, ids) -> dict[uuid.UUID, dict]:
+    if not ids:
+        return {}
+    rows = queryset.filter(id__in=ids).values("id", "received_at", "from_number", "body")
+    return {
+        row["id"]: dict(row, id=str(row["id"]), received_at=row["received_at"].isoformat())
+        for row in rows
+    }
+
+
+def simulate(
+    candidates: list[dict],
+    start,
+    end,
+    chunk_size: int | None = None,
+    workers: int | None = None,
+    sample_size: int | None = None,
+    using: str | None = None,
+):
+    """
+    Yields {"event": "progress", "scanned": n} after every chunk, then one
+    {"event": "result", ...} with the match count and samples of each candidate
+    (see load_candidates). Runs inline when `workers` is 0 or 1.
+    """
+    chunk_size = chunk_size or settings.RULE_SIMULATION_CHUNK_SIZE
+    workers = settings.RULE_SIMULATION_WORKERS if workers is None else workers
+    sample_size = settings.RULE_SIMULATION_SAMPLES if sample_size is None else sample_size
+
+    filters = [candidate["filters"] for candidate in candidates]
+    started = time.perf_counter()
+    queryset = IncomingMessage.objects.using(using).filter(received_at__gte=start, received_at__lt=end)
+    chunks = _chunks(_prefilter(queryset, filters), chunk_size)
+
+    totals = [0] * len(candidates)
+    samples = [[] for _ in candidates]
+    scanned = 0
+
+    def merge(size, results):
+        nonlocal scanned
+        scanned += size
+        for index, (count, rows) in enumerate(results):
+            totals[index] += count
+            samples[index].extend(rows[:sample_size - len(samples[index])])
+        return {"event": "progress", "scanned": scanned}
+
+    if workers <= 1:
+        for chunk in chunks:
+            yield merge(len(chunk), evaluate_chunk(filters, chunk, sample_size))
+    else:
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker)
+        try:
+            pending = deque()
+            for chunk in chunks:
+                pending.append((len(chunk), pool.submit(evaluate_chunk, filters, chunk, sample_size)))
+                if len(pending) >= workers * 2:
+                    size, future = pending.popleft()
+                    yield merge(size, future.result())
+            while pending:
+                size, future = pending.popleft()
+                yield merge(size, future.result())
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    # The text form of the id differs per backend (SQLite stores hex without dashes).
+    samples = [[uuid.UUID(sample) for sample in ids] for ids in samples]
+    found = _load_samples(queryset, {sample for ids in samples for sample in ids})
+    yield {
+        "event": "result",
+        "scanned": scanned,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "candidates": [
+            dict(
+                candidate,
+                matches=totals[index],
+                samples=[found[sample] for sample in samples[index] if sample in found],
+            )
+            for index, candidate in enumerate(candidates)
+        ],
+    }
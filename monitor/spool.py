@@ -0,0 +1,398 @@
+# monitor/spool.py
+"""
+Local write-ahead spool for incoming SMS while the database is unavailable.
+
+When storing a message fails because the database cannot be reached
+(UNAVAILABLE: OperationalError, InterfaceError), the consumer appends it to
+the spool instead of dropping it (the MQTT message is already acked by then).
+Errors about the data itself (DataError, IntegrityError) are not spooled.
+While the spool holds anything, new messages are appended as well, so arrival
+order is kept and ingest does not wait on a database that is timing out.
+`SpoolDrainer` replays the spool into the database in batches once it answers
+again.
+
+On disk the spool is a directory of numbered segment files. Each record is a
+length + CRC32 header followed by JSON. Appends are written through to the OS
+immediately (a crashed process loses nothing); fsync runs at most every
+SPOOL_FSYNC_INTERVAL seconds from a background thread, so a power loss costs
+at most that window. A segment is appended to only by the process that created
+it, so a record torn by a crash can only be at the end of a segment, where it
+is skipped. Segments are sealed at SPOOL_SEGMENT_BYTES, or when the drainer
+reaches the end of the one being written, and deleted once drained; the drain
+position is kept in a `cursor` file.
+
+Every record carries the id its IncomingMessage gets. A batch is inserted in
+one statement (skipping ids already stored), routed in one transaction, and
+only then acknowledged, so a crash mid-batch replays it without duplicating
+messages or deliveries. A batch that fails SPOOL_MAX_ATTEMPTS times for any
+other reason than an unreachable database is stored record by record; records
+that still fail are moved to FailedLog, so one bad record cannot hold up the
+spool (and with it all ingest) for good.
+
+One process per directory: the spool takes an exclusive lock on it.
+"""
+import fcntl
+import json
+import logging
+import os
+import struct
+import threading
+import time
+import uuid
+import zlib
+from datetime import datetime
+
+from django.conf import settings
+from django.db import DatabaseError, InterfaceError, OperationalError, close_old_connections
+from django.utils import timezone
+
+from .devices import device_for_topic
+from .metrics import SPOOL_PENDING, SPOOL_RECORDS
+from .models import FailedLog, IncomingMessage
+from .services import build_incoming_message, process_incoming_messages
+from .uuids import uuid7
+
+logger = logging.getLogger(__name__)
+
+# The database cannot be reached, as opposed to rejecting what was written.
+UNAVAILABLE = (OperationalError, InterfaceError)
+
+# Payload length, CRC32 of the payload.
+HEADER = struct.Struct("<II")
+CURSOR = "cursor"
+SEGMENT_SUFFIX = ".seg"
+
+
+def _segment_name(seq: int) -> str:
+    return f"{seq:012d}{SEGMENT_SUFFIX}"
+
+
+def _fsync_dir(path: str) -> None:
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _read_records(path: str, offset: int, limit: int | None = None) -> tuple[list[dict], int, bool]:
+    """
+    Up to `limit` records of the segment at `path` from `offset`: (records,
+    offset after them, whether the end of the segment was reached). A torn or
+    corrupt record ends the segment.
+    """
+    records = []
+    with open(path, "rb") as segment:
+        segment.seek(offset)
+        while limit is None or len(records) < limit:
+            header = segment.read(HEADER.size)
+            if len(header) < HEADER.size:
+                if header:
+                    logger.warning("Spool segment %s ends in a torn record at %d", path, offset)
+                return records, offset, True
+            length, crc = HEADER.unpack(header)
+            payload = segment.read(length)
+            if len(payload) < length or zlib.crc32(payload) != crc:
+                logger.warning("Spool segment %s has a torn or corrupt record at %d; skipping the rest", path, offset)
+                return records, offset, True
+            records.append(json.loads(payload))
+            offset += HEADER.size + length
+        return records, offset, segment.read(1) == b""
+
+
+class Spool:
+    def __init__(
+        self,
+        directory: str,
+        segment_bytes: int = 16 * 1024 * 1024,
+        fsync_interval: float = 0.05,
+    ):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.fsync_interval = fsync_interval
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock_file = open(os.path.join(directory, "LOCK"), "a")
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            self._lock_file.close()
+            raise RuntimeError(f"Spool directory {directory} is in use by another process")
+
+        self._lock = threading.Lock()
+        self._cursor = self._read_cursor()
+        self._sealed = self._existing_segments()
+        for seq in [seq for seq in self._sealed if seq < self._cursor[0]]:
+            os.remove(self._path(seq))
+            self._sealed.remove(seq)
+        if self._sealed and self._cursor[0] not in self._sealed:
+            self._cursor = (self._sealed[0], 0)
+
+        self._pending = self._count_pending()
+        SPOOL_PENDING.set(self._pending)
+
+        # Never append to a segment left by an earlier process: its tail may be torn.
+        self._active_seq = max(self._sealed + [self._cursor[0] - 1]) + 1
+        if not self._sealed:
+            self._cursor = (self._active_seq, 0)
+        self._active = open(self._path(self._active_seq), "ab")
+        self._dirty = False
+        self._closed = False
+        threading.Thread(target=self._sync_loop, name="spool-fsync", daemon=True).start()
+
+    def _path(self, seq: int) -> str:
+        return os.path.join(self.directory, _segment_name(seq))
+
+    def _existing_segments(self) -> list[int]:
+        return sorted(
+            int(name[: -len(SEGMENT_SUFFIX)])
+            for name in os.listdir(self.directory)
+            if name.endswith(SEGMENT_SUFFIX)
+        )
+
+    def _read_cursor(self) -> tuple[int, int]:
+        try:
+            with open(os.path.join(self.directory, CURSOR)) as cursor:
+                seq, offset = cursor.read().split()
+            return int(seq), int(offset)
+        except FileNotFoundError:
+            return 0, 0
+
+    def _write_cursor(self, position: tuple[int, int]) -> None:
+        path = os.path.join(self.directory, CURSOR)
+        with open(path + ".tmp", "w") as cursor:
+            cursor.write(f"{position[0]} {position[1]}")
+            cursor.flush()
+            os.fsync(cursor.fileno())
+        os.replace(path + ".tmp", path)
+        _fsync_dir(self.directory)
+
+    def _count_pending(self) -> int:
+        count = 0
+        for seq in self._sealed:
+            offset = self._cursor[1] if seq == self._cursor[0] else 0
+            count += len(_read_records(self._path(seq), offset)[0])
+        return count
+
+    @property
+    def pending(self) -> int:
+        """Records appended and not yet drained."""
+        return self._pending
+
+    def append(self, record: dict) -> None:
+        payload = json.dumps(record, ensure_ascii=False, separators=(",", ":"), default=str).encode()
+        with self._lock:
+            self._active.write(HEADER.pack(len(payload), zlib.crc32(payload)) + payload)
+            self._active.flush()
+            self._pending += 1
+            self._dirty = True
+            if self._active.tell() >= self.segment_bytes:
+                self._seal()
+        SPOOL_RECORDS.labels("appended").inc()
+        SPOOL_PENDING.set(self._pending)
+
+    def _seal(self) -> None:
+        # Caller holds self._lock.
+        os.fsync(self._active.fileno())
+        self._active.close()
+        self._sealed.append(self._active_seq)
+        self._active_seq += 1
+        self._active = open(self._path(self._active_seq), "ab")
+        self._dirty = False
+        _fsync_dir(self.directory)
+
+    def _sync_loop(self) -> None:
+        while not self._closed:
+            time.sleep(self.fsync_interval)
+            with self._lock:
+                if not self._dirty or self._closed:
+                    continue
+                # A duplicate descriptor, so appends (and sealing) need not wait for the fsync.
+                fd = os.dup(self._active.fileno())
+                self._dirty = False
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+    def read_batch(self, limit: int) -> tuple[list[dict], tuple[int, int]]:
+        """
+        The oldest `limit` undrained records and the position to pass to
+        `acknowledge()` once they are stored. Seals the segment being written
+        when the drainer has caught up with it.
+        """
+        with self._lock:
+            if not self._sealed:
+                if self._active.tell() == 0:
+                    return [], self._cursor
+                self._seal()
+            seq, offset = self._cursor
+            following = self._sealed[1] if len(self._sealed) > 1 else self._active_seq
+
+        records, offset, finished = _read_records(self._path(seq), offset, limit)
+        return records, ((following, 0) if finished else (seq, offset))
+
+    def acknowledge(self, position: tuple[int, int], count: int) -> None:
+        """Marks everything before `position` as drained and deletes finished segments."""
+        self._write_cursor(position)
+        with self._lock:
+            self._cursor = position
+            finished = [seq for seq in self._sealed if seq < position[0]]
+            self._sealed = [seq for seq in self._sealed if seq >= position[0]]
+            self._pending = max(self._pending - count, 0)
+        for seq in finished:
+            os.remove(self._path(seq))
+        SPOOL_RECORDS.labels("drained").inc(count)
+        SPOOL_PENDING.set(self._pending)
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+            self._active.flush()
+            os.fsync(self._active.fileno())
+            self._active.close()
+        self._lock_file.close()
+
+
+def spool_record(raw_payload, sender: str, body: str, topic: str = "", trace_id: str = "") -> dict:
+    """What the drainer needs to store the message as if it had been stored on arrival."""
+    return {
+        "id": str(uuid7()),
+        "received_at": timezone.now().isoformat(),
+        "topic": topic,
+        "sender": sender,
+        "body": body,
+        "raw_payload": raw_payload,
+        "trace_id": trace_id,
+    }
+
+
+def store_records(records: list[dict]) -> tuple[int, int]:
+    """
+    Inserts the spooled messages not stored yet in one bulk insert, then routes
+    every one that is not processed. Returns (inserted, routed).
+    """
+    ids = [uuid.UUID(record["id"]) for record in records]
+    stored = dict(IncomingMessage.objects.filter(id__in=ids).values_list("id", "processed"))
+
+    messages = [
+        build_incoming_message(
+            record["raw_payload"],
+            record["sender"],
+            record["body"],
+            trace_id=record["trace_id"],
+            device=device_for_topic(record["topic"]) if record["topic"] else None,
+            received_at=datetime.fromisoformat(record["received_at"]),
+            id=message_id,
+        )
+        for message_id, record in zip(ids, records)
+        if message_id not in stored
+    ]
+    IncomingMessage.objects.bulk_create(messages)
+
+    unprocessed = [message_id for message_id, processed in stored.items() if not processed]
+    if unprocessed:
+        messages += IncomingMessage.objects.filter(id__in=unprocessed).order_by("received_at")
+
+    return len(ids) - len(stored), process_incoming_messages(messages)
+
+
+def store_each(records: list[dict]) -> tuple[int, int, int]:
+    """
+    store_records for one record at a time. A record that fails for any other
+    reason than an unreachable database is written to FailedLog, one log per
+    MQTT payload, unless its message was stored and only routing failed (the
+    unprocessed sweep retries those; a log would store the message again on
+    replay). Returns (inserted, routed, moved to FailedLog).
+    """
+    inserted = routed = failed = 0
+    for record in records:
+        try:
+            stored, record_routed = store_records([record])
+        except UNAVAILABLE:
+            raise
+        except Exception as e:
+            logger.error("Spooled message %s could not be stored: %s", record["id"], e)
+            close_old_connections()
+            if IncomingMessage.objects.filter(
+                id=record["id"], received_at=datetime.fromisoformat(record["received_at"])
+            ).exists():
+                continue
+            raw_parts = record["raw_payload"] if isinstance(record["raw_payload"], list) else [record["raw_payload"]]
+            FailedLog.objects.bulk_create(
+                FailedLog(
+                    raw_data=raw,
+                    error_message=f"Spooled message could not be stored: {e}",
+                    source_tag="mc60_mqtt",
+                    topic=record.get("topic", ""),
+                )
+                for raw in raw_parts
+            )
+            failed += 1
+        else:
+            inserted += stored
+            routed += record_routed
+    return inserted, routed, failed
+
+
+class SpoolDrainer:
+    """Replays the spool into the database whenever it holds records."""
+
+    def __init__(
+        self,
+        spool: Spool,
+        batch_size: int = 500,
+        retry_interval: float = 2.0,
+        poll_interval: float = 0.5,
+        max_attempts: int = 5,
+    ):
+        self.spool = spool
+        self.batch_size = batch_size
+        self.retry_interval = retry_interval
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        # Failed drains of the oldest batch, not counting an unreachable database.
+        self.failures = 0
+
+    def drain_once(self) -> int:
+        """Stores one batch; returns the number of records drained."""
+        records, position = self.spool.read_batch(self.batch_size)
+        if records:
+            if self.failures >= self.max_attempts:
+                inserted, routed, failed = store_each(records)
+                print(
+                    f"Drained {len(records)} spooled messages one by one ({inserted} inserted, "
+                    f"{routed} routed, {failed} moved to FailedLog)."
+                )
+            else:
+                inserted, routed = store_records(records)
+                print(f"Drained {len(records)} spooled messages ({inserted} inserted, {routed} routed).")
+        self.spool.acknowledge(position, len(records))
+        self.failures = 0
+        return len(records)
+
+    def run(self) -> None:
+        while True:
+            if not self.spool.pending:
+                time.sleep(self.poll_interval)
+                continue
+            close_old_connections()
+            try:
+                self.drain_once()
+            except UNAVAILABLE as e:
+                print(f"Spool drain failed, retrying in {self.retry_interval}s: {e}")
+                time.sleep(self.retry_interval)
+            except Exception as e:
+                self.failures += 1
+                if not isinstance(e, DatabaseError):
+                    logger.exception("Spool drain failed")
+                print(f"Spool drain failed ({self.failures}/{self.max_attempts}), retrying in {self.retry_interval}s: {e}")
+                time.sleep(self.retry_interval)
+
+
+def get_spool() -> Spool:
+    return Spool(
+        settings.SPOOL_DIR,
+        segment_bytes=settings.SPOOL_SEGMENT_BYTES,
+        fsync_interval=settings.SPOOL_FSYNC_INTERVAL,
+    )
@@ -0,0 +1,163 @@
+# monitor/status_writer.py
+"""
+Write-behind for delivery outcomes.
+
+Relay workers hand finished DeliveryAttempts to a DeliveryStatusWriter instead
+of saving them one by one. A background thread collects them for up to
+`flush_interval` seconds or `max_batch` attempts, then writes the batch in one
+transaction: a single UPDATE of the result columns (UPDATE ... FROM (VALUES ...)
+on PostgreSQL, bulk_update elsewhere) and a single DELETE of the outbox rows.
+
+An outbox row is only removed together with its attempt's status, so if the
+process dies before a flush, or a write fails, the row is claimed again after
+its lease, as with any other relay crash. flush() and close() report whether
+every write since the previous report succeeded.
+"""
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from django.conf import settings
+from django.db import close_old_connections, connection, connections, transaction
+from django.utils import timezone
+
+from .live import delivery_payload, publish_on_commit
+from .models import DeliveryAttempt, DeliveryOutbox
+
+logger = logging.getLogger(__name__)
+
+# What a delivery changes on its attempt.
+RESULT_FIELDS = [
+    "status",
+    "provider_message_id",
+    "error",
+    "retry_count",
+    "last_attempt_at",
+    "dispatch_started_at",
+    "provider_duration_ms",
+    "total_latency_ms",
+    "updated_at",
+]
+
+_STOP = object()
+
+
+def _update_from_values(attempts: list[DeliveryAttempt]):
+    """One UPDATE for the whole batch. Joins on (id, created_at), the partitioned primary key."""
+    opts = DeliveryAttempt._meta
+    fields = [opts.get_field("id"), opts.get_field("created_at")] + [opts.get_field(name) for name in RESULT_FIELDS]
+    row = "(" + ", ".join(f"%s::{field.db_type(connection)}" for field in fields) + ")"
+    params = [
+        field.get_db_prep_value(getattr(attempt, field.attname), connection)
+        for attempt in attempts
+        for field in fields
+    ]
+    qn = connection.ops.quote_name
+    assignments = ", ".join(f"{qn(field.column)} = v.{qn(field.column)}" for field in fields[2:])
+    columns = ", ".join(qn(field.column) for field in fields)
+    sql = (
+        f"UPDATE {qn(opts.db_table)} AS a SET {assignments} "
+        f"FROM (VALUES {', '.join([row] * len(attempts))}) AS v ({columns}) "
+        f"WHERE a.{qn('id')} = v.{qn('id')} AND a.{qn('created_at')} = v.{qn('created_at')}"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def write_statuses(attempts: list[DeliveryAttempt], outbox_rows: list[int] = ()):
+    """Saves the result columns of `attempts` and removes `outbox_rows`, in one transaction."""
+    now = timezone.now()
+    for attempt in attempts:
+        attempt.updated_at = now
+
+    with transaction.atomic():
+        if attempts:
+            if connection.vendor == "postgresql":
+                for start in range(0, len(attempts), 1000):
+                    _update_from_values(attempts[start:start + 1000])
+            else:
+                DeliveryAttempt.objects.bulk_update(attempts, RESULT_FIELDS, batch_size=500)
+        if outbox_rows:
+            DeliveryOutbox.objects.filter(id__in=outbox_rows).delete()
+        # Bulk writes send no post_save, so the live feed is fed here.
+        for attempt in attempts:
+            publish_on_commit("deliveries", delivery_payload(attempt))
+
+
+class DeliveryStatusWriter:
+    def __init__(self, flush_interval: float | None = None, max_batch: int | None = None):
+        self.flush_interval = settings.STATUS_WRITER_FLUSH_INTERVAL if flush_interval is None else flush_interval
+        self.max_batch = settings.STATUS_WRITER_MAX_BATCH if max_batch is None else max_batch
+        self._queue = queue.SimpleQueue()
+        # Batches that failed since flush() or close() last reported; only the writer thread touches it.
+        self._failed = 0
+        self._thread = threading.Thread(target=self._run, name="status-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, attempt: DeliveryAttempt, outbox_row: int | None = None):
+        """Queues a finished attempt, and the outbox row to remove with it."""
+        self._queue.put((attempt, outbox_row))
+
+    def complete(self, outbox_rows):
+        """Queues outbox rows that need no status write (e.g. their attempt is gone)."""
+        for row_id in outbox_rows:
+            self._queue.put((None, row_id))
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """
+        Blocks until everything submitted so far has been written. Returns False
+        if a write since the previous report failed, or on timeout.
+        """
+        written = Future()
+        self._queue.put(written)
+        try:
+            return written.result(timeout)
+        except TimeoutError:
+            return False
+
+    def close(self) -> bool:
+        """Writes what is still queued and stops the thread. Returns False if a write failed."""
+        self._queue.put(_STOP)
+        self._thread.join()
+        return not self._failed
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            items = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(items) < self.max_batch and items[-1] is not _STOP:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    items.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            waiters = [item for item in items if isinstance(item, Future)]
+            stopping = any(item is _STOP for item in items)
+            entries = [item for item in items if isinstance(item, tuple)]
+            if entries and not self._write(entries):
+                self._failed += 1
+            if waiters:
+                for waiter in waiters:
+                    waiter.set_result(not self._failed)
+                self._failed = 0
+
+        connections.close_all()
+
+    def _write(self, entries) -> bool:
+        attempts = [attempt for attempt, _ in entries if attempt is not None]
+        rows = [row_id for _, row_id in entries if row_id is not None]
+        try:
+            close_old_connections()
+            write_statuses(attempts, rows)
+        except Exception as e:
+            # The outbox rows stay claimed and are dispatched again after their lease.
+            logger.error("Writing %d delivery statuses failed: %s", len(attempts), e)
+            close_old_connections()
+            return False
+        return True
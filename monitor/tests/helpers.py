@@ -0,0 +1,31 @@
+from datetime import timedelta
+
+from django.test import override_settings
+from django.utils import timezone
+
+from ..models import DeliveryAttempt, DeliveryOutbox, DestinationChannel, ForwardRule, RuleDestination
+from ..services import build_incoming_message
+
+# Neither Redis nor a channel layer is needed to exercise the database paths.
+quiet = override_settings(LIVE_FEED_ENABLED=False, RULE_STATS_ENABLED=False)
+
+
+def forward_all(priority=ForwardRule.Priority.NORMAL) -> ForwardRule:
+    """An enabled rule matching every message, with one webhook channel."""
+    rule = ForwardRule.objects.create(name=f"all-{priority}", priority=priority)
+    channel = DestinationChannel.objects.create(type=DestinationChannel.ChannelType.WEBHOOK, name=f"hook-{priority}")
+    RuleDestination.objects.create(rule=rule, channel=channel)
+    return rule
+
+
+def pending_attempt(rule: ForwardRule, available_at=None) -> DeliveryOutbox:
+    """A stored message with one pending attempt of `rule`, due in the outbox."""
+    message = build_incoming_message("+1:hi", "+1", "hi")
+    message.save(force_insert=True)
+    attempt = DeliveryAttempt.objects.create(message=message, rule=rule, channel=rule.actions.get().channel)
+    return DeliveryOutbox.objects.create(
+        attempt=attempt,
+        attempt_created_at=attempt.created_at,
+        priority=rule.priority,
+        available_at=available_at or timezone.now() - timedelta(seconds=1),
+    )
@@ -0,0 +1,53 @@
+from unittest import mock
+
+import httpx
+from django.test import SimpleTestCase, override_settings
+from django.utils import timezone
+
+from ..models import DeliveryAttempt, DestinationChannel, IncomingMessage
+from ..services import _execute_delivery_attempt, finish_attempt
+
+
+class FinishAttemptTests(SimpleTestCase):
+    def attempt(self) -> tuple[DeliveryAttempt, IncomingMessage]:
+        message = IncomingMessage(from_number="+1", body="hi", received_at=timezone.now())
+        channel = DestinationChannel(type=DestinationChannel.ChannelType.WEBHOOK, name="hook")
+        return DeliveryAttempt(message=message, channel=channel), message
+
+    def test_success(self):
+        attempt, message = self.attempt()
+        finish_attempt(attempt, message, 0.25, provider_id="HTTP_200")
+
+        self.assertEqual(attempt.status, DeliveryAttempt.Status.SENT)
+        self.assertEqual(attempt.provider_message_id, "HTTP_200")
+        self.assertEqual(attempt.provider_duration_ms, 250)
+
+    def test_error_message_is_stored(self):
+        attempt, message = self.attempt()
+        finish_attempt(attempt, message, 0.1, error=ValueError("bad chat id"))
+
+        self.assertEqual(attempt.status, DeliveryAttempt.Status.FAILED)
+        self.assertEqual(attempt.error, "Delivery failed: bad chat id")
+        self.assertEqual(attempt.retry_count, 1)
+
+    def test_error_without_message_is_named_by_type(self):
+        attempt, message = self.attempt()
+        finish_attempt(attempt, message, 5.0, error=httpx.ReadTimeout(""))
+
+        self.assertEqual(attempt.error, "Delivery failed: ReadTimeout")
+
+
+class DeliverySpanTests(SimpleTestCase):
+    @override_settings(TRACING_ENABLED=True)
+    def test_delivery_continues_the_message_trace(self):
+        message = IncomingMessage(from_number="+1", body="hi", received_at=timezone.now(), trace_id="a" * 32)
+        # No provider is called for an unsupported channel type; the attempt just fails.
+        channel = DestinationChannel(type=DestinationChannel.ChannelType.EMAIL, name="mail")
+        attempt = DeliveryAttempt(message=message, channel=channel)
+
+        with mock.patch("monitor.tracing.get_exporter") as exporter:
+            _execute_delivery_attempt(attempt, message, save=False)
+
+        exported, = exporter.return_value.export.call_args.args
+        self.assertEqual((exported.name, exported.trace_id), ("delivery.execute", "a" * 32))
+        self.assertEqual(attempt.status, DeliveryAttempt.Status.FAILED)
@@ -0,0 +1,86 @@
+import csv
+import io
+import json
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from ..models import DeliveryAttempt
+from ..services import build_incoming_message
+from .helpers import forward_all, pending_attempt, quiet
+
+
+def store(sender, processed=False, received_at=None):
+    message = build_incoming_message(f"{sender}:hi", sender, "hi")
+    message.processed = processed
+    if received_at is not None:
+        message.received_at = received_at
+    message.save(force_insert=True)
+    return message
+
+
+@quiet
+class StreamingExportTests(APITestCase):
+    def setUp(self):
+        self.client.force_authenticate(get_user_model().objects.create_user("exporter"))
+
+    def export(self, name, **params):
+        response = self.client.get(reverse(name), params)
+        self.assertEqual(response.status_code, 200, getattr(response, "data", None))
+        return b"".join(response.streaming_content).decode()
+
+    def ndjson(self, name, **params) -> list[dict]:
+        return [json.loads(line) for line in self.export(name, **params).splitlines()]
+
+    def test_messages_filtered_by_sender_status_and_range(self):
+        now = timezone.now()
+        wanted = store("+1", processed=True, received_at=now - timedelta(hours=1))
+        store("+1", processed=False, received_at=now - timedelta(hours=1))
+        store("+2", processed=True, received_at=now - timedelta(hours=1))
+        store("+1", processed=True, received_at=now - timedelta(days=2))
+
+        rows = self.ndjson(
+            "incoming-message-export",
+            sender="+1",
+            status="processed",
+            start=(now - timedelta(days=1)).isoformat(),
+            end=now.isoformat(),
+        )
+
+        self.assertEqual([row["id"] for row in rows], [str(wanted.id)])
+
+    def test_csv_has_header_and_one_row_per_message(self):
+        store("+1")
+        store("+2")
+
+        rows = list(csv.reader(io.StringIO(self.export("incoming-message-export", export_format="csv"))))
+
+        self.assertEqual(rows[0][:3], ["id", "from_number", "to_number"])
+        self.assertEqual(sorted(row[1] for row in rows[1:]), ["+1", "+2"])
+
+    def test_deliveries_filtered_by_status(self):
+        sent = pending_attempt(forward_all()).attempt
+        sent.status = DeliveryAttempt.Status.SENT
+        sent.save(update_fields=["status"])
+        pending_attempt(forward_all(priority=2))
+
+        rows = self.ndjson("delivery-export", status=DeliveryAttempt.Status.SENT)
+
+        self.assertEqual([row["id"] for row in rows], [str(sent.id)])
+
+    def test_rejects_unknown_status(self):
+        response = self.client.get(reverse("incoming-message-export"), {"status": "sent"})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("status", response.data)
+
+    def test_rejects_empty_range(self):
+        now = timezone.now().isoformat()
+
+        response = self.client.get(reverse("incoming-message-export"), {"start": now, "end": now})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("end", response.data)
@@ -0,0 +1,119 @@
+import asyncio
+import time
+from datetime import timedelta
+from unittest import mock
+
+from django.db import DatabaseError
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from .. import ingest
+from ..models import DeliveryAttempt, Device, IncomingMessage
+from ..services import build_incoming_message
+from .helpers import forward_all, quiet
+
+
+class BuildMessagesTests(SimpleTestCase):
+    def test_device_clock_is_kept_in_raw_payload_only(self):
+        device = Device(device_id="esp-1", phone_number="+100")
+        sent_at = timezone.now() - timedelta(days=400)
+        item = {"from_number": "+1", "to_number": "+100", "body": "hi", "token": "t", "received_at": sent_at}
+        raw = {"from": "+1", "to": "+100", "body": "hi", "token": "t", "received_at": sent_at.isoformat()}
+
+        message, = ingest.build_messages([item], [raw], {"t": device})
+
+        self.assertLess(abs(message.received_at - timezone.now()), timedelta(seconds=5))
+        self.assertEqual(message.raw_payload, {"from": "+1", "to": "+100", "body": "hi", "received_at": sent_at.isoformat()})
+        self.assertEqual(message.to_number, "+100")
+
+
+class InsertBatcherTests(SimpleTestCase):
+    def run_inserts(self, insert, *delays):
+        async def request(delay, message):
+            await asyncio.sleep(delay)
+            await ingest.store_messages([message])
+
+        async def requests():
+            messages = [IncomingMessage(from_number="+1", body=str(index)) for index in range(len(delays))]
+            return await asyncio.gather(*(request(delay, message) for delay, message in zip(delays, messages)))
+
+        with mock.patch.object(ingest, "_insert", side_effect=insert):
+            asyncio.run(requests())
+
+    def test_requests_arriving_during_an_insert_share_the_next(self):
+        sizes = []
+
+        def insert(messages):
+            sizes.append(len(messages))
+            time.sleep(0.1)
+
+        # The first request inserts alone; the next three arrive while it runs.
+        self.run_inserts(insert, 0, 0.02, 0.03, 0.04)
+        self.assertEqual(sizes, [1, 3])
+
+    @override_settings(INGEST_INSERT_BATCH=2)
+    def test_shared_inserts_are_capped(self):
+        sizes = []
+
+        def insert(messages):
+            sizes.append(len(messages))
+            time.sleep(0.1)
+
+        self.run_inserts(insert, 0, 0.02, 0.02, 0.02, 0.02, 0.02)
+        self.assertEqual(sizes, [1, 2, 2, 1])
+
+    def test_failed_insert_fails_every_request_in_it(self):
+        with self.assertRaises(DatabaseError):
+            self.run_inserts(mock.Mock(side_effect=DatabaseError("gone")), 0, 0)
+
+
+@quiet
+class RouteUnprocessedTests(TestCase):
+    def setUp(self):
+        forward_all()
+        now = timezone.now()
+        IncomingMessage.objects.bulk_create([
+            build_incoming_message({}, "+1", "stale", received_at=now - timedelta(minutes=10)),
+            build_incoming_message({}, "+1", "recent", received_at=now - timedelta(seconds=10)),
+        ])
+
+    def test_routes_only_messages_past_the_sweep_age(self):
+        self.assertEqual(ingest.route_unprocessed(older_than=300, within=86400), 1)
+        self.assertEqual(
+            dict(IncomingMessage.objects.values_list("body", "processed")), {"stale": True, "recent": False}
+        )
+        # Routed messages are claimed, so a second sweep creates nothing.
+        self.assertEqual(ingest.route_unprocessed(older_than=300, within=86400), 0)
+        self.assertEqual(DeliveryAttempt.objects.count(), 1)
+
+    @override_settings(INGEST_SWEEP_AGE=300, INGEST_SWEEP_WINDOW=86400)
+    def test_one_process_sweeps_per_interval(self):
+        with mock.patch.object(ingest.cache, "add", return_value=False):
+            self.assertEqual(ingest.sweep_unprocessed(), 0)
+        with mock.patch.object(ingest.cache, "add", return_value=True):
+            self.assertEqual(ingest.sweep_unprocessed(), 1)
+
+
+# The router routes on its own thread and connection.
+@quiet
+class IngestRouterTests(TransactionTestCase):
+    def test_failing_batch_is_routed_message_by_message(self):
+        forward_all()
+        messages = [build_incoming_message({}, "+1", str(index)) for index in range(3)]
+        IncomingMessage.objects.bulk_create(messages)
+        route = ingest.process_incoming_messages
+
+        def batch_fails(batch):
+            if len(batch) > 1:
+                raise DatabaseError("deadlock")
+            return route(batch)
+
+        with mock.patch.object(ingest, "process_incoming_messages", side_effect=batch_fails) as routed:
+            router = ingest.IngestRouter(batch_size=10, retry_interval=0, retries=2, sweep_interval=3600)
+            router.submit(messages)
+            router.close()
+
+        self.assertFalse(IncomingMessage.objects.filter(processed=False).exists())
+        # Three tries of the batch, then one call per message.
+        self.assertEqual([len(call.args[0]) for call in routed.call_args_list], [3, 3, 3, 1, 1, 1])
+        self.assertEqual(DeliveryAttempt.objects.count(), 3)
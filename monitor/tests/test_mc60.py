@@ -0,0 +1,64 @@
+from django.test import SimpleTestCase
+
+from ..mc60 import MAX_SENDER_LENGTH, MC60ParseError, Segment, join_segments, parse_frame
+
+
+def ucs2(text: str) -> str:
+    return text.encode("utf-16-be").hex().upper()
+
+
+class ParseFrameTests(SimpleTestCase):
+    def test_plain_text(self):
+        frame = parse_frame(b" +989121234567 :Your code: 4821")
+
+        self.assertEqual((frame.sender, frame.body, frame.encoding), ("+989121234567", "Your code: 4821", "text"))
+        self.assertFalse(frame.is_multipart)
+
+    def test_ucs2_without_header(self):
+        frame = parse_frame(f"+98:{ucs2('سلام دنیا')}")
+
+        self.assertEqual((frame.body, frame.encoding, frame.segment), ("سلام دنیا", "ucs2", None))
+
+    def test_ucs2_part_with_8_bit_reference(self):
+        frame = parse_frame(f"+98:0500032A0201{ucs2('سلام')}")
+
+        self.assertEqual(frame.body, "سلام")
+        self.assertEqual(frame.segment, Segment(reference=0x2A, total=2, sequence=1))
+
+    def test_ucs2_part_with_16_bit_reference(self):
+        frame = parse_frame(f"+98:060804BEEF0302{ucs2('دنیا')}")
+
+        self.assertEqual(frame.body, "دنیا")
+        self.assertEqual(frame.segment, Segment(reference=0xBEEF, total=3, sequence=2))
+
+    def test_hex_that_is_not_text_stays_text(self):
+        for content in ("12345678", "0500032A0103" + ucs2("hi"), "DEADBEEF00000000"):
+            with self.subTest(content=content):
+                frame = parse_frame(f"+98:{content}")
+                self.assertEqual((frame.body, frame.encoding), (content, "text"))
+
+    def test_malformed_frames(self):
+        cases = {
+            "missing_separator": b"no separator",
+            "empty_sender": b" :body",
+            "invalid_sender": ("1" * (MAX_SENDER_LENGTH + 1) + ":body").encode(),
+            "invalid_utf8": b"+98:\xff\xfe",
+        }
+        for code, payload in cases.items():
+            with self.subTest(code=code), self.assertRaises(MC60ParseError) as raised:
+                parse_frame(payload)
+            self.assertEqual(raised.exception.code, code)
+
+
+class JoinSegmentsTests(SimpleTestCase):
+    def part(self, sequence, text, total=2):
+        return parse_frame(f"+98:0500032A{total:02X}{sequence:02X}{ucs2(text)}")
+
+    def test_joins_in_sequence_order(self):
+        self.assertEqual(join_segments([self.part(2, "دنیا"), self.part(1, "سلام ")]), "سلام دنیا")
+
+    def test_rejects_missing_parts(self):
+        with self.assertRaises(MC60ParseError) as raised:
+            join_segments([self.part(1, "سلام", total=3), self.part(3, "دنیا", total=3)])
+
+        self.assertEqual(raised.exception.code, "incomplete_message")
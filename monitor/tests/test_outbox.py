@@ -0,0 +1,47 @@
+from datetime import timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+
+from ..models import DeliveryAttempt, ForwardRule
+from ..outbox import claim_attempts
+from .helpers import forward_all, pending_attempt, quiet
+
+
+@quiet
+class ClaimAttemptsTests(TestCase):
+    def test_highest_priority_then_oldest_first(self):
+        now = timezone.now()
+        low = pending_attempt(forward_all(ForwardRule.Priority.LOW), available_at=now - timedelta(minutes=3))
+        normal_rule = forward_all(ForwardRule.Priority.NORMAL)
+        normal_new = pending_attempt(normal_rule, available_at=now - timedelta(minutes=1))
+        normal_old = pending_attempt(normal_rule, available_at=now - timedelta(minutes=2))
+        high = pending_attempt(forward_all(ForwardRule.Priority.HIGH), available_at=now - timedelta(seconds=1))
+
+        done, pending = claim_attempts(3, lease=60)
+        self.assertEqual(done, [])
+        self.assertEqual([row_id for row_id, _, _ in pending], [high.id, normal_old.id, normal_new.id])
+        self.assertEqual([priority for _, _, priority in pending], [10, 5, 5])
+
+        # Claimed rows are leased; only the rest is left.
+        done, pending = claim_attempts(3, lease=60)
+        self.assertEqual([row_id for row_id, _, _ in pending], [low.id])
+        self.assertEqual(claim_attempts(3, lease=60), ([], []))
+
+    def test_min_priority_leaves_lower_rows(self):
+        pending_attempt(forward_all(ForwardRule.Priority.LOW))
+        high = pending_attempt(forward_all(ForwardRule.Priority.HIGH))
+
+        _, pending = claim_attempts(10, lease=60, min_priority=ForwardRule.Priority.HIGH)
+        self.assertEqual([row_id for row_id, _, _ in pending], [high.id])
+
+    def test_rows_not_yet_due_are_left(self):
+        pending_attempt(forward_all(), available_at=timezone.now() + timedelta(minutes=1))
+
+        self.assertEqual(claim_attempts(10, lease=60), ([], []))
+
+    def test_finished_attempts_need_no_delivery(self):
+        row = pending_attempt(forward_all())
+        DeliveryAttempt.objects.filter(id=row.attempt_id).update(status=DeliveryAttempt.Status.SENT)
+
+        self.assertEqual(claim_attempts(10, lease=60), ([row.id], []))
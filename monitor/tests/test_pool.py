@@ -0,0 +1,75 @@
+import threading
+import time
+from unittest import mock
+
+import psycopg2
+from django.test import SimpleTestCase
+from psycopg2 import extensions
+
+from config.db_backends.pooled_postgresql.pool import ConnectionPool
+
+
+class FakeConnection:
+    def __init__(self, healthy=True, blocker=None):
+        self.closed = 0
+        self.healthy = healthy
+        self.blocker = blocker
+        self.info = mock.Mock(transaction_status=extensions.TRANSACTION_STATUS_IDLE)
+        self.cursor = mock.MagicMock()
+        self.cursor.return_value.__enter__.return_value.execute.side_effect = self.execute
+
+    def execute(self, sql):
+        if self.blocker is not None:
+            self.blocker.wait(5)
+        if not self.healthy:
+            raise psycopg2.OperationalError("server closed the connection unexpectedly")
+
+    def close(self):
+        self.closed = 1
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    def pool(self, **options) -> ConnectionPool:
+        # check_after=0: every reused connection is checked with a SELECT 1.
+        return ConnectionPool("test", timeout=0.2, check_after=0, **options)
+
+    def test_reuses_healthy_idle_connection(self):
+        pool = self.pool()
+        connection = pool.getconn(FakeConnection)
+        pool.putconn(connection)
+
+        self.assertIs(pool.getconn(FakeConnection), connection)
+        self.assertEqual(pool.size, 1)
+
+    def test_replaces_unhealthy_idle_connection(self):
+        pool = self.pool()
+        broken = pool.getconn(lambda: FakeConnection(healthy=False))
+        pool.putconn(broken)
+
+        connection = pool.getconn(FakeConnection)
+
+        self.assertIsNot(connection, broken)
+        self.assertTrue(broken.closed)
+        self.assertEqual(pool.size, 1)
+
+    def test_health_check_does_not_block_other_threads(self):
+        pool = self.pool(max_size=2)
+        blocker = threading.Event()
+        hanging = pool.getconn(lambda: FakeConnection(blocker=blocker))
+        pool.putconn(hanging)
+
+        checker = threading.Thread(target=pool.getconn, args=(FakeConnection,))
+        checker.start()
+        self.addCleanup(checker.join)
+        self.addCleanup(blocker.set)
+        while not hanging.cursor.called:
+            time.sleep(0.001)
+
+        # The connection being checked still counts toward max_size, and the lock is free.
+        started = time.monotonic()
+        other = pool.getconn(FakeConnection)
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertIsNot(other, hanging)
+        self.assertEqual(pool.size, 2)
+        with self.assertRaises(psycopg2.OperationalError):
+            pool.getconn(FakeConnection)
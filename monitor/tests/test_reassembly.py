@@ -0,0 +1,62 @@
+from django.test import SimpleTestCase
+
+from ..mc60 import MC60Frame, Segment
+from ..reassembly import MISSING_PART, LocalReassemblyBuffer
+
+TOPIC = "device/MC60/sms_rx"
+
+
+def part(sequence, body, total=3, reference=7, sender="+98"):
+    return MC60Frame(sender, body, "ucs2", Segment(reference, total, sequence)), f"raw-{reference}-{sequence}"
+
+
+class LocalReassemblyBufferTests(SimpleTestCase):
+    def setUp(self):
+        self.buffer = LocalReassemblyBuffer(ttl=60, max_groups=10)
+
+    def add(self, sequence, body, topic=TOPIC, **kwargs):
+        frame, raw = part(sequence, body, **kwargs)
+        return self.buffer.add(frame, raw, topic=topic)
+
+    def test_returns_message_once_on_last_part(self):
+        self.assertIsNone(self.add(3, "C"))
+        self.assertIsNone(self.add(1, "A"))
+        self.assertIsNone(self.add(1, "A again"))
+
+        assembled = self.add(2, "B")
+
+        self.assertEqual((assembled.body, assembled.complete, assembled.topic), ("ABC", True, TOPIC))
+        self.assertEqual(assembled.raw_parts, ["raw-7-1", "raw-7-2", "raw-7-3"])
+        self.assertEqual(self.buffer.pop_expired(), [])
+
+    def test_keeps_gateways_and_references_apart(self):
+        self.add(1, "A")
+        self.add(2, "B", topic="device/OTHER/sms_rx")
+        self.add(2, "B", reference=8)
+
+        self.assertIsNone(self.add(3, "C", topic="device/OTHER/sms_rx"))
+        self.assertIsNone(self.add(2, "B"))
+        assembled = self.add(3, "C")
+
+        self.assertEqual(assembled.body, "ABC")
+        self.assertEqual(assembled.topic, TOPIC)
+
+    def test_expired_group_is_stored_with_missing_parts_marked(self):
+        self.buffer.ttl = 0
+        self.add(1, "A")
+        self.add(3, "C")
+
+        [assembled] = self.buffer.pop_expired()
+
+        self.assertEqual(assembled.body, f"A{MISSING_PART}C")
+        self.assertFalse(assembled.complete)
+        self.assertEqual(assembled.raw_parts, ["raw-7-1", "raw-7-3"])
+
+    def test_evicts_oldest_group_over_max_groups(self):
+        self.buffer.max_groups = 1
+        self.add(1, "A", reference=1)
+        self.add(1, "A", reference=2)
+
+        [evicted] = self.buffer.pop_expired()
+
+        self.assertEqual(evicted.raw_parts, ["raw-1-1"])
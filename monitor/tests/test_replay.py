@@ -0,0 +1,75 @@
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+
+from ..devices import forget_devices
+from ..models import FailedLog
+from ..reassembly import MISSING_PART
+from ..services import replay_failed_log
+from .helpers import quiet
+
+TOPIC = "device/MC60/sms_rx"
+
+
+def ucs2_part(reference: int, total: int, sequence: int, text: str, sender: str = "+989121234567") -> str:
+    """An MC60 frame holding one part of a concatenated UCS2 SMS (16-bit reference UDH)."""
+    return f"{sender}:060804{reference:04X}{total:02X}{sequence:02X}{text.encode('utf-16-be').hex().upper()}"
+
+
+@quiet
+class ReplayFailedLogTests(TestCase):
+    def setUp(self):
+        # Devices are cached per process; those of earlier tests were rolled back.
+        forget_devices()
+        self.addCleanup(forget_devices)
+
+    def log(self, raw_data, topic=TOPIC) -> FailedLog:
+        return FailedLog.objects.create(raw_data=raw_data, error_message="boom", source_tag="mc60_mqtt", topic=topic)
+
+    def test_single_frame_is_stored_for_its_device(self):
+        log = self.log("+989121234567:hello")
+
+        self.assertEqual(replay_failed_log(log.id), "replayed")
+
+        log.refresh_from_db()
+        self.assertEqual(log.replayed_message.body, "hello")
+        self.assertEqual(log.replayed_message.device.device_id, "MC60")
+
+    def test_parts_of_one_message_are_stored_together(self):
+        second = self.log(ucs2_part(7, 2, 2, "دنیا"))
+        first = self.log(ucs2_part(7, 2, 1, "سلام "))
+        other = self.log(ucs2_part(8, 2, 1, "خداحافظ"))
+
+        self.assertEqual(replay_failed_log(second.id), "replayed")
+        self.assertEqual(replay_failed_log(first.id), "skipped")
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        other.refresh_from_db()
+        message = first.replayed_message
+        self.assertEqual(message.body, "سلام دنیا")
+        self.assertEqual(second.replayed_message_id, message.id)
+        self.assertIsNone(other.replayed_at)
+
+    def test_lone_part_marks_the_missing_ones(self):
+        log = self.log(ucs2_part(7, 3, 2, "دنیا"))
+
+        replay_failed_log(log.id)
+
+        log.refresh_from_db()
+        self.assertEqual(log.replayed_message.body, f"{MISSING_PART}دنیا{MISSING_PART}")
+
+    def test_parts_from_another_device_are_not_joined(self):
+        first = self.log(ucs2_part(7, 2, 1, "سلام "))
+        self.log(ucs2_part(7, 2, 2, "دنیا"), topic="device/OTHER/sms_rx")
+
+        replay_failed_log(first.id)
+
+        first.refresh_from_db()
+        self.assertEqual(first.replayed_message.body, f"سلام {MISSING_PART}")
+
+
+class ReplayFailedCommandTests(TestCase):
+    def test_rejects_malformed_dates(self):
+        for option in ("--since", "--until"):
+            with self.subTest(option=option), self.assertRaises(CommandError):
+                call_command("replay_failed", option, "yesterday", "--dry-run")
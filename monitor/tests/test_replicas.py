@@ -0,0 +1,63 @@
+from unittest import mock
+
+from django.db import DEFAULT_DB_ALIAS, OperationalError
+from django.test import SimpleTestCase, override_settings
+
+from .. import replicas
+from ..models import IncomingMessage
+from ..replicas import ReplicaRouter, alias_for_reads, pick_replica, read_from_replica, replica_lag
+
+REPLICAS = ["replica_0", "replica_1"]
+
+
+@override_settings(REPLICA_MAX_LAG=5, REPLICA_LAG_CHECK_INTERVAL=60, REPLICA_STICKY_SECONDS=10)
+class ReplicaRoutingTests(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch.object(replicas, "replica_aliases", return_value=REPLICAS)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # Rotation and lag are kept per process.
+        self.addCleanup(setattr, replicas, "_rotation", None)
+        self.addCleanup(replicas._lag.clear)
+        replicas._rotation = None
+        replicas._lag.clear()
+
+    def lags(self, **lags):
+        return mock.patch.object(replicas, "replica_lag", side_effect=lambda alias: lags[alias])
+
+    def test_router_reads_from_replica_only_inside_block(self):
+        router = ReplicaRouter()
+
+        self.assertIsNone(router.db_for_read(IncomingMessage))
+        with read_from_replica("replica_1"):
+            self.assertEqual(router.db_for_read(IncomingMessage), "replica_1")
+            self.assertEqual(router.db_for_write(IncomingMessage), DEFAULT_DB_ALIAS)
+        self.assertIsNone(router.db_for_read(IncomingMessage))
+        self.assertFalse(router.allow_migrate("replica_1", "monitor"))
+
+    def test_round_robin_over_fresh_replicas(self):
+        with self.lags(replica_0=0.0, replica_1=1.0):
+            self.assertEqual([pick_replica() for _ in range(3)], ["replica_0", "replica_1", "replica_0"])
+
+    def test_skips_replicas_behind_or_down(self):
+        with self.lags(replica_0=30.0, replica_1=None):
+            self.assertIsNone(pick_replica())
+        with self.lags(replica_0=30.0, replica_1=0.5):
+            self.assertEqual(pick_replica(), "replica_1")
+
+    def test_pinned_user_reads_from_primary(self):
+        user = mock.Mock(pk=1, is_authenticated=True)
+        with self.lags(replica_0=0.0, replica_1=0.0), mock.patch.object(replicas, "cache") as cache:
+            cache.get.return_value = 1
+            self.assertEqual(alias_for_reads(user), DEFAULT_DB_ALIAS)
+            cache.get.return_value = None
+            self.assertEqual(alias_for_reads(user), "replica_0")
+
+    def test_lag_is_cached_and_unreachable_replica_has_none(self):
+        connection = mock.Mock(vendor="sqlite")
+        connection.ensure_connection.side_effect = OperationalError("connection refused")
+        with mock.patch.object(replicas, "connections", {"replica_0": connection}):
+            self.assertIsNone(replica_lag("replica_0"))
+            self.assertIsNone(replica_lag("replica_0"))
+
+        connection.ensure_connection.assert_called_once()
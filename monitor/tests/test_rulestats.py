@@ -0,0 +1,35 @@
+import uuid
+from unittest import mock
+
+from django.db import transaction
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from .. import rulestats
+
+
+@override_settings(RULE_STATS_ENABLED=True, RULE_STATS_FLUSH_INTERVAL=0)
+class RecordFlushTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(rulestats, "flush")
+        self.flush = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(rulestats._pending.clear)
+
+    def test_flush_inside_a_transaction_waits_for_the_commit(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with transaction.atomic():
+                rulestats.record([(uuid.uuid4(), True, 1000)])
+                self.flush.assert_not_called()
+
+        self.assertEqual(len(callbacks), 1)
+        self.flush.assert_called_once_with()
+
+
+@override_settings(RULE_STATS_ENABLED=True, RULE_STATS_FLUSH_INTERVAL=0)
+class RecordFlushOutsideTransactionTests(SimpleTestCase):
+    def test_flush_runs_right_away(self):
+        with mock.patch.object(rulestats, "flush") as flush:
+            rulestats.record([(uuid.uuid4(), False, 1000)])
+        rulestats._pending.clear()
+
+        flush.assert_called_once_with()
@@ -0,0 +1,41 @@
+from unittest import mock
+
+from django.db.models import Q
+from django.test import TestCase
+
+from ..models import IncomingMessage
+from ..search import message_search_q, search_messages
+from ..services import build_incoming_message
+
+
+def store(sender, body):
+    message = build_incoming_message(f"{sender}:{body}", sender, body)
+    message.save(force_insert=True)
+    return message
+
+
+class MessageSearchTests(TestCase):
+    def test_matches_body_and_numbers_case_insensitively(self):
+        by_body = store("+111", "Your Code is 4821")
+        by_sender = store("+98912", "hello")
+        store("+222", "nothing here")
+
+        self.assertEqual(list(search_messages(IncomingMessage.objects.all(), "code")), [by_body])
+        self.assertEqual(list(search_messages(IncomingMessage.objects.all(), "8912")), [by_sender])
+
+    def test_blank_term_does_not_filter(self):
+        store("+111", "a")
+        store("+222", "b")
+
+        self.assertEqual(search_messages(IncomingMessage.objects.all(), "  ").count(), 2)
+
+    def test_short_terms_on_postgresql_match_numbers_exactly(self):
+        with mock.patch("monitor.search.connection") as connection:
+            connection.vendor = "postgresql"
+            query = message_search_q(" 12 ", prefix="message__")
+
+        self.assertEqual(query, Q(message__from_number="12") | Q(message__to_number="12"))
+
+    def test_short_terms_elsewhere_use_contains(self):
+        self.assertIn(("body__icontains", "12"), message_search_q("12").children)
+
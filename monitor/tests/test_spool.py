@@ -0,0 +1,181 @@
+import os
+import tempfile
+import time
+from types import SimpleNamespace
+from unittest import mock
+
+from django.db import IntegrityError, OperationalError
+from django.test import SimpleTestCase, TestCase
+
+from .. import spool as spool_module
+from ..management.commands.consumer import Command as ConsumerCommand
+from ..models import DeliveryAttempt, DeliveryOutbox, FailedLog, IncomingMessage
+from ..spool import SEGMENT_SUFFIX, Spool, SpoolDrainer, spool_record, store_each, store_records
+from .helpers import forward_all, quiet
+
+
+class SpoolTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def open_spool(self, **kwargs) -> Spool:
+        spool = Spool(self.directory, **kwargs)
+        self.addCleanup(spool.close)
+        return spool
+
+    def segments(self) -> list[str]:
+        return sorted(name for name in os.listdir(self.directory) if name.endswith(SEGMENT_SUFFIX))
+
+    def test_torn_tail_record_is_skipped(self):
+        spool = Spool(self.directory)
+        records = [spool_record("+1:a", "+1", "a"), spool_record("+1:b", "+1", "b"), spool_record("+1:c", "+1", "c")]
+        for record in records:
+            spool.append(record)
+        spool.close()
+        # A crash in the middle of the last write.
+        path = os.path.join(self.directory, self.segments()[0])
+        os.truncate(path, os.path.getsize(path) - 5)
+
+        spool = self.open_spool()
+        self.assertEqual(spool.pending, 2)
+        batch, _ = spool.read_batch(10)
+        self.assertEqual([record["id"] for record in batch], [record["id"] for record in records[:2]])
+
+    def test_cursor_survives_restart(self):
+        spool = Spool(self.directory)
+        records = [spool_record("+1:a", "+1", "a"), spool_record("+1:b", "+1", "b"), spool_record("+1:c", "+1", "c")]
+        for record in records:
+            spool.append(record)
+        batch, position = spool.read_batch(2)
+        spool.acknowledge(position, len(batch))
+        spool.close()
+
+        spool = self.open_spool()
+        self.assertEqual(spool.pending, 1)
+        batch, _ = spool.read_batch(10)
+        self.assertEqual([record["id"] for record in batch], [records[2]["id"]])
+
+    def test_drained_segments_are_deleted(self):
+        # Every append fills a segment, so each record is sealed in its own.
+        spool = self.open_spool(segment_bytes=1)
+        for body in "abc":
+            spool.append(spool_record(f"+1:{body}", "+1", body))
+        self.assertEqual(len(self.segments()), 4)
+
+        drained = 0
+        while True:
+            batch, position = spool.read_batch(10)
+            if not batch:
+                break
+            spool.acknowledge(position, len(batch))
+            drained += len(batch)
+
+        self.assertEqual(drained, 3)
+        self.assertEqual(spool.pending, 0)
+        # Only the segment being written is left.
+        self.assertEqual(len(self.segments()), 1)
+
+
+@quiet
+class StoreRecordsTests(TestCase):
+    def test_replay_does_not_duplicate_messages_or_deliveries(self):
+        forward_all()
+        records = [spool_record("+1:a", "+1", "a"), spool_record("+1:b", "+1", "b")]
+
+        self.assertEqual(store_records(records), (2, 2))
+        # As after a crash between storing a batch and acknowledging it.
+        self.assertEqual(store_records(records), (0, 0))
+
+        self.assertEqual(IncomingMessage.objects.count(), 2)
+        self.assertEqual(DeliveryAttempt.objects.count(), 2)
+        self.assertEqual(DeliveryOutbox.objects.count(), 2)
+
+    def test_replay_routes_messages_stored_but_not_routed(self):
+        forward_all()
+        records = [spool_record("+1:a", "+1", "a")]
+        with mock.patch("monitor.spool.process_incoming_messages", return_value=0):
+            store_records(records)
+        self.assertFalse(IncomingMessage.objects.get().processed)
+
+        self.assertEqual(store_records(records), (0, 1))
+        self.assertTrue(IncomingMessage.objects.get().processed)
+        self.assertEqual(DeliveryAttempt.objects.count(), 1)
+
+
+def _rejecting(bad_body):
+    """store_records, except that any batch holding `bad_body` fails as the database would reject it."""
+    def store(records):
+        if any(record["body"] == bad_body for record in records):
+            raise IntegrityError("rejected")
+        return store_records(records)
+    return store
+
+
+@quiet
+class PoisonRecordTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.spool = Spool(directory.name)
+        self.addCleanup(self.spool.close)
+        self.spool.append(spool_record("+1:good", "+1", "good"))
+        self.spool.append(spool_record(["part1", "part2"], "+1", "bad"))
+
+    def test_record_that_keeps_failing_moves_to_failed_log(self):
+        drainer = SpoolDrainer(self.spool, max_attempts=2)
+        with mock.patch.object(spool_module, "store_records", side_effect=_rejecting("bad")):
+            for _ in range(2):
+                with self.assertRaises(IntegrityError):
+                    drainer.drain_once()
+                drainer.failures += 1
+            self.assertEqual(drainer.drain_once(), 2)
+
+        self.assertEqual(self.spool.pending, 0)
+        self.assertEqual(list(IncomingMessage.objects.values_list("body", flat=True)), ["good"])
+        # One log per MQTT payload, as the consumer writes them.
+        self.assertEqual(sorted(FailedLog.objects.values_list("raw_data", flat=True)), ["part1", "part2"])
+
+    def test_unreachable_database_is_not_a_bad_record(self):
+        with mock.patch.object(spool_module, "store_records", side_effect=OperationalError("gone")):
+            with self.assertRaises(OperationalError):
+                store_each(self.spool.read_batch(10)[0])
+
+        self.assertFalse(FailedLog.objects.exists())
+
+    def test_stored_but_unroutable_record_is_not_logged(self):
+        records, _ = self.spool.read_batch(10)
+        with mock.patch.object(spool_module, "process_incoming_messages", side_effect=IntegrityError("rejected")):
+            self.assertEqual(store_each(records), (0, 0, 0))
+
+        # Left unprocessed for the sweep; a FailedLog would store them again on replay.
+        self.assertFalse(FailedLog.objects.exists())
+        self.assertEqual(IncomingMessage.objects.filter(processed=False).count(), 2)
+
+
+@quiet
+class ConsumerSpoolingTests(TestCase):
+    def setUp(self):
+        self.consumer = ConsumerCommand()
+        self.consumer.spool = mock.Mock(pending=0)
+        device = mock.patch("monitor.management.commands.consumer.device_for_topic", return_value=None)
+        device.start()
+        self.addCleanup(device.stop)
+
+    def receive(self, error):
+        msg = SimpleNamespace(payload=b"+1:hello", topic="device/gw-1/sms_rx", timestamp=time.monotonic())
+        with mock.patch("monitor.management.commands.consumer.create_incoming_message", side_effect=error):
+            self.consumer.handle_message(msg)
+
+    def test_unreachable_database_spools(self):
+        self.receive(OperationalError("gone"))
+
+        self.consumer.spool.append.assert_called_once()
+        self.assertFalse(FailedLog.objects.exists())
+
+    def test_rejected_message_is_logged_not_spooled(self):
+        self.receive(IntegrityError("rejected"))
+
+        self.consumer.spool.append.assert_not_called()
+        self.assertEqual(list(FailedLog.objects.values_list("raw_data", flat=True)), ["+1:hello"])
@@ -0,0 +1,55 @@
+from unittest import mock
+
+from django.db import DatabaseError
+from django.test import TransactionTestCase
+
+from .. import status_writer
+from ..models import DeliveryAttempt, DeliveryOutbox
+from ..status_writer import DeliveryStatusWriter
+from .helpers import forward_all, pending_attempt, quiet
+
+
+# The writer runs on its own thread and connection, so its writes must be visible outside a test transaction.
+@quiet
+class DeliveryStatusWriterTests(TransactionTestCase):
+    def setUp(self):
+        self.row = pending_attempt(forward_all())
+        self.writer = DeliveryStatusWriter(flush_interval=0.01, max_batch=100)
+        self.addCleanup(self.writer.close)
+
+    def sent(self) -> DeliveryAttempt:
+        attempt = DeliveryAttempt.objects.get(id=self.row.attempt_id)
+        attempt.status = DeliveryAttempt.Status.SENT
+        attempt.provider_message_id = "p-1"
+        return attempt
+
+    def test_writes_status_and_removes_outbox_row(self):
+        self.writer.submit(self.sent(), self.row.id)
+
+        self.assertTrue(self.writer.flush(timeout=5))
+        attempt = DeliveryAttempt.objects.get(id=self.row.attempt_id)
+        self.assertEqual((attempt.status, attempt.provider_message_id), (DeliveryAttempt.Status.SENT, "p-1"))
+        self.assertFalse(DeliveryOutbox.objects.exists())
+
+    def test_complete_removes_rows_without_a_status(self):
+        self.writer.complete([self.row.id])
+
+        self.assertTrue(self.writer.flush(timeout=5))
+        self.assertFalse(DeliveryOutbox.objects.exists())
+        self.assertEqual(DeliveryAttempt.objects.get(id=self.row.attempt_id).status, DeliveryAttempt.Status.PENDING)
+
+    def test_flush_reports_failed_write(self):
+        with mock.patch.object(status_writer, "write_statuses", side_effect=DatabaseError("gone")):
+            self.writer.submit(self.sent(), self.row.id)
+            self.assertFalse(self.writer.flush(timeout=5))
+
+        # The row stays for the next claim after its lease.
+        self.assertTrue(DeliveryOutbox.objects.filter(id=self.row.id).exists())
+        self.assertEqual(DeliveryAttempt.objects.get(id=self.row.attempt_id).status, DeliveryAttempt.Status.PENDING)
+        # Reported once; later writes start clean.
+        self.assertTrue(self.writer.flush(timeout=5))
+
+    def test_close_reports_failed_write(self):
+        with mock.patch.object(status_writer, "write_statuses", side_effect=DatabaseError("gone")):
+            self.writer.submit(self.sent(), self.row.id)
+            self.assertFalse(self.writer.close())
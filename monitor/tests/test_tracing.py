@@ -0,0 +1,42 @@
+import os
+import tempfile
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from ..tracing import JsonLinesSpanExporter, Span
+
+
+class JsonLinesSpanExporterTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "spans.jsonl")
+        # The background thread would flush on its own schedule; these tests write directly.
+        with mock.patch("threading.Thread.start"):
+            self.exporter = JsonLinesSpanExporter(self.path, "test", max_bytes=200, backup_count=2)
+
+    def write(self):
+        span = Span("test", "0" * 32)
+        span.end_ns = span.start_ns
+        self.exporter._write([span])
+
+    def test_rotates_at_max_bytes_and_keeps_backup_count(self):
+        for _ in range(5):
+            self.write()
+
+        self.assertTrue(os.path.exists(self.path))
+        self.assertTrue(os.path.exists(f"{self.path}.1"))
+        self.assertTrue(os.path.exists(f"{self.path}.2"))
+        self.assertFalse(os.path.exists(f"{self.path}.3"))
+        with open(self.path, encoding="utf-8") as current:
+            self.assertEqual(len(current.readlines()), 1)
+
+    def test_never_rotates_without_max_bytes(self):
+        self.exporter.max_bytes = 0
+        for _ in range(5):
+            self.write()
+
+        self.assertFalse(os.path.exists(f"{self.path}.1"))
+        with open(self.path, encoding="utf-8") as current:
+            self.assertEqual(len(current.readlines()), 5)
@@ -0,0 +1,223 @@
+# monitor/tracing.py
+"""
+Lightweight per-message tracing.
+
+Each SMS gets a trace id when it arrives; every pipeline stage runs inside
+`span(...)` and the finished spans are written as OTLP/JSON lines (the format
+read by the OpenTelemetry collector's `otlpjsonfile` receiver) to
+TRACE_EXPORT_PATH. The trace id is stored on IncomingMessage, so work done
+later or in another process can continue the same trace.
+"""
+import atexit
+import json
+import os
+import queue
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+_current_span = ContextVar("esp_current_span", default=None)
+
+
+def new_trace_id() -> str:
+    return secrets.token_hex(16)
+
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(self, name, trace_id, parent_id=None, attributes=None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes = dict(attributes or {})
+        self.error = None
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1_000_000
+
+    def to_otlp(self) -> dict:
+        data = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [_otlp_attribute(key, value) for key, value in self.attributes.items()],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1},
+        }
+        if self.parent_id:
+            data["parentSpanId"] = self.parent_id
+        return data
+
+
+class _NoopSpan:
+    trace_id = ""
+    span_id = ""
+    duration_ms = 0.0
+
+    def set_attribute(self, key, value):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+def _otlp_attribute(key, value):
+    if isinstance(value, bool):
+        typed = {"boolValue": value}
+    elif isinstance(value, int):
+        typed = {"intValue": str(value)}
+    elif isinstance(value, float):
+        typed = {"doubleValue": value}
+    else:
+        typed = {"stringValue": str(value)}
+    return {"key": key, "value": typed}
+
+
+class JsonLinesSpanExporter:
+    """
+    Buffers finished spans and appends them from a background thread, so
+    recording a span never blocks the pipeline on file I/O. The file is
+    rotated once it reaches `max_bytes`, keeping `backup_count` old files.
+    """
+
+    def __init__(self, path, service_name, flush_interval=1.0, max_batch=512, max_bytes=0, backup_count=3):
+        self.path = path
+        self.service_name = service_name
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self._queue = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+        self._thread.start()
+        atexit.register(self.flush)
+
+    def export(self, span):
+        self._queue.put(span)
+
+    def _drain(self):
+        spans = []
+        while len(spans) < self.max_batch:
+            try:
+                spans.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return spans
+
+    def flush(self):
+        with self._lock:
+            while spans := self._drain():
+                self._write(spans)
+
+    def _write(self, spans):
+        envelope = {
+            "resourceSpans": [{
+                "resource": {"attributes": [_otlp_attribute("service.name", self.service_name)]},
+                "scopeSpans": [{
+                    "scope": {"name": "monitor.tracing"},
+                    "spans": [span.to_otlp() for span in spans],
+                }],
+            }]
+        }
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._rotate()
+        with open(self.path, "a", encoding="utf-8") as output:
+            output.write(json.dumps(envelope, ensure_ascii=False) + "\n")
+
+    def _rotate(self):
+        """Shifts path -> path.1 -> path.2 ... once path has reached max_bytes (0: never)."""
+        try:
+            if not self.max_bytes or os.path.getsize(self.path) < self.max_bytes:
+                return
+        except FileNotFoundError:
+            return
+        if self.backup_count <= 0:
+            os.remove(self.path)
+            return
+        for index in range(self.backup_count - 1, 0, -1):
+            older = f"{self.path}.{index}"
+            if os.path.exists(older):
+                os.replace(older, f"{self.path}.{index + 1}")
+        os.replace(self.path, f"{self.path}.1")
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except OSError as e:
+                print(f"Span export failed: {e}")
+
+
+_exporter = None
+_exporter_lock = threading.Lock()
+
+
+def get_exporter():
+    global _exporter
+    if _exporter is None:
+        with _exporter_lock:
+            if _exporter is None:
+                _exporter = JsonLinesSpanExporter(
+                    settings.TRACE_EXPORT_PATH,
+                    settings.TRACE_SERVICE_NAME,
+                    max_bytes=settings.TRACE_MAX_BYTES,
+                    backup_count=settings.TRACE_BACKUP_COUNT,
+                )
+    return _exporter
+
+
+def current_span():
+    return _current_span.get()
+
+
+def set_span_attributes(**attributes):
+    """Adds attributes to the active span, if any."""
+    record = _current_span.get()
+    if record is not None:
+        record.attributes.update(attributes)
+
+
+@contextmanager
+def span(name, trace_id=None, **attributes):
+    """
+    Records one pipeline stage. Nested calls become child spans; passing
+    `trace_id` continues an existing trace (e.g. the one stored on a message).
+    """
+    if not settings.TRACING_ENABLED:
+        yield NOOP_SPAN
+        return
+
+    parent = _current_span.get()
+    if parent is not None and trace_id in (None, parent.trace_id):
+        record = Span(name, parent.trace_id, parent.span_id, attributes)
+    else:
+        record = Span(name, trace_id or new_trace_id(), None, attributes)
+
+    token = _current_span.set(record)
+    try:
+        yield record
+    except Exception as e:
+        record.error = f"{type(e).__name__}: {e}"[:500]
+        raise
+    finally:
+        record.end_ns = time.time_ns()
+        _current_span.reset(token)
+        get_exporter().export(record)
@@ -6,9 +6,15 @@ urlpatterns = [
     path('messages/', IncomingMessageListAPIView.as_view(), name='incoming-message-list'),
     path('dashboard/sms-traffic/', SmsTrafficAPIView.as_view(), name='sms-traffic-24h'),
     path('deliveries/', DeliveryAttemptListAPIView.as_view(), name='delivery-list'),
+    path('deliveries/latency/', DeliveryLatencyAPIView.as_view(), name='delivery-latency'),
+    path('export/messages/', IncomingMessageExportAPIView.as_view(), name='incoming-message-export'),
+    path('export/deliveries/', DeliveryAttemptExportAPIView.as_view(), name='delivery-export'),
+    path('archive/messages/', ArchivedMessageListAPIView.as_view(), name='archived-message-list'),
+    path('archive/deliveries/', ArchivedDeliveryListAPIView.as_view(), name='archived-delivery-list'),
     path('add-forward-rule/', AddForwardRuleView.as_view(), name='add-forward-rule'),
     path('delete-forward-rule/<uuid:pk>/', DeleteForwardRuleView.as_view(), name='delete-forward-rule'),
     path('get-forward-rule-list/', GetForwardRuleListView.as_view(), name='get-forward-rule-list'),
+    path('simulate-forward-rules/', RuleSimulationAPIView.as_view(), name='simulate-forward-rules'),
     path('add-destination-Channel/', AddDestinationChannelView.as_view(), name='add-destination-Channel'),
     path('get-destination-Channel-list/', GetDestinationChannelListView.as_view(), name='get-destination-Channel-list'),
     path('delete-destination-Channel/<uuid:pk>/', DisableDestinationChannelView.as_view(), name='delete-destination-Channel'),
@@ -0,0 +1,48 @@
+# monitor/uuids.py
+import os
+import threading
+import time
+import uuid
+
+_lock = threading.Lock()
+_last_ms = 0
+_counter = 0
+
+
+def uuid7() -> uuid.UUID:
+    """
+    Time-ordered UUID (RFC 9562 version 7).
+
+    48 bits of Unix milliseconds, then a 12-bit counter that keeps ids generated
+    in the same millisecond monotonic within this process, then 62 random bits.
+    New rows therefore land at the right edge of the primary key B-tree instead
+    of on a random leaf page.
+    """
+    global _last_ms, _counter
+
+    with _lock:
+        now_ms = time.time_ns() // 1_000_000
+        if now_ms > _last_ms:
+            _last_ms = now_ms
+            # Random start leaves room for the counter to grow within the millisecond.
+            _counter = int.from_bytes(os.urandom(2), "big") & 0x07FF
+        else:
+            _counter += 1
+            if _counter > 0x0FFF:
+                # Counter exhausted: borrow the next millisecond.
+                _last_ms += 1
+                _counter = 0
+        timestamp = _last_ms
+        counter = _counter
+
+    value = (timestamp & 0xFFFF_FFFF_FFFF) << 80
+    value |= 0x7 << 76
+    value |= counter << 64
+    value |= 0b10 << 62
+    value |= int.from_bytes(os.urandom(8), "big") & 0x3FFF_FFFF_FFFF_FFFF
+    return uuid.UUID(int=value)
+
+
+def uuid7_timestamp_ms(value: uuid.UUID) -> int:
+    """Unix milliseconds embedded in a version 7 UUID."""
+    return value.int >> 80
@@ -4,7 +4,7 @@ from django.db import transaction
 from django.utils.dateparse import parse_datetime
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework import status
+from rest_framework import serializers, status
 from .models import *
 from .serializers import *
 from django.db.models.functions import TruncHour
@@ -18,10 +18,32 @@ from .services import process_incoming_message
 from .serializers import DestinationChannelCreateSerializer
 from django.shortcuts import get_object_or_404
 from .serializers import RuleDestinationCreateSerializer
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from .search import search_messages
+from itertools import islice
+from .archive import iter_archived
+from django.conf import settings
+from django.http import HttpResponse
+from django.views import View
+from .metrics import PENDING_DELIVERIES, render_latest
+from .analytics import latency_percentiles
+from .replicas import ReplicaReadMixin
+from .rulestats import rule_stats
+from .simulation import load_candidates, simulate
+import json
+from .exports import (
+    DELIVERY_EXPORT_FIELDS,
+    ENCODERS,
+    MESSAGE_EXPORT_FIELDS,
+    aiter_sync,
+    stream_queryset,
+)
 #--------------------------------------------------------------------
-class IncomingMessageListAPIView(generics.ListAPIView):
+class IncomingMessageListAPIView(ReplicaReadMixin, generics.ListAPIView):
     """
     Returns a list of all incoming messages related to the authenticated user.
+    Supports `?search=` over the body and sender fields (trigram-indexed on PostgreSQL).
     """
     serializer_class = IncomingMessageSerializer
     permission_classes = [IsAuthenticated] 
@@ -30,10 +52,14 @@ class IncomingMessageListAPIView(generics.ListAPIView):
         """
         Filters the queryset to only include messages related to the authenticated user IDs.
         """
-        return IncomingMessage.objects.all().order_by('-received_at')
+        queryset = IncomingMessage.objects.all().order_by('-received_at')
+        search_term = self.request.query_params.get("search")
+        if search_term:
+            queryset = search_messages(queryset, search_term)
+        return queryset
 
 #--------------------------------------------------------------------
-class SmsTrafficAPIView(APIView):
+class SmsTrafficAPIView(ReplicaReadMixin, APIView):
     """
     Calculates and returns the SMS traffic (incoming messages) 
     count for the last 24 hours, grouped by hour, only for the authenticated user.
@@ -72,7 +98,7 @@ class SmsTrafficAPIView(APIView):
         
         return Response(chart_data, status=status.HTTP_200_OK)
 #--------------------------------------------------------------------
-class DeliveryAttemptListAPIView(generics.ListAPIView):
+class DeliveryAttemptListAPIView(ReplicaReadMixin, generics.ListAPIView):
     """
     API endpoint to list delivery attempts (Simple Version).
     Only includes attempts related to the authenticated user.
@@ -107,14 +133,15 @@ class AddForwardRuleView(APIView):
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 #--------------------------------------------------------------------
-class GetForwardRuleListView(APIView):
+class GetForwardRuleListView(ReplicaReadMixin, APIView):
 
     @extend_schema(
         responses={200: ForwardRuleSerializer(many=True)}
     )
     def get(self, request, *args, **kwargs):
-        queryset = ForwardRule.objects.all()
-        serializer = ForwardRuleSerializer(queryset, many=True)
+        queryset = list(ForwardRule.objects.all())
+        stats = rule_stats(rule.pk for rule in queryset)
+        serializer = ForwardRuleSerializer(queryset, many=True, context={"rule_stats": stats})
         return Response(serializer.data, status=status.HTTP_200_OK)
 #--------------------------------------------------------------------    
 class DeleteForwardRuleView(APIView):
@@ -149,7 +176,7 @@ class AddDestinationChannelView(APIView):
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 #--------------------------------------------------------------------
-class GetDestinationChannelListView(APIView):
+class GetDestinationChannelListView(ReplicaReadMixin, APIView):
 
     def get(self, request, *args, **kwargs):
 
@@ -240,4 +267,211 @@ class DeleteManagementDestinationChannelView(APIView):
                 status=status.HTTP_404_NOT_FOUND
             )
 #--------------------------------------------------------------------
-       
\ No newline at end of file
+def _require_attributes(cls, *names):
+    """Fails at import time, instead of on the first request, when a view subclass leaves one unset."""
+    missing = [name for name in names if getattr(cls, name) is None]
+    if missing:
+        raise TypeError(f"{cls.__name__} must set {', '.join(missing)}")
+#--------------------------------------------------------------------
+class StreamingExportView(ReplicaReadMixin, APIView):
+    """
+    Base view for streaming exports (NDJSON or CSV).
+    Rows are read through a server-side cursor and written out chunk by chunk,
+    so memory use stays flat no matter how large the result is.
+
+    Subclasses set every attribute left as None; `status_filters` maps each
+    accepted status value to the filter it applies.
+    """
+    permission_classes = [IsAuthenticated]
+    queryset = None
+    export_fields = None
+    time_field = None
+    sender_field = None
+    status_filters = None
+    filename = "export"
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        _require_attributes(cls, "queryset", "export_fields", "time_field", "sender_field", "status_filters")
+
+    @extend_schema(parameters=[ExportQuerySerializer])
+    def get(self, request, *args, **kwargs):
+        params = ExportQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        data = params.validated_data
+
+        queryset = self.queryset.all()
+        if "start" in data:
+            queryset = queryset.filter(**{f"{self.time_field}__gte": data["start"]})
+        if "end" in data:
+            queryset = queryset.filter(**{f"{self.time_field}__lt": data["end"]})
+        if "sender" in data:
+            queryset = queryset.filter(**{self.sender_field: data["sender"]})
+        if "status" in data:
+            if data["status"] not in self.status_filters:
+                raise serializers.ValidationError({"status": f"Expected one of {list(self.status_filters)}."})
+            queryset = queryset.filter(**self.status_filters[data["status"]])
+        # Pinned explicitly: the rows are read while streaming, after the view has returned.
+        queryset = queryset.order_by(self.time_field, "id").using(self.read_db)
+
+        export_format = data["export_format"]
+        _, content_type, extension = ENCODERS[export_format]
+        content = stream_queryset(queryset, self.export_fields, export_format, data["chunk_size"])
+
+        # Under ASGI a sync iterator would be collected into a list before sending.
+        if isinstance(request._request, ASGIRequest):
+            content = aiter_sync(content)
+
+        response = StreamingHttpResponse(content, content_type=content_type)
+        response["Content-Disposition"] = f'attachment; filename="{self.filename}.{extension}"'
+        response["Cache-Control"] = "no-store"
+        return response
+#--------------------------------------------------------------------
+class IncomingMessageExportAPIView(StreamingExportView):
+    """
+    Streams incoming messages.
+    status accepts `processed` or `unprocessed`.
+    """
+    queryset = IncomingMessage.objects.all()
+    export_fields = MESSAGE_EXPORT_FIELDS
+    time_field = "received_at"
+    sender_field = "from_number"
+    status_filters = {"processed": {"processed": True}, "unprocessed": {"processed": False}}
+    filename = "messages"
+#--------------------------------------------------------------------
+class DeliveryAttemptExportAPIView(StreamingExportView):
+    """
+    Streams delivery history joined with message, rule and channel info.
+    status accepts any DeliveryAttempt status.
+    """
+    queryset = DeliveryAttempt.objects.all()
+    export_fields = DELIVERY_EXPORT_FIELDS
+    time_field = "created_at"
+    sender_field = "message__from_number"
+    status_filters = {value: {"status": value} for value in DeliveryAttempt.Status.values}
+    filename = "deliveries"
+#--------------------------------------------------------------------
+class ArchivedRowsView(APIView):
+    """
+    Base view for reading rows back from the cold archive files.
+    Only day files that overlap the requested range are opened.
+
+    Subclasses set `dataset` and `row_filters`, which maps each supported
+    query parameter to the row field it must equal.
+    """
+    permission_classes = [IsAuthenticated]
+    dataset = None
+    row_filters = None
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        _require_attributes(cls, "dataset", "row_filters")
+
+    @extend_schema(parameters=[ArchiveQuerySerializer])
+    def get(self, request, *args, **kwargs):
+        params = ArchiveQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        data = params.validated_data
+
+        # Archived rows hold JSON values, so UUIDs are compared as strings.
+        wanted = {field: str(data[param]) for param, field in self.row_filters.items() if data.get(param)}
+
+        def predicate(row):
+            return all(row[field] == value for field, value in wanted.items())
+
+        rows = iter_archived(self.dataset, data["start"], data["end"], predicate)
+        return Response(list(islice(rows, data["limit"])), status=status.HTTP_200_OK)
+#--------------------------------------------------------------------
+class ArchivedMessageListAPIView(ArchivedRowsView):
+    """Archived incoming messages; filters: sender, message_id."""
+    dataset = "messages"
+    row_filters = {"sender": "from_number", "message_id": "id"}
+#--------------------------------------------------------------------
+class ArchivedDeliveryListAPIView(ArchivedRowsView):
+    """Archived delivery attempts; filters: status, message_id."""
+    dataset = "deliveries"
+    row_filters = {"status": "status", "message_id": "message_id"}
+#--------------------------------------------------------------------
+class MetricsView(View):
+    """
+    Prometheus scrape endpoint for the web process.
+    Protected by a bearer token when METRICS_TOKEN is set.
+    """
+    def get(self, request, *args, **kwargs):
+        token = settings.METRICS_TOKEN
+        if token and request.headers.get("Authorization") != f"Bearer {token}":
+            return HttpResponse(status=status.HTTP_401_UNAUTHORIZED)
+
+        # Bounded to the last day so the count stays on recent partitions / the created_at index.
+        PENDING_DELIVERIES.set(
+            DeliveryAttempt.objects.filter(
+                status=DeliveryAttempt.Status.PENDING,
+                created_at__gte=timezone.now() - timedelta(days=1),
+            ).count()
+        )
+        body, content_type = render_latest()
+        return HttpResponse(body, content_type=content_type)
+#--------------------------------------------------------------------
+class DeliveryLatencyAPIView(ReplicaReadMixin, APIView):
+    """
+    Returns p50/p95/p99 delivery latency (milliseconds) per channel and per rule
+    over a time window (default: the last 24 hours).
+    `metric` is one of total, provider or queue.
+    """
+    permission_classes = [IsAuthenticated]
+
+    @extend_schema(parameters=[LatencyQuerySerializer])
+    def get(self, request, *args, **kwargs):
+        params = LatencyQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        data = params.validated_data
+
+        end_time = data.get("end") or timezone.now()
+        start_time = data.get("start") or end_time - timedelta(hours=24)
+        metric = data["metric"]
+
+        return Response(
+            {
+                "start": start_time,
+                "end": end_time,
+                "metric": metric,
+                "by_channel": latency_percentiles(start_time, end_time, metric, "channel"),
+                "by_rule": latency_percentiles(start_time, end_time, metric, "rule"),
+            },
+            status=status.HTTP_200_OK,
+        )
+#--------------------------------------------------------------------
+class RuleSimulationAPIView(ReplicaReadMixin, APIView):
+    """
+    Dry-runs candidate rule filters over incoming message history.
+    Streams NDJSON: one progress line per chunk scanned, then a result line with
+    the match count and sample messages of each candidate, so long scans keep
+    the connection alive instead of timing out.
+    """
+    permission_classes = [IsAuthenticated]
+
+    @extend_schema(request=RuleSimulationSerializer)
+    def post(self, request, *args, **kwargs):
+        params = RuleSimulationSerializer(data=request.data)
+        params.is_valid(raise_exception=True)
+        data = params.validated_data
+
+        end_time = data.get("end") or timezone.now()
+        start_time = data.get("start") or end_time - timedelta(days=30)
+        try:
+            candidates = load_candidates(data["filters"], data["rules"], using=self.read_db)
+        except ForwardRule.DoesNotExist as e:
+            return Response({"rules": [str(e)]}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Inline: a process pool per request would let concurrent requests fork without bound.
+        events = simulate(
+            candidates, start_time, end_time, workers=0, sample_size=data.get("samples"), using=self.read_db,
+        )
+        content = (json.dumps(event, ensure_ascii=False) + "\n" for event in events)
+        if isinstance(request._request, ASGIRequest):
+            content = aiter_sync(content)
+
+        response = StreamingHttpResponse(content, content_type="application/x-ndjson")
+        response["Cache-Control"] = "no-store"
+        return response
+#--------------------------------------------------------------------